@@ -1,19 +1,38 @@
 import logging
-import pkg_resources
-
-from googlecloudsdk.core.credentials import store as creds_store
 
 # Setup logging and expose Logger object to the rest of the project
 LOG = logging.getLogger("cft")
 LOG.addHandler(logging.StreamHandler())
 LOG.propagate = False
 
-__VERSION__ = pkg_resources.get_distribution(__name__).version
+try:
+    # Much faster than pkg_resources, python 3.8+ only
+    from importlib.metadata import version as _get_version
+except ImportError:
+    def _get_version(name):
+        import pkg_resources
+        return pkg_resources.get_distribution(name).version
+
+__VERSION__ = _get_version(__name__)
+
+_credential_providers_registered = False
+
+
+def register_credential_providers():
+    """ Registers the SDK credentials providers - for instance SA, etc
+
+    This imports a large part of the SDK, so it is only done right
+    before the first API client is created.
+    """
+    global _credential_providers_registered
+    if _credential_providers_registered:
+        return
 
-# Register credentials providers - for instance SA, etc
-credential_providers = [
-    creds_store.DevShellCredentialProvider(),
-    creds_store.GceCredentialProvider(),
-]
-for provider in credential_providers:
-    provider.Register()
+    from googlecloudsdk.core.credentials import store as creds_store
+    credential_providers = [
+        creds_store.DevShellCredentialProvider(),
+        creds_store.GceCredentialProvider(),
+    ]
+    for provider in credential_providers:
+        provider.Register()
+    _credential_providers_registered = True
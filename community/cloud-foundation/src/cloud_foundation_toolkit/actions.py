@@ -13,47 +13,89 @@
 # limitations under the License.
 """ Deployment Actions """
 
-import glob
+import fnmatch
 import json
 import os.path
 import sys
+import time
 
-from apitools.base.py import exceptions as apitools_exceptions
+from concurrent import futures
 from ruamel.yaml import YAML
 
 from cloud_foundation_toolkit import LOG
+from cloud_foundation_toolkit.cache import DiskCache
+from cloud_foundation_toolkit.changes import changed_configs
+from cloud_foundation_toolkit.changes import StateFile
+from cloud_foundation_toolkit.clients import api_calls
+from cloud_foundation_toolkit.clients import POOL as CLIENT_POOL
 from cloud_foundation_toolkit.deployment import Config, ConfigGraph, Deployment
+from cloud_foundation_toolkit.dm_utils import OUTPUT_CACHE
+from cloud_foundation_toolkit.events import EVENTS
+from cloud_foundation_toolkit.events import human_output
+from cloud_foundation_toolkit.journal import Journal
+from cloud_foundation_toolkit.metrics import COUNTERS
+from cloud_foundation_toolkit.plan import plan_graph
+from cloud_foundation_toolkit.plan import print_plans
+from cloud_foundation_toolkit.previews import PreviewReport
+from cloud_foundation_toolkit.ratelimit import RATE_LIMITER
+from cloud_foundation_toolkit.ratelimit import RETRY_POLICY
+from cloud_foundation_toolkit.tracing import print_summary as print_trace
+from cloud_foundation_toolkit.tracing import TRACER
+from cloud_foundation_toolkit.yaml_utils import set_backend as set_yaml_backend
 
 # To avoid code repetition this ACTION_MAP is used to translate the
 # args provided to the cmd line to the appropriate method of the
 # deployment object
 ACTION_MAP = {
     'apply': {
-        'preview': 'preview'
+        'preview': 'preview',
+        'force': 'force'
     },
     'create': {
         'preview': 'preview'
     },
-    'delete': {},
+    'delete': {
+        'delete_policy': 'delete_policy'
+    },
     'update': {
-        'preview': 'preview'
+        'preview': 'preview',
+        'force': 'force'
     }
 }
 
 
-def check_file(config):
-    extensions = ['.yaml', '.yml', '.jinja']
-    for ext in extensions:
-        if ext == config[-len(ext):]:
-            return True
+# The files picked from directories when no --include pattern is given
+DEFAULT_INCLUDE = ['*.yaml', '*.yml', '*.jinja']
+
+
+def check_file(config, include=None, exclude=None):
+    """ Whether a file found in a directory is a config
+
+    Args:
+        config (string): The path of the file, relative to the directory
+            given on the command line.
+        include (list): Glob patterns, at least one of which the path
+            must match. Defaults to DEFAULT_INCLUDE.
+        exclude (list): Glob patterns none of which the path must match.
+    """
+    if any(fnmatch.fnmatch(config, p) for p in exclude or []):
+        return False
+    return any(fnmatch.fnmatch(config, p) for p in include or DEFAULT_INCLUDE)
 
 
-def get_config_files(config):
+def get_config_files(config, recursive=False, include=None, exclude=None):
     """ Build a list of config files
     List could have files directory or yaml strings
 
-    Args(list): List of configs. Each item can be a file, a directory,
-        or a yaml string
+    Args:
+        config (list): List of configs. Each item can be a file, a
+            directory, or a yaml string
+        recursive (boolean): Whether to look for configs in the
+            subdirectories of the directories too.
+        include (list): Glob patterns matched against the paths of files
+            found in directories, relative to the directory. Defaults to
+            DEFAULT_INCLUDE.
+        exclude (list): Glob patterns of paths to leave out.
 
     Returns: A list of config files or strings
     """
@@ -62,9 +104,18 @@ def get_config_files(config):
 
     for conf in config:
         if os.path.isdir(conf):
-            config_files.extend(
-                [f for f in glob.glob(conf + '/*') if check_file(f)]
-            )
+            found = []
+            for root, dirs, files in os.walk(conf):
+                # Like glob, hidden files and directories are skipped
+                dirs[:] = sorted(
+                    d for d in dirs if recursive and not d.startswith('.')
+                )
+                for name in sorted(f for f in files if not f.startswith('.')):
+                    path = os.path.join(root, name)
+                    relative = os.path.relpath(path, conf)
+                    if check_file(relative, include, exclude):
+                        found.append(path)
+            config_files.extend(found)
         else:
             config_files.append(conf)
 
@@ -72,21 +123,109 @@ def get_config_files(config):
     return config_files
 
 
+def get_disk_cache(args):
+    return DiskCache(args.cache_dir, args.cache_max_size * 1024 * 1024)
+
+
+def execute_cache(args):
+    """ Executes the `cache` command """
+
+    cache = get_disk_cache(args)
+    if args.command == 'clear':
+        print('Deleted {} entries from {}'.format(
+            cache.clear(),
+            cache.directory
+        ))
+    elif args.command == 'stats':
+        stats = cache.stats()
+        if args.format == 'json':
+            print(json.dumps(stats, indent=2))
+        else:
+            print('directory: {directory}\n'
+                  'entries: {entries}\n'
+                  'size: {size} bytes (max: {max_size})'.format(**stats))
+
+
 def execute(args):
     action = args.action
+    if action == 'cache':
+        return execute_cache(args)
 
-    if action == 'delete' or (hasattr(args, 'reverse') and args.reverse):
-        graph = reversed(
-            ConfigGraph(get_config_files(args.config),
-                        project=args.project)
-        )
-    else:
-        graph = ConfigGraph(get_config_files(args.config), project=args.project)
+    # Batch previews: the previews are created, or applied, by the
+    # `preview` and `apply_preview` methods of the deployments
+    preview_report = None
+    if getattr(args, 'preview_report', None):
+        if getattr(args, 'preview', False):
+            raise SystemExit(
+                '--preview-report replaces --preview, use either of them'
+            )
+        action = 'preview'
+        preview_report = PreviewReport(args.preview_report)
+    elif getattr(args, 'from_preview_report', None):
+        action = 'apply_preview'
+        preview_report = PreviewReport(args.from_preview_report, load=True)
+
+    if getattr(args, 'trace', None):
+        TRACER.enable()
+    if getattr(args, 'events', None):
+        EVENTS.enable(sys.stdout)
+    if getattr(args, 'api_connections', None):
+        CLIENT_POOL.size = args.api_connections
+    if getattr(args, 'api_qps', None) is not None:
+        RATE_LIMITER.qps = args.api_qps
+    if getattr(args, 'api_retries', None) is not None:
+        RETRY_POLICY.retries = args.api_retries
+    if getattr(args, 'yaml_backend', None):
+        set_yaml_backend(args.yaml_backend)
+    if getattr(args, 'cache', False):
+        OUTPUT_CACHE.disk_cache = get_disk_cache(args)
+    reverse = action == 'delete' or (hasattr(args, 'reverse') and args.reverse)
+
+    config_graph = ConfigGraph(
+        get_config_files(
+            args.config,
+            recursive=getattr(args, 'recursive', False),
+            include=getattr(args, 'include', None),
+            exclude=getattr(args, 'exclude', None)
+        ),
+        project=args.project,
+        processes=getattr(args, 'processes', None)
+    )
+
+    if action == 'apply_preview':
+        config_graph = previewed_graph(preview_report, config_graph)
+
+    journal = None
+    if getattr(args, 'resume', False) and not getattr(args, 'journal', None):
+        raise SystemExit('--resume requires the --journal of the run')
+    if getattr(args, 'journal', None):
+        journal = Journal(args.journal)
+        if getattr(args, 'resume', False):
+            config_graph = resume_graph(journal, action, config_graph, reverse)
+
+    all_configs = config_graph
+    since = getattr(args, 'changed_since', None)
+    if since:
+        config_graph = changed_graph(since, config_graph)
+    if getattr(args, 'delete_policy', None) == 'ABANDON':
+        check_abandon(all_configs, config_graph)
+    state = None
+    state_file = getattr(args, 'state_file', None)
+    if since and not state_file and os.path.isfile(since):
+        state_file = since
+    if state_file:
+        state = StateFile(state_file)
+    graph = reversed(config_graph) if reverse else config_graph
 
     arguments = {}
     for k, v in vars(args).items():
         if k in ACTION_MAP.get(action, {}):
             arguments[ACTION_MAP[action][k]] = v
+    if action == 'apply_preview':
+        arguments = {
+            'previews': preview_report.previews,
+            'cancel': getattr(args, 'cancel_previews', False)
+        }
 
     LOG.debug(
         'Excuting %s on %s with arguments %s',
@@ -125,17 +264,535 @@ def execute(args):
                     )
             print('------------------------------')
 
+    elif action == 'plan':
+        execute_plan(args, config_graph)
+
     else:
-        for i, stage in enumerate(graph, start=1):
-            print('---------- Stage {} ----------'.format(i))
-            for config in stage:
-                LOG.debug('%s config %s', action, config.deployment)
-                deployment = Deployment(config)
-                method = getattr(deployment, action)
+        if journal and not getattr(args, 'resume', False):
+            journal.reset()
+        start = time.time()
+        EVENTS.emit(
+            'run_started',
+            action=action,
+            deployments=len(config_graph.configs),
+            scheduler=getattr(args, 'scheduler', 'stages'),
+            parallelism=getattr(args, 'parallelism', 1) or 1
+        )
+        succeeded = False
+        with human_output():
+            try:
+                run_graph(
+                    args,
+                    config_graph,
+                    reverse,
+                    arguments,
+                    journal,
+                    state,
+                    preview_report,
+                    action
+                )
+                succeeded = True
+            finally:
+                if state:
+                    state.save()
+                if action == 'preview':
+                    preview_report.save()
+                    print(
+                        'Previews written to {0}. To apply them, run: '
+                        'cft apply <configs> --from-preview-report {0}'.format(
+                            preview_report.path
+                        )
+                    )
+                print_summary()
+                if TRACER.enabled:
+                    TRACER.write(args.trace)
+                    print_trace(config_graph)
+                    print('Trace written to {}'.format(args.trace))
+                LOG.debug(
+                    'Output cache hits: %s, disk hits: %s, misses: %s',
+                    OUTPUT_CACHE.hits,
+                    OUTPUT_CACHE.disk_hits,
+                    OUTPUT_CACHE.misses
+                )
+                LOG.debug(
+                    'API clients: %s, checkouts: %s, total wait: %sms',
+                    COUNTERS.get('api.pool.clients'),
+                    COUNTERS.get('api.pool.checkouts'),
+                    COUNTERS.get('api.pool.wait_ms')
+                )
+                log_api_calls()
+                if getattr(args, 'report', None):
+                    write_report(args.report)
+                EVENTS.emit(
+                    'run_finished',
+                    action=action,
+                    succeeded=succeeded,
+                    duration=round(time.time() - start, 3),
+                    deployments=dict(COUNTERS.items('deployments.')),
+                    api_calls=COUNTERS.get('api.calls')
+                )
+
+        max_api_calls = getattr(args, 'max_api_calls', None)
+        calls = COUNTERS.get('api.calls')
+        if max_api_calls is not None and calls > max_api_calls:
+            raise SystemExit(
+                'The run made {} DM API calls, over the budget of {} '
+                '(see --max-api-calls)'.format(calls, max_api_calls)
+            )
+
+
+def execute_plan(args, config_graph):
+    """ Executes the `plan` command: prints what an update would change
+
+    Args:
+        args (argparse.Namespace): The parsed command line arguments.
+        config_graph (ConfigGraph): The graph of configs to plan.
+    """
+
+    plans = plan_graph(config_graph, args.parallelism)
+    if args.format == 'human':
+        print_plans(plans, diff=getattr(args, 'diff', False))
+    else:
+        output = [dict(p._asdict()) for p in plans]
+        if args.format == 'yaml':
+            YAML().dump(output, sys.stdout)
+        else:
+            print(json.dumps(output, indent=2))
+    if any(p.action == 'error' for p in plans):
+        raise SystemExit('Some deployments could not be planned')
+
+
+def previewed_graph(preview_report, config_graph):
+    """ Selects the configs previewed in a preview report
+
+    Args:
+        preview_report (PreviewReport): The report of the previews.
+        config_graph (ConfigGraph): The graph of all configs.
+
+    Returns: A ConfigGraph with the previewed configs.
+    """
+
+    nodes = preview_report.nodes
+    missing = [n for n in nodes if n not in config_graph.configs]
+    if missing:
+        raise SystemExit(
+            'The configs of these previewed deployments were not '
+            'provided:\n{}'.format(
+                '\n'.join(
+                    ' - project: {}, deployment: {}'.format(*n)
+                    for n in missing
+                )
+            )
+        )
+    print('Applying {} preview(s) from {}'.format(
+        len(nodes),
+        preview_report.path
+    ))
+    return config_graph.select(nodes)
+
+
+def resume_graph(journal, action, config_graph, reverse):
+    """ Selects the configs to execute to resume a previous run
+
+    Configs that succeeded in the journaled run and haven't changed
+    since are left out, unless they are downstream of a config that
+    failed, did not run, or changed.
+
+    Args:
+        journal (Journal): The journal of the previous run.
+        action (string): The action being resumed.
+        config_graph (ConfigGraph): The graph of all configs.
+        reverse (boolean): Whether the action runs in reverse order.
+
+    Returns: A ConfigGraph with the configs to execute.
+    """
+
+    completed = journal.completed(action, config_graph.configs)
+    pending = [n for n in config_graph.configs if n not in completed]
+    selected = config_graph.downstream(pending, reverse=reverse)
+    print('Resuming from {}: {} config(s) completed, {} to execute'.format(
+        journal.path,
+        len(config_graph.configs) - len(selected),
+        len(selected)
+    ))
+    return config_graph.select(selected)
+
+
+def changed_graph(since, config_graph):
+    """ Selects the configs changed since a state file or a git revision
+
+    The configs depending on the changed ones are selected whatever the
+    action: they must be updated after the changed configs, or deleted
+    before them. The configs the changed ones depend on are left alone,
+    as other configs may still depend on them.
+
+    Args:
+        since (string): The path of a state file or a git revision.
+        config_graph (ConfigGraph): The graph of all configs.
+
+    Returns: A ConfigGraph with the changed configs and the configs
+        depending on them.
+    """
+
+    changed = changed_configs(since, config_graph.configs)
+    selected = config_graph.downstream(changed)
+    print('Changed since {}: {} config(s), {} with dependents'.format(
+        since,
+        len(changed),
+        len(selected)
+    ))
+    return config_graph.select(selected)
+
+
+def check_abandon(all_configs, config_graph):
+    """ Refuses to abandon deployments that configs still depend on
+
+    Abandoned deployments are removed from DM without their resources,
+    so the `$(out)` references of the deployments depending on them
+    could not be resolved anymore. Abandoning a deployment is only
+    allowed if all the configs depending on it are deleted in the same
+    run.
+
+    Args:
+        all_configs (ConfigGraph): The graph of all the configs given.
+        config_graph (ConfigGraph): The graph of the configs to delete.
+    """
+
+    selected = config_graph.configs
+    kept = all_configs.downstream(selected) - set(selected)
+    if kept:
+        raise SystemExit(
+            'Deployments can only be abandoned with the deployments '
+            'depending on them, which would be kept:\n{}'.format(
+                '\n'.join(
+                    ' - project: {}, deployment: {}'.format(*n)
+                    for n in sorted(kept)
+                )
+            )
+        )
+
+
+def run_graph(
+    args,
+    config_graph,
+    reverse,
+    arguments,
+    journal=None,
+    state=None,
+    preview_report=None,
+    action=None
+):
+    """ Executes the action on all configs of the graph
+
+    Args:
+        args (argparse.Namespace): The parsed command line arguments.
+        config_graph (ConfigGraph): The graph of configs to execute.
+        reverse (boolean): Whether to run in reverse dependency order.
+        arguments (dict): The keyword arguments for the action.
+        journal (Journal): Where to record the outcome of each config.
+        state (StateFile): Where to record the configs that succeeded.
+        preview_report (PreviewReport): Where to record the previews.
+        action (string): The Deployment method to execute. Defaults to
+            the action of `args`.
+    """
+    # The SDK is only imported when configs are actually executed
+    from cloud_foundation_toolkit.scheduler import DagScheduler
+
+    action = action or args.action
+    print_resources = getattr(args, 'print_resources', None) or 'each'
+    Deployment.PRINT_RESOURCES = print_resources
+    changed = []
+    started = set()
+
+    def run(config):
+        start = time.time()
+        started.add(config.id)
+        EVENTS.emit('started', config, action=action)
+        try:
+            with TRACER.span(config.deployment, 'deployment', node=config,
+                             action=action):
+                deployment = run_config(
+                    action,
+                    config,
+                    arguments,
+                    journal,
+                    state,
+                    preview_report
+                )
+        except (Exception, SystemExit) as err:
+            EVENTS.emit(
+                'failed',
+                config,
+                error='{}: {}'.format(type(err).__name__, err),
+                duration=round(time.time() - start, 3)
+            )
+            raise
+        duration = round(time.time() - start, 3)
+        if deployment.status == 'skipped':
+            EVENTS.emit('skipped', config, reason='up to date',
+                        duration=duration)
+        else:
+            EVENTS.emit('finished', config, status=deployment.status,
+                        duration=duration)
+        if print_resources == 'summary' and \
+                deployment.status in ('created', 'updated'):
+            changed.append(deployment)
+
+    graph = reversed(config_graph) if reverse else config_graph
+
+    parallelism = getattr(args, 'parallelism', 1) or 1
+    scheduler = getattr(args, 'scheduler', 'stages')
+
+    concurrent = parallelism > 1 or scheduler == 'dag'
+    if arguments.get('preview') and concurrent:
+        raise SystemExit(
+            '--preview is interactive and cannot be used with '
+            '--parallelism greater than 1 or the dag scheduler'
+        )
+
+    try:
+        if scheduler == 'dag':
+            failures, skipped = DagScheduler(
+                config_graph,
+                run,
+                parallelism,
+                reverse=reverse
+            ).run()
+            for config in skipped:
+                EVENTS.emit('skipped', config, reason='failed dependency')
+            if failures:
+                print_failures(failures, skipped)
+                raise SystemExit(
+                    '{} deployment(s) failed'.format(len(failures))
+                )
+        else:
+            stages = list(graph)
+            for i, stage in enumerate(stages, start=1):
+                print('---------- Stage {} ----------'.format(i))
+                for config in stage:
+                    EVENTS.emit('queued', config, stage=i)
                 try:
-                    method(**arguments)
-                except apitools_exceptions.HttpNotFoundError:
-                    LOG.warn('Deployment %s does not exit', config.deployment)
-                    if action != 'delete':
-                        raise
+                    with TRACER.span('stage {}'.format(i), 'stage'):
+                        run_stage(run, stage, parallelism, i)
+                except (Exception, SystemExit):
+                    for later in stages[i - 1:]:
+                        for config in later:
+                            if config.id not in started:
+                                EVENTS.emit('skipped', config,
+                                            reason='failed stage')
+                    raise
         print('------------------------------')
+    finally:
+        # Also lists what the run changed when it failed half-way
+        if changed:
+            print_changed_resources(changed)
+
+
+def run_stage(run, stage, parallelism, number):
+    """ Executes the action on all configs of a stage
+
+    Args:
+        run (function): Executes the action on a config.
+        stage (list): The configs of the stage.
+        parallelism (int): The number of configs executed concurrently.
+        number (int): The number of the stage, from 1.
+    """
+    from cloud_foundation_toolkit.parallel import run_parallel
+
+    if parallelism > 1:
+        failures = run_parallel(run, stage, parallelism)
+        if failures:
+            print_failures(failures)
+            raise SystemExit(
+                '{} deployment(s) failed in stage {}'.format(
+                    len(failures),
+                    number
+                )
+            )
+    else:
+        for config in stage:
+            run(config)
+
+
+def run_config(
+    action,
+    config,
+    arguments,
+    journal=None,
+    state=None,
+    preview_report=None
+):
+    """ Executes an action on a single config
+
+    Args:
+        action (string): The name of the Deployment method to execute.
+        config (Config): The config to execute the action on.
+        arguments (dict): The keyword arguments for the action.
+        journal (Journal): Where to record the outcome of the action.
+        state (StateFile): Where to record the config if it succeeded.
+        preview_report (PreviewReport): Where to record the preview
+            created by the `preview` action.
+
+    Returns: The Deployment object the action was executed on.
+    """
+
+    from apitools.base.py import exceptions as apitools_exceptions
+
+    LOG.debug('%s config %s', action, config.deployment)
+    deployment = Deployment(config)
+    method = getattr(deployment, action)
+    result = None
+    try:
+        result = method(**arguments)
+    except apitools_exceptions.HttpNotFoundError as err:
+        LOG.warn('Deployment %s does not exit', config.deployment)
+        if action != 'delete':
+            if journal:
+                journal.record(action, config, 'failed', error=err)
+            raise
+    except (Exception, SystemExit) as err:
+        # Aborted previews and failed operations surface as SystemExit
+        if journal:
+            journal.record(action, config, 'failed', error=err)
+        raise
+    else:
+        if deployment.status:
+            COUNTERS.increment('deployments.{}'.format(deployment.status))
+
+    if journal:
+        journal.record(action, config, 'succeeded', status=deployment.status)
+    if preview_report is not None and deployment.status == 'previewed':
+        preview_report.add(
+            config,
+            deployment.current.fingerprint,
+            deployment.digest,
+            result
+        )
+    # Previews don't change the deployments, and applying them from a
+    # preview report doesn't apply the current configs
+    if state and action == 'delete':
+        state.discard(config.id)
+    elif state and action in ACTION_MAP and not arguments.get('preview'):
+        state.update(config)
+    return deployment
+
+
+def print_changed_resources(deployments, workers=16):
+    """ Prints the resources changed by the run, and their outputs
+
+    The resources of all deployments are fetched concurrently, then
+    printed in the order of `deployments`.
+
+    Args:
+        deployments (list): The Deployment objects that were created or
+            updated.
+        workers (int): The maximum number of deployments fetched
+            concurrently.
+    """
+
+    with TRACER.span('print resources', 'print'), \
+            futures.ThreadPoolExecutor(min(workers, len(deployments))) as ex:
+        results = list(ex.map(lambda d: d.changed_resources(), deployments))
+
+    print('---------- Changed resources ----------')
+    for deployment, resources in zip(deployments, results):
+        print(
+            ' - project: {}, deployment: {} ({})'.format(
+                deployment.config['project'],
+                deployment.config['name'],
+                deployment.status
+            )
+        )
+        for resource, outputs in resources:
+            print('   - {} ({})'.format(resource.name, resource.type))
+            for name, value in sorted(outputs.items()):
+                print('       {}: {}'.format(name, value))
+
+
+def print_failures(failures, skipped=()):
+    """ Prints an aggregated report of failed deployments
+
+    Args:
+        failures (list): List of parallel.Failure objects whose items
+            are Config objects.
+        skipped (list): List of Config objects that were not executed
+            because a dependency failed.
+    """
+
+    print('---------- Failures ----------')
+    for failure in failures:
+        print(
+            ' - project: {}, deployment: {}, source: {}'.format(
+                failure.item.project,
+                failure.item.deployment,
+                failure.item.source
+            )
+        )
+        print('   {}: {}'.format(type(failure.error).__name__, failure.error))
+    if skipped:
+        print('---------- Skipped -----------')
+        for config in skipped:
+            print(
+                ' - project: {}, deployment: {}, source: {}'.format(
+                    config.project,
+                    config.deployment,
+                    config.source
+                )
+            )
+
+
+def log_api_calls():
+    """ Logs the DM API calls of the run by method and by deployment """
+
+    calls = api_calls()
+    LOG.debug('API calls: %s', calls['total'])
+    for method, count in sorted(calls['by_method'].items()):
+        LOG.debug('API calls to %s: %s', method, count)
+    for node, methods in sorted(calls['by_deployment'].items()):
+        LOG.debug(
+            'API calls for %s: %s',
+            node,
+            ', '.join('{} {}'.format(v, k) for k, v in sorted(methods.items()))
+        )
+
+
+def run_report():
+    """ Returns the counters of the run, as a JSON-serializable dict """
+
+    return {
+        'deployments': dict(COUNTERS.items('deployments.')),
+        'api': {
+            'calls': api_calls(),
+            'throttled': COUNTERS.get('api.throttled'),
+            'retried': COUNTERS.get('api.retried'),
+            'clients': COUNTERS.get('api.pool.clients'),
+            'pool_wait_ms': COUNTERS.get('api.pool.wait_ms')
+        },
+        'output_cache': {
+            'hits': OUTPUT_CACHE.hits,
+            'disk_hits': OUTPUT_CACHE.disk_hits,
+            'misses': OUTPUT_CACHE.misses
+        }
+    }
+
+
+def write_report(path):
+    """ Writes the run report to `path`, as JSON """
+
+    with open(path, 'w') as _fd:
+        json.dump(run_report(), _fd, indent=2, sort_keys=True)
+    LOG.debug('Run report written to %s', path)
+
+
+def print_summary():
+    """ Prints how many deployments were created, updated, skipped, etc """
+
+    counts = COUNTERS.items('deployments.')
+    if counts:
+        print('Deployments: {}'.format(
+            ', '.join('{} {}'.format(v, k) for k, v in counts)
+        ))
+    throttled = COUNTERS.get('api.throttled')
+    retried = COUNTERS.get('api.retried')
+    if throttled or retried:
+        print('API calls: {} throttled, {} retried'.format(throttled, retried))
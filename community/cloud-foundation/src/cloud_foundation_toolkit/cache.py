@@ -0,0 +1,186 @@
+# Copyright 2018 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Persistent cache of deployment outputs """
+
+import base64
+import errno
+import hashlib
+import json
+import os
+import os.path
+import tempfile
+
+from cloud_foundation_toolkit import LOG
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+    'cft'
+)
+
+# 64 MiB
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+
+class DiskCache(object):
+    """ On-disk cache of deployment outputs
+
+    There is one JSON file per deployment holding the outputs of the
+    deployment's manifest at the time they were cached. An entry is
+    only valid while the deployment still points to the same manifest,
+    which is cheap to check with a single `deployments.Get` call, so
+    unchanged deployments never have their manifests downloaded and
+    parsed again.
+
+    The cache is bounded in size: when it grows beyond `max_size`, the
+    least recently used entries are evicted.
+
+    Attributes:
+        directory (string): The directory holding the cache entries.
+        max_size (int): The maximum size of the cache, in bytes.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_size=DEFAULT_MAX_SIZE):
+        self.directory = os.path.join(directory, 'outputs')
+        self.max_size = max_size
+
+    def _path(self, project, deployment):
+        key = '{}/{}'.format(project, deployment).encode('utf-8')
+        return os.path.join(
+            self.directory,
+            '{}.json'.format(hashlib.sha1(key).hexdigest())
+        )
+
+    def _entries(self):
+        """ Returns a list of (path, size, mtime) of all entries """
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, project, deployment, manifest):
+        """ Returns the cached outputs of a deployment
+
+        Args:
+            project (string): The project of the deployment.
+            deployment (string): The name of the deployment.
+            manifest (string): The name of the deployment's current
+                manifest.
+
+        Returns: A dict of dicts, mapping resource names to their
+            outputs' names and values, or None if the deployment isn't
+            cached or was cached for another manifest.
+        """
+        path = self._path(project, deployment)
+        try:
+            with open(path) as _fd:
+                entry = json.load(_fd)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if entry.get('manifest') != manifest:
+            LOG.debug(
+                'Disk cache entry for %s/%s is stale (%s != %s)',
+                project,
+                deployment,
+                entry.get('manifest'),
+                manifest
+            )
+            return None
+
+        # Touch the entry so it is evicted last
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry['outputs']
+
+    def put(self, project, deployment, manifest, outputs, fingerprint=None):
+        """ Caches the outputs of a deployment's manifest
+
+        Args:
+            project (string): The project of the deployment.
+            deployment (string): The name of the deployment.
+            manifest (string): The name of the manifest the outputs
+                were obtained from.
+            outputs (dict): The outputs, as returned by `get()`.
+            fingerprint (bytes): The fingerprint of the deployment,
+                for information only.
+        """
+        try:
+            os.makedirs(self.directory)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+
+        entry = {
+            'project': project,
+            'deployment': deployment,
+            'manifest': manifest,
+            'fingerprint': fingerprint and base64.urlsafe_b64encode(
+                fingerprint
+            ).decode('ascii'),
+            'outputs': outputs
+        }
+
+        # Write to a temp file and rename it, so concurrent runs never
+        # read a partially written entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as _fd:
+            json.dump(entry, _fd)
+        os.rename(tmp_path, self._path(project, deployment))
+        self.evict()
+
+    def evict(self):
+        """ Deletes the least recently used entries beyond `max_size` """
+        entries = sorted(self._entries(), key=lambda e: e[2], reverse=True)
+        total = 0
+        for path, size, _ in entries:
+            total += size
+            if total > self.max_size:
+                LOG.debug('Evicting disk cache entry %s', path)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def clear(self):
+        """ Deletes all entries
+
+        Returns: The number of entries deleted.
+        """
+        entries = self._entries()
+        for path, _, _ in entries:
+            os.remove(path)
+        return len(entries)
+
+    def stats(self):
+        """ Returns a dict describing the contents of the cache """
+        entries = self._entries()
+        return {
+            'directory': self.directory,
+            'entries': len(entries),
+            'size': sum(e[1] for e in entries),
+            'max_size': self.max_size
+        }
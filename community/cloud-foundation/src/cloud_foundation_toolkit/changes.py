@@ -0,0 +1,205 @@
+# Copyright 2018 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Detection of the configs changed since a previous run """
+
+import hashlib
+import io
+import json
+import os
+import os.path
+import subprocess
+import tempfile
+import threading
+
+from cloud_foundation_toolkit import LOG
+from cloud_foundation_toolkit.target_config import CONTENT_CACHE
+from cloud_foundation_toolkit.target_config import is_url
+from cloud_foundation_toolkit.target_config import resolve_imports
+
+
+def _resolve(config, cache):
+    """ Returns the resolved imports of a config, or None if unresolvable
+    """
+    imports = config.as_dict.get('imports', []) or []
+    if any(is_url(i.get('path', '')) for i in imports):
+        return None
+    try:
+        return resolve_imports(imports, os.getcwd(), cache)
+    except (IOError, ValueError) as err:
+        LOG.debug('Unable to resolve the imports of %s: %s', config, err)
+        return None
+
+
+def config_fingerprint(config, cache=CONTENT_CACHE):
+    """ Returns a digest of a config and all the files it imports
+
+    Args:
+        config (Config): The config.
+        cache (ContentCache): The cache to read the imported files from.
+
+    Returns: A sha256 hex string, or None if the imports of the config
+        can't be resolved locally (ie URLs), in which case the config
+        must always be considered changed.
+    """
+    resolved = _resolve(config, cache)
+    if resolved is None:
+        return None
+    digest = hashlib.sha256(config.as_string.encode('utf-8'))
+    for name, imported in sorted(resolved, key=lambda i: i[0]):
+        digest.update(b'\0' + name.encode('utf-8') + b'\0')
+        digest.update(imported.digest.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def config_files(config, cache=CONTENT_CACHE):
+    """ Returns the absolute paths of a config file and its imports
+
+    Returns: A set of paths, or None if the config is not a file or its
+        imports can't be resolved locally.
+    """
+    resolved = _resolve(config, cache)
+    if resolved is None or not os.path.isfile(config.source):
+        return None
+    paths = set(os.path.realpath(imported.path) for _, imported in resolved)
+    paths.add(os.path.realpath(config.source))
+    return paths
+
+
+def _key(node):
+    return '{}/{}'.format(node.project, node.deployment)
+
+
+class StateFile(object):
+    """ Content hashes of the configs, as of their last successful run
+
+    The file is a JSON object mapping "project/deployment" to the
+    fingerprint of the config (see `config_fingerprint()`).
+
+    Attributes:
+        path (string): The path of the state file.
+        fingerprints (dict): The fingerprints, by "project/deployment".
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with io.open(path, encoding='utf-8') as _fd:
+                self.fingerprints = json.load(_fd)
+        except IOError:
+            self.fingerprints = {}
+        except ValueError:
+            raise SystemExit('Invalid state file: {}'.format(path))
+
+    def changed(self, configs):
+        """ Returns the nodes whose config changed since the last run
+
+        Args:
+            configs (dict): Config objects keyed by Node.
+
+        Returns: A set of Node objects.
+        """
+        changed = set()
+        for node, config in configs.items():
+            fingerprint = config_fingerprint(config)
+            if fingerprint is None or \
+                    self.fingerprints.get(_key(node)) != fingerprint:
+                changed.add(node)
+        return changed
+
+    def update(self, config):
+        fingerprint = config_fingerprint(config)
+        with self._lock:
+            if fingerprint is None:
+                self.fingerprints.pop(_key(config.id), None)
+            else:
+                self.fingerprints[_key(config.id)] = fingerprint
+
+    def discard(self, node):
+        with self._lock:
+            self.fingerprints.pop(_key(node), None)
+
+    def save(self):
+        """ Writes the state file atomically """
+        with self._lock:
+            content = json.dumps(self.fingerprints, indent=2, sort_keys=True)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        _fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(_fd, 'w') as tmp:
+            tmp.write(content)
+        os.rename(tmp_path, self.path)
+
+
+def git_changed_files(ref):
+    """ Returns the files changed since a git ref
+
+    Both committed and uncommitted changes count, as well as untracked
+    files.
+
+    Args:
+        ref (string): Any git revision, ie a branch, tag or commit.
+
+    Returns: A set of absolute paths, or None if `ref` is not a
+        revision of the git repository of the current directory.
+    """
+
+    def git(*args, **kwargs):
+        with open(os.devnull, 'w') as devnull:
+            output = subprocess.check_output(
+                ('git',) + args,
+                stderr=devnull,
+                cwd=kwargs.get('cwd')
+            )
+        return output.decode('utf-8').splitlines()
+
+    try:
+        toplevel = git('rev-parse', '--show-toplevel')[0]
+        git('rev-parse', '--verify', '--quiet', ref + '^{commit}')
+        # Both commands list paths relative to the top-level directory
+        changed = git('diff', '--name-only', ref, '--', cwd=toplevel)
+        changed += git('ls-files', '--others', '--exclude-standard',
+                       cwd=toplevel)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return set(
+        os.path.realpath(os.path.join(toplevel, path)) for path in changed
+    )
+
+
+def changed_configs(since, configs):
+    """ Returns the configs changed since a state file or a git ref
+
+    Args:
+        since (string): The path of an existing state file, or a git
+            revision.
+        configs (dict): Config objects keyed by Node.
+
+    Returns: A set of Node objects.
+    """
+
+    if os.path.isfile(since):
+        return StateFile(since).changed(configs)
+
+    changed_files = git_changed_files(since)
+    if changed_files is None:
+        raise SystemExit(
+            '--changed-since: {} is neither a state file nor a git '
+            'revision'.format(since)
+        )
+    changed = set()
+    for node, config in configs.items():
+        paths = config_files(config)
+        if paths is None or paths & changed_files:
+            changed.add(node)
+    return changed
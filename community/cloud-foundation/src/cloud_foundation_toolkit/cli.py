@@ -20,7 +20,11 @@ import sys
 
 from cloud_foundation_toolkit import __VERSION__ as CFT_VERSION
 from cloud_foundation_toolkit import LOG
-from cloud_foundation_toolkit.actions import execute
+from cloud_foundation_toolkit.cache import DEFAULT_CACHE_DIR
+from cloud_foundation_toolkit.cache import DEFAULT_MAX_SIZE
+from cloud_foundation_toolkit.clients import DEFAULT_POOL_SIZE
+from cloud_foundation_toolkit.ratelimit import DEFAULT_QPS
+from cloud_foundation_toolkit.ratelimit import DEFAULT_RETRIES
 
 
 def build_common_args(parser):
@@ -32,6 +36,43 @@ def build_common_args(parser):
         nargs='+',
         help='The path to the config files or directory'
     )
+    parser.add_argument(
+        '--recursive',
+        '-R',
+        action='store_true',
+        default=False,
+        help='Also look for configs in the subdirectories of directories'
+    )
+    parser.add_argument(
+        '--include',
+        action='append',
+        metavar='PATTERN',
+        default=None,
+        help=(
+            'Only pick the files of directories whose path, relative to the '
+            'directory, matches this glob pattern. Can be repeated. Defaults '
+            'to *.yaml, *.yml and *.jinja'
+        )
+    )
+    parser.add_argument(
+        '--exclude',
+        action='append',
+        metavar='PATTERN',
+        default=None,
+        help=(
+            'Leave out the files of directories whose path, relative to the '
+            'directory, matches this glob pattern. Can be repeated'
+        )
+    )
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=None,
+        help=(
+            'The number of processes rendering and parsing the configs. '
+            'Defaults to the number of CPUs for 100 configs or more'
+        )
+    )
     parser.add_argument(
         '--show-stages',
         '-s',
@@ -51,6 +92,72 @@ def build_common_args(parser):
         default='human',
         help='The format of the output'
     )
+    parser.add_argument(
+        '--parallelism',
+        '-j',
+        type=int,
+        default=1,
+        help=(
+            'The maximum number of deployments processed concurrently (16 '
+            'for plan, 1 otherwise). The output of each deployment is '
+            'printed when it finishes'
+        )
+    )
+
+
+def build_execution_args(parser):
+    """ Configures arguments to the actions that execute deployments """
+
+    parser.add_argument(
+        '--scheduler',
+        choices=['stages',
+                 'dag'],
+        default='stages',
+        help=(
+            'How configs are scheduled. "stages" processes the configs '
+            'stage by stage. "dag" starts each config as soon as all the '
+            'configs it depends on are done, prioritizing the critical path '
+            '(delete walks the dependencies in reverse)'
+        )
+    )
+    parser.add_argument(
+        '--journal',
+        metavar='FILE',
+        default=None,
+        help=(
+            'Record the outcome of each config in FILE as the run '
+            'progresses, so a failed run can be resumed with --resume'
+        )
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        default=False,
+        help=(
+            'Resume the last run recorded in the --journal FILE: only the '
+            'configs that failed, did not run, or changed since, and the '
+            'configs downstream of them, are executed'
+        )
+    )
+    parser.add_argument(
+        '--changed-since',
+        metavar='GIT_REF|STATE_FILE',
+        default=None,
+        help=(
+            'Only execute the configs that changed, along with their '
+            'imported files, since a git revision or since they were '
+            'recorded in a state file, plus the configs downstream of them'
+        )
+    )
+    parser.add_argument(
+        '--state-file',
+        default=None,
+        help=(
+            'The file where the content hash of each config is recorded '
+            'when it succeeds, for use with --changed-since. Defaults to '
+            'the --changed-since file, if it is one'
+        )
+    )
 
 
 def parse_args(args):
@@ -74,6 +181,107 @@ def parse_args(args):
         )
     )
     parser.add_argument('--verbosity', default='warning', help='The log level')
+    parser.add_argument(
+        '--yaml-backend',
+        choices=['fast',
+                 'roundtrip'],
+        default=None,
+        help=(
+            'The YAML parser used for configs and manifests. "fast" uses '
+            'the C extension of ruamel.yaml, if installed, and does not '
+            'preserve comments or key order. Defaults to the '
+            'CFT_YAML_BACKEND environment variable, or "roundtrip"'
+        )
+    )
+    parser.add_argument(
+        '--api-connections',
+        type=int,
+        default=DEFAULT_POOL_SIZE,
+        help=(
+            'The maximum number of DM API clients, each with its own '
+            'connection, ie the maximum number of concurrent API calls'
+        )
+    )
+    parser.add_argument(
+        '--api-qps',
+        type=float,
+        default=DEFAULT_QPS,
+        help=(
+            'The maximum number of DM API calls per second to each '
+            'project. 0 disables the limit'
+        )
+    )
+    parser.add_argument(
+        '--api-retries',
+        type=int,
+        default=DEFAULT_RETRIES,
+        help=(
+            'The maximum number of retries of DM API calls failing with '
+            'HTTP 429 or 5xx errors, or with transport errors'
+        )
+    )
+    parser.add_argument(
+        '--trace',
+        metavar='FILE',
+        help=(
+            'Record the timing of config loading, dependency resolution, '
+            'API calls, operation waits and resource printing, and write '
+            'it to FILE as Chrome trace events (see chrome://tracing)'
+        )
+    )
+    parser.add_argument(
+        '--events',
+        choices=['ndjson'],
+        default=None,
+        help=(
+            'Write one JSON object per line to the standard output for '
+            'each state change of the deployments (queued, started, '
+            'operation, progress, finished, skipped or failed), as it '
+            'happens. The human-readable output goes to standard error'
+        )
+    )
+    parser.add_argument(
+        '--report',
+        metavar='FILE',
+        help=(
+            'Write a JSON report of the run to FILE, with the deployments '
+            'created, updated, etc, and the DM API calls per method and '
+            'per deployment'
+        )
+    )
+    parser.add_argument(
+        '--max-api-calls',
+        type=int,
+        default=None,
+        help=(
+            'Fail the run if it made more than this number of DM API '
+            'calls, ie to catch regressions in call volume in CI'
+        )
+    )
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        default=False,
+        help=(
+            'Cache the outputs of the deployments referenced by the configs '
+            'on disk. Cached outputs are used for as long as the deployment '
+            'is not updated'
+        )
+    )
+    parser.add_argument(
+        '--cache-dir',
+        default=DEFAULT_CACHE_DIR,
+        help='The directory of the on-disk cache'
+    )
+    parser.add_argument(
+        '--cache-max-size',
+        type=int,
+        default=DEFAULT_MAX_SIZE // (1024 * 1024),
+        help=(
+            'The maximum size of the on-disk cache in MiB. The least '
+            'recently used entries are evicted beyond this size'
+        )
+    )
 
     # subparser for each action
     subparser_obj = parser.add_subparsers(dest='action')
@@ -83,6 +291,7 @@ def parse_args(args):
     for action in actions:
         subparsers[action] = subparser_obj.add_parser(action)
         build_common_args(subparsers[action])
+        build_execution_args(subparsers[action])
 
     # action-specficic arguments
     #
@@ -103,6 +312,110 @@ def parse_args(args):
         default=False,
         help='Preview changes'
     )
+    subparsers['update'].add_argument(
+        '--force',
+        action='store_true',
+        default=False,
+        help=(
+            'Update deployments even if their config and imported files '
+            'did not change since their last update'
+        )
+    )
+
+    # delete
+    subparsers['delete'].add_argument(
+        '--delete-policy',
+        choices=['DELETE',
+                 'ABANDON'],
+        default=None,
+        help=(
+            'What happens to the resources of the deleted deployments: '
+            '"DELETE" (the default) deletes them, "ABANDON" only removes '
+            'them from Deployment Manager. Deployments are only abandoned '
+            'along with the configs depending on them'
+        )
+    )
+
+    for action in ['apply', 'create', 'update']:
+        subparsers[action].add_argument(
+            '--print-resources',
+            choices=['each',
+                     'summary',
+                     'none'],
+            default='each',
+            help=(
+                'How resources and outputs are printed: "each" lists all '
+                'resources of each deployment once it was changed, '
+                '"summary" lists the resources changed by the run at its '
+                'end, and "none" does not list them'
+            )
+        )
+
+    for action in ['apply', 'create', 'update']:
+        subparsers[action].add_argument(
+            '--preview-report',
+            metavar='FILE',
+            default=None,
+            help=(
+                'Preview the changes of all deployments without prompting, '
+                'concurrently with --parallelism, and write them to FILE. '
+                'The previews are left pending, to be applied or cancelled '
+                'with apply --from-preview-report'
+            )
+        )
+    subparsers['apply'].add_argument(
+        '--from-preview-report',
+        metavar='FILE',
+        default=None,
+        help=(
+            'Apply the pending previews recorded in FILE by '
+            '--preview-report, unless their deployment changed since'
+        )
+    )
+    subparsers['apply'].add_argument(
+        '--cancel-previews',
+        action='store_true',
+        default=False,
+        help='With --from-preview-report, cancel the previews instead'
+    )
+
+    # plan
+    subparsers['plan'] = subparser_obj.add_parser(
+        'plan',
+        help=(
+            'Show what updating the deployments would change, by comparing '
+            'the configs with the current manifests, without previews'
+        )
+    )
+    build_common_args(subparsers['plan'])
+    # Planning only reads from the API, all configs are planned at once
+    subparsers['plan'].set_defaults(parallelism=16)
+    subparsers['plan'].add_argument(
+        '--diff',
+        action='store_true',
+        default=False,
+        help='Also print the diff of the configs and imported files'
+    )
+
+    # cache
+    subparsers['cache'] = subparser_obj.add_parser(
+        'cache',
+        help='Manage the on-disk cache of deployment outputs'
+    )
+    subparsers['cache'].add_argument(
+        'command',
+        choices=['clear',
+                 'stats'],
+        help='Delete all entries, or show the size of the cache'
+    )
+    subparsers['cache'].add_argument(
+        '--format',
+        '-f',
+        choices=['human',
+                 'json'],
+        default='human',
+        help='The format of the output'
+    )
 
     # upsert
     subparsers['apply'].add_argument(
@@ -112,6 +425,15 @@ def parse_args(args):
         default=False,
         help='Preview changes'
     )
+    subparsers['apply'].add_argument(
+        '--force',
+        action='store_true',
+        default=False,
+        help=(
+            'Update deployments even if their config and imported files '
+            'did not change since their last update'
+        )
+    )
     subparsers['apply'].add_argument(
         '--reverse',
         '-r',
@@ -131,6 +453,9 @@ def main():
 
     # logging
     LOG.setLevel(args.verbosity.upper())
+
+    # Imported here so --help and --version don't load the whole toolkit
+    from cloud_foundation_toolkit.actions import execute
     execute(args)
 
 
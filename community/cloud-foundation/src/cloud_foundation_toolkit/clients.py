@@ -0,0 +1,230 @@
+# Copyright 2018 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Pool of DM API clients, safe to use from concurrent threads """
+
+from contextlib import contextmanager
+import threading
+import time
+
+from cloud_foundation_toolkit import LOG
+from cloud_foundation_toolkit import register_credential_providers
+from cloud_foundation_toolkit.metrics import COUNTERS
+from cloud_foundation_toolkit.ratelimit import RATE_LIMITER
+from cloud_foundation_toolkit.ratelimit import RETRY_POLICY
+from cloud_foundation_toolkit.tracing import TRACER
+
+# Default maximum number of clients, ie of concurrent API calls
+DEFAULT_POOL_SIZE = 16
+
+
+def new_dm_client():
+    """ Returns a new DM API client, with its own HTTP transport """
+    register_credential_providers()
+    from googlecloudsdk.api_lib.util import apis
+    return apis.GetClientInstance('deploymentmanager', 'v2')
+
+
+def count_call(service, method, request=None):
+    """ Accounts for a DM API call, by method and by deployment
+
+    Calls are counted in the 'api.calls' counter, and in the
+    'api.calls.<service>.<method>' and
+    'api.deployment_calls.<project>/<deployment>.<service>.<method>'
+    counters. Calls whose request is not about a deployment (ie
+    operations.Get) are accounted to the '<project>/-' deployment.
+    """
+    name = '{}.{}'.format(service, method)
+    # The deployment of an Insert request is a Deployment message
+    deployment = getattr(request, 'deployment', None)
+    deployment = getattr(deployment, 'name', deployment)
+    node = '{}/{}'.format(
+        getattr(request, 'project', None) or '-',
+        deployment or '-'
+    )
+    COUNTERS.increment('api.calls')
+    COUNTERS.increment('api.calls.' + name)
+    COUNTERS.increment('api.deployment_calls.{}.{}'.format(node, name))
+
+
+def api_calls():
+    """ Returns the DM API calls made so far
+
+    Returns: A dict with the 'total' number of calls, the calls
+        'by_method' (ie 'deployments.Get'), and the calls
+        'by_deployment' ('project/deployment'), per method.
+    """
+    by_deployment = {}
+    for key, value in COUNTERS.items('api.deployment_calls.'):
+        node, service, method = key.rsplit('.', 2)
+        by_deployment.setdefault(node, {})[service + '.' + method] = value
+    return {
+        'total': COUNTERS.get('api.calls'),
+        'by_method': dict(COUNTERS.items('api.calls.')),
+        'by_deployment': by_deployment
+    }
+
+
+class ClientPool(object):
+    """ Bounded pool of DM API clients
+
+    The SDK's clients use httplib2 transports, which are not safe to
+    use from concurrent threads. Each API call checks a client out of
+    the pool for its own exclusive use, and returns it afterwards, so
+    its connection is kept alive for the next call. Clients are created
+    on demand, up to `size`; beyond that, callers wait for a client to
+    be returned.
+
+    ```
+    with POOL.client() as client:
+        client.deployments.Get(request)
+    ```
+
+    The time spent waiting for a client is recorded in the
+    'api.pool.wait_ms' counter, along with 'api.pool.checkouts' and
+    'api.pool.clients' (the number of clients created).
+
+    Attributes:
+        size (int): The maximum number of clients.
+        factory (function): Creates a new client.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, factory=new_dm_client):
+        self.size = size
+        self.factory = factory
+        self._idle = []
+        self._created = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def client(self):
+        start = time.time()
+        client = None
+        with self._condition:
+            while not self._idle and self._created >= self.size:
+                self._condition.wait()
+            if self._idle:
+                # Most recently used first, its connection is the most
+                # likely to still be open
+                client = self._idle.pop()
+            else:
+                self._created += 1
+
+        if client is None:
+            try:
+                client = self.factory()
+            except Exception:
+                with self._condition:
+                    self._created -= 1
+                    self._condition.notify()
+                raise
+            COUNTERS.increment('api.pool.clients')
+            LOG.debug('Created DM API client #%s', self._created)
+
+        COUNTERS.increment('api.pool.checkouts')
+        COUNTERS.increment('api.pool.wait_ms',
+                           int((time.time() - start) * 1000))
+        try:
+            yield client
+        finally:
+            with self._condition:
+                self._idle.append(client)
+                self._condition.notify()
+
+    def clear(self):
+        """ Drops all idle clients, ie when changing the factory """
+        with self._condition:
+            self._created -= len(self._idle)
+            del self._idle[:]
+
+
+class PooledService(object):
+    """ A service of the DM API (ie deployments), backed by a ClientPool
+
+    This is where every DM API call goes through. Each call is counted,
+    waits for the rate limiter of the project of the request, then
+    checks a client out of the pool for the duration of the call.
+    Transient failures of reads are retried by the retry policy, while
+    mutations (ie deployments.Insert) are only retried when throttled.
+    Without `retry`, failed calls are never retried.
+    """
+
+    # Methods that can be retried after any transient failure
+    IDEMPOTENT_METHODS = ('Get', 'List')
+
+    def __init__(self, pool, name, retry=True):
+        self._pool = pool
+        self._name = name
+        self._retry = retry
+
+    def __getattr__(self, method):
+        if method.startswith('_'):
+            raise AttributeError(method)
+
+        def attempt(*args, **kwargs):
+            project = getattr(args[0], 'project', None) if args else None
+            RATE_LIMITER.acquire(project)
+            with self._pool.client() as client:
+                service = getattr(client, self._name)
+                return getattr(service, method)(*args, **kwargs)
+
+        if method in self.IDEMPOTENT_METHODS:
+            retry = RETRY_POLICY.call
+        else:
+            retry = RETRY_POLICY.call_mutation
+
+        def call(*args, **kwargs):
+            count_call(self._name, method, args[0] if args else None)
+            with TRACER.span('{}.{}'.format(self._name, method), 'api'):
+                if not self._retry:
+                    return attempt(*args, **kwargs)
+                return retry(attempt, *args, **kwargs)
+
+        call.__name__ = str(method)
+        return call
+
+
+class PooledClient(object):
+    """ Drop-in replacement of a DM API client, backed by a ClientPool
+
+    ```
+    client = PooledClient(POOL)
+    client.deployments.Get(request)
+    ```
+
+    Args:
+        pool (ClientPool): The clients serving the calls.
+        retry (boolean): Whether transient failures are retried, see
+            PooledService.
+    """
+
+    def __init__(self, pool, retry=True):
+        self._pool = pool
+        self._retry = retry
+        self._services = {}
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        # The same object is returned every time, so it can be patched
+        return self._services.setdefault(
+            name,
+            PooledService(self._pool, name, self._retry)
+        )
+
+
+POOL = ClientPool()
+CLIENT = PooledClient(POOL)
+# The operations poller reschedules failed polls itself, rather than
+# stalling the polls of all other operations while a call is retried
+POLL_CLIENT = PooledClient(POOL, retry=False)
@@ -1,36 +1,29 @@
-import base64
 from collections import namedtuple
 import io
+import multiprocessing
 import os
 import os.path
-import re
 from six.moves import input
 import sys
 import tempfile
 
-from apitools.base.py import exceptions as apitools_exceptions
-from googlecloudsdk.api_lib.deployment_manager import dm_api_util
-from googlecloudsdk.api_lib.deployment_manager import dm_base
-from googlecloudsdk.api_lib.deployment_manager import exceptions as dm_exceptions
-from googlecloudsdk.command_lib.deployment_manager import dm_util
-from googlecloudsdk.command_lib.deployment_manager import dm_write
-from googlecloudsdk.command_lib.deployment_manager import flags
-from googlecloudsdk.command_lib.deployment_manager.importer import BuildConfig
-from googlecloudsdk.command_lib.deployment_manager.importer import BuildTargetConfig
-from googlecloudsdk.core.resource import resource_printer
-from googlecloudsdk.third_party.apis.deploymentmanager.v2 import deploymentmanager_v2_messages as messages
+from concurrent import futures
 import jinja2
 import networkx as nx
 
 from cloud_foundation_toolkit import LOG
 from cloud_foundation_toolkit.dm_utils import DM_API
-from cloud_foundation_toolkit.dm_utils import DM_OUTPUT_QUERY_REGEX
-from cloud_foundation_toolkit.dm_utils import DMOutputQueryAttributes
+from cloud_foundation_toolkit.dm_utils import find_dm_output_queries
 from cloud_foundation_toolkit.dm_utils import get_deployment
-from cloud_foundation_toolkit.dm_utils import get_deployment_output
-from cloud_foundation_toolkit.dm_utils import parse_dm_output_url
-from cloud_foundation_toolkit.dm_utils import parse_dm_output_token
-from cloud_foundation_toolkit.yaml_utils import CFTBaseYAML
+from cloud_foundation_toolkit.dm_utils import OUTPUT_CACHE
+from cloud_foundation_toolkit.dm_utils import resolve_dm_outputs
+from cloud_foundation_toolkit.events import EVENTS
+from cloud_foundation_toolkit.target_config import build_target_config
+from cloud_foundation_toolkit.target_config import is_url
+from cloud_foundation_toolkit.target_config import target_digest
+from cloud_foundation_toolkit.tracing import TRACER
+from cloud_foundation_toolkit import yaml_utils
+from cloud_foundation_toolkit.yaml_utils import new_yaml
 
 Node = namedtuple('Node', ['project', 'deployment'])
 
@@ -55,7 +48,6 @@ class Config(object):
         source (string): The path or the raw content of config (obtained
             by base64-decoding the 'id' attribute
     """
-    yaml = CFTBaseYAML()
 
     def __init__(self, item, project=None):
         """ Contructor """
@@ -71,13 +63,10 @@ class Config(object):
         else:
             self.as_string = jinja2.Template(item).render(env=os.environ)
 
-        # YAML gets parsed twice:
-        # 1. Here, to figure out deployment name, project and dependency list.
-        # 2. When the Deployment() obj gets instantiated (to get the value of
-        #    the output from the DM API)
-        # This approach takes more CPU, but it's less error prone than
-        # scanning the file ourselves.
-        self.as_dict = self.yaml.load(self.as_string)
+        # The config is rendered and parsed once. The dependencies are
+        # found in the parsed tree, and the Deployment resolves the
+        # references on that same tree, without parsing it again.
+        self.as_dict = new_yaml().load(self.as_string)
 
     @property
     def as_file(self):
@@ -109,8 +98,10 @@ class Config(object):
         """
         if not hasattr(self, '_project'):
             self._project = self.as_dict.get('project') or \
-                os.environ.get('CLOUD_FOUNDATION_PROJECT_ID') or \
-                dm_base.GetProject()
+                os.environ.get('CLOUD_FOUNDATION_PROJECT_ID')
+        if not self._project:
+            from googlecloudsdk.api_lib.deployment_manager import dm_base
+            self._project = dm_base.GetProject()
         return self._project
 
     @property
@@ -120,29 +111,29 @@ class Config(object):
         if hasattr(self, '_dependencies'):
             return self._dependencies
 
-        self._dependencies = set()
-        for line in self.as_file.readlines():
-            # Ignore comments
-            if re.match(r'^\s*#', line):
-                continue
-
-            # Match !DMOutput, $(out.x.y.w.z), etc tokens
-            for match in DM_OUTPUT_QUERY_REGEX.finditer(line):
-                for k, v in match.groupdict().items():
-                    if not v:
-                        continue
-                    if k == 'url':
-                        url = parse_dm_output_url(v, self.project)
-                    elif k == 'token':
-                        url = parse_dm_output_token(v, self.project)
-                    self._dependencies.add(Node(url.project, url.deployment))
-
+        self._dependencies = set(
+            Node(query.project, query.deployment)
+            for query in find_dm_output_queries(self.as_dict, self.project)
+        )
         return self._dependencies
 
     def __repr__(self):
         return '{}({}:{})'.format(self.__class__, self.deployment, self.project)
 
 
+def load_configs(items, project=None, yaml_backend=None):
+    """ Renders and parses a chunk of configs in a worker process
+
+    The YAML backend selected in the parent process is passed along, as
+    worker processes don't necessarily inherit it.
+
+    Returns: A list of Config objects
+    """
+    if yaml_backend:
+        yaml_utils.set_backend(yaml_backend)
+    return [Config(item, project=project) for item in items]
+
+
 class ConfigGraph(object):
     """ Class representing the dependency graph between configs
 
@@ -167,28 +158,81 @@ class ConfigGraph(object):
 
     """
 
-    def __init__(self, configs, project=None):
-        """ Constructor """
+    # Maximum number of external dependencies fetched concurrently
+    PREFETCH_WORKERS = 16
+
+    # Minimum number of configs worth starting a process pool for
+    PROCESS_POOL_THRESHOLD = 100
+
+    def __init__(self, configs, project=None, processes=None):
+        """ Constructor
+
+        Args:
+            configs (list): The config files or strings.
+            project (string): The project of all configs, if any.
+            processes (int): The number of processes rendering and
+                parsing the configs. Defaults to the number of CPUs
+                when there are at least PROCESS_POOL_THRESHOLD configs,
+                and to 1 (no process pool) otherwise.
+        """
+
+        configs = list(configs)
+        if processes is None:
+            processes = 1
+            if len(configs) >= self.PROCESS_POOL_THRESHOLD:
+                processes = multiprocessing.cpu_count()
+
+        with TRACER.span('load configs', 'config', configs=len(configs),
+                         processes=processes):
+            if processes > 1 and len(configs) > 1:
+                LOG.debug('Loading %s configs with %s processes',
+                          len(configs), processes)
+                # A few chunks per process balance the load without
+                # paying the inter-process round trip for every config
+                size = max(1, len(configs) // (processes * 4))
+                chunks = [
+                    configs[i:i + size] for i in range(0, len(configs), size)
+                ]
+                with futures.ProcessPoolExecutor(processes) as executor:
+                    results = [
+                        executor.submit(
+                            load_configs,
+                            chunk,
+                            project,
+                            yaml_utils.get_backend()
+                        ) for chunk in chunks
+                    ]
+                    loaded = [c for r in results for c in r.result()]
+            else:
+                loaded = [Config(x, project=project) for x in configs]
 
         # Populate the config dict
-        self.configs = {
-            c.id: c for c in (Config(x,
-                                     project=project) for x in configs)
-        }
+        self.configs = {c.id: c for c in loaded}
 
     @property
     def graph(self):
         if hasattr(self, '_graph'):
             return self._graph
-        self._graph = nx.DiGraph()
-        for _, config in self.configs.items():
-            node = Node(config.project, config.deployment)
-            self._graph.add_node(node)
-            for dependency in config.dependencies:
-                self.graph.add_edge(dependency, node)
-
-            if not nx.is_directed_acyclic_graph(self._graph):
-                raise SystemExit('Cyclic dependency in the graph')
+        graph = nx.DiGraph()
+        with TRACER.span('build graph', 'dependencies'):
+            for _, config in self.configs.items():
+                node = Node(config.project, config.deployment)
+                graph.add_node(node)
+                graph.add_edges_from((d, node) for d in config.dependencies)
+
+        # A single check once the graph is complete, as checking after
+        # each config makes building the graph quadratic
+        if not nx.is_directed_acyclic_graph(graph):
+            cycle = [edge[0] for edge in nx.find_cycle(graph)]
+            raise SystemExit(
+                'Cyclic dependency in the graph: {}'.format(
+                    ' -> '.join(
+                        '{}/{}'.format(n.project, n.deployment)
+                        for n in cycle + cycle[:1]
+                    )
+                )
+            )
+        self._graph = graph
         return self._graph
 
     @property
@@ -199,48 +243,153 @@ class ConfigGraph(object):
             ]
         return self._roots
 
+    @property
+    def external_nodes(self):
+        """ Nodes the configs depend on that are not in the configs """
+        return [n for n in self.graph.nodes() if n not in self.configs]
+
+    def check_external_nodes(self):
+        """ Makes sure all external dependencies exist in DM
+
+        If a node is not in a provided config, it must be a dependency,
+        so we make sure it exists in DM, without attempting to load an
+        unexisting config.
+
+        All external nodes are fetched concurrently, and through the
+        run-scoped OUTPUT_CACHE, so the fetched deployments are reused
+        when resolving their outputs later on. All unresolved
+        dependencies are reported at once.
+        """
+        if getattr(self, '_external_nodes_checked', False):
+            return
+
+        nodes = self.external_nodes
+        if nodes:
+            workers = min(self.PREFETCH_WORKERS, len(nodes))
+            with TRACER.span('check external dependencies', 'dependencies',
+                             nodes=len(nodes)), \
+                    futures.ThreadPoolExecutor(workers) as executor:
+                deployments = executor.map(
+                    lambda n: OUTPUT_CACHE.deployment(n.project, n.deployment),
+                    nodes
+                )
+                unresolved = [
+                    n for n, d in zip(nodes, list(deployments)) if not d
+                ]
+            if unresolved:
+                raise SystemExit(
+                    'Unresolved dependencies. The following deployments, on '
+                    'which other deployments depend, were neither specified '
+                    'in the submitted configs nor exist in Deployment '
+                    'Manager:\n{}'.format(
+                        '\n'.join(
+                            ' - project: {}, deployment: {}'.format(*n)
+                            for n in unresolved
+                        )
+                    )
+                )
+        self._external_nodes_checked = True
+
     @property
     def levels(self):
         if hasattr(self, '_levels'):
             return self._levels
 
-        graph = self.graph.copy()
-        remaining_nodes = list(self.sort())
-        self._levels = []
+        self.check_external_nodes()
 
-        while remaining_nodes:
-            level_nodes, level_configs = [], []
-
-            # Find the nodes in the level
-            for node in remaining_nodes:
-                if not nx.ancestors(graph, node):
-                    level_nodes.append(node)
+        # Kahn's algorithm, one level at a time: a level holds the nodes
+        # whose predecessors are all in previous levels. Each node and
+        # edge is visited once. External nodes were already checked
+        in_degree = dict(self.graph.in_degree())
+        level_nodes = [n for n, degree in in_degree.items() if not degree]
+        self._levels = []
 
-            # Find and load configs in the level
-            # If a node is not in a provided config, it must be a
-            # dependency, so we make sure it exists in DM, without
-            # attempting to load an unexisting config
+        while level_nodes:
+            next_level_nodes = []
             for node in level_nodes:
-                remaining_nodes.remove(node)
-                graph.remove_node(node)
-
-                if node in self.configs:
-                    level_configs.append(self.configs[node])
-                else:
-                    deployment = get_deployment(node.project, node.deployment)
-                    if not deployment:
-                        raise SystemExit(
-                            'Unresolved dependency. Resource {}, on which'
-                            'other resources depended, neither was specified'
-                            'in the submitted congigs nor existed in'
-                            'Deployment Manager'.format(node)
-                        )
+                for successor in self.graph.successors(node):
+                    in_degree[successor] -= 1
+                    if not in_degree[successor]:
+                        next_level_nodes.append(successor)
 
+            level_configs = [
+                self.configs[n] for n in level_nodes if n in self.configs
+            ]
             if level_configs:
                 self._levels.append(level_configs)
+            level_nodes = next_level_nodes
 
         return self._levels
 
+    @property
+    def critical_path_lengths(self):
+        """ Length of the longest chain of configs starting at each node
+
+        The length counts the node itself (if it is a config) and every
+        config downstream of it, so nodes on the critical path of the
+        graph get the highest values. External nodes count as zero.
+
+        Returns: A dict mapping each Node to an integer.
+        """
+        return self.path_lengths()
+
+    def path_lengths(self, reverse=False):
+        """ Length of the longest chain of configs starting at each node
+
+        Args:
+            reverse (boolean): Whether to follow the dependencies rather
+                than the dependents, ie the chains of configs that come
+                after each node in reverse dependency order.
+
+        Returns: A dict mapping each Node to an integer, see
+            `critical_path_lengths`.
+        """
+        if not hasattr(self, '_path_lengths'):
+            self._path_lengths = {}
+        if reverse in self._path_lengths:
+            return self._path_lengths[reverse]
+
+        after = self.graph.predecessors if reverse else self.graph.successors
+        lengths = {}
+        for node in self.sort(reverse=not reverse):
+            following = [lengths[n] for n in after(node)]
+            lengths[node] = int(node in self.configs) + max(following or [0])
+        self._path_lengths[reverse] = lengths
+        return lengths
+
+    def downstream(self, nodes, reverse=False):
+        """ Returns the configs affected by changes to `nodes`
+
+        Args:
+            nodes (iterable): The Node objects to start from.
+            reverse (boolean): Whether the action runs in reverse order,
+                in which case the nodes "downstream" of a node are the
+                ones it depends on.
+
+        Returns: A set with the nodes that are configs in this graph and
+            every config that depends on them (or that they depend on,
+            when `reverse` is used).
+        """
+        walk = nx.ancestors if reverse else nx.descendants
+        affected = set()
+        for node in nodes:
+            if node in self.graph and node not in affected:
+                affected.add(node)
+                affected.update(walk(self.graph, node))
+        return set(n for n in affected if n in self.configs)
+
+    def select(self, nodes):
+        """ Returns a new ConfigGraph holding only the configs in `nodes`
+
+        Configs left out that the selected configs depend on become
+        external nodes of the new graph, so they must exist in DM.
+        """
+        selected = ConfigGraph([])
+        selected.configs = {
+            n: c for n, c in self.configs.items() if n in nodes
+        }
+        return selected
+
     def __iter__(self):
         """ Makes this class an iterator.
 
@@ -284,8 +433,15 @@ class Deployment(DM_API):
         current(Deployment): A Deployment object from the SDK, or None.
             This attribute is None until self.get() called. If the
             deployment doesn't exist in DM, it remains None.
+        digest(string): A digest of the target config, stored in the
+            DIGEST_LABEL label of the deployment.
         dm_config(dict): A dict built from the CFT config holding keys
             that DM can handle.
+        started(string): The start time of the operation of the last
+            create or update, in RFC3339 format.
+        status(string): What the last action did to the deployment:
+            'created', 'updated', 'skipped' (because the deployment
+            was up to date), 'cancelled' or 'deleted'.
         target_config(TargetConfiguration): A TargetConfiguration object from
             the SDK.
     """
@@ -296,6 +452,14 @@ class Deployment(DM_API):
     # The keys required by a DM config (not CFT config)
     DM_CONFIG_KEYS = ['imports', 'resources', 'outputs']
 
+    # The label holding the digest of the last applied target config
+    DIGEST_LABEL = 'cft-digest'
+
+    # How resources and outputs are printed once the deployment was
+    # changed: 'each' lists all of them right away, 'summary' and 'none'
+    # leave it to the caller (see `changed_resources()`)
+    PRINT_RESOURCES = 'each'
+
     def __init__(self, config):
         """ The class constructor
 
@@ -304,76 +468,37 @@ class Deployment(DM_API):
                 Normally provided when creating/updating a deployment.
         """
 
-        # Resolve custom yaml tags only during deployment instantiation
-        # because if parsed earlier, the DM queries implemented for the
-        # tags would likely fail with 404s
-        self.yaml = CFTBaseYAML()
-        self.yaml.Constructor.add_constructor(
-            '!DMOutput',
-            self.yaml_dm_output_constructor
-        )
+        self.yaml = new_yaml()
         self._config = config
-
-        # Regex search/replace before loading the yaml
-        self.config = self.yaml.load(
-            DM_OUTPUT_QUERY_REGEX.sub(self.get_dm_output,
-                                      config.as_string)
-        )
-        self.config['project'] = self._config.project
-        self.config['name'] = self._config.deployment
+        self._resolved_config = None
 
         self.tmp_file_path = None
-
-        LOG.debug('==> %s', self.config)
+        self._target_config = None
+        self._digest = None
+        self.status = None
         self.current = None
+        self.started = None
 
-    def get_dm_output(self, match):
-        """ Custom function for the regex.sub()
-
-        This function gets executed everytime there's a match on one
-        tokens used to represent the cross-deployment references (
-        !DMOutput, $(out.x.y.w.z), etc.
-
-        Args:
-            match (re.MatchObject): A regex matche object
+    @property
+    def config(self):
+        """ The parsed config, with the cross-deployment references resolved
 
-        Returns: A string with the value of the deployment output
+        The references are resolved on first access only, on the tree
+        already parsed by the Config, because if resolved earlier, the
+        DM queries would likely fail with 404s. Actions that don't need
+        the content of the config (ie delete) never resolve them.
         """
-
-        for k, v in match.groupdict().items():
-            if not v:
-                continue
-            if k == 'url':
-                query_attributes = parse_dm_output_url(v, self._config.project)
-            elif k == 'token':
-                query_attributes = parse_dm_output_token(
-                    v,
+        if self._resolved_config is None:
+            with TRACER.span('resolve outputs', 'dependencies'):
+                config = resolve_dm_outputs(
+                    self._config.as_dict,
                     self._config.project
                 )
-            return get_deployment_output(
-                query_attributes.project,
-                query_attributes.deployment,
-                query_attributes.resource,
-                query_attributes.name
-            )
-
-    def yaml_dm_output_constructor(self, loader, node):
-        """ Implements the !DMOutput yaml tag
-
-        The tag takes string represeting an DM item URL.
-
-        Example:
-          network: !DMOutput dm://${project}/${deployment}/${resource}/${name}
-        """
-
-        data = loader.construct_scalar(node)
-        url = parse_dm_output_url(data, self._config.project)
-        return get_deployment_output(
-            url.project,
-            url.deployment,
-            url.resource,
-            url.name
-        )
+            config['project'] = self._config.project
+            config['name'] = self._config.deployment
+            LOG.debug('==> %s', config)
+            self._resolved_config = config
+        return self._resolved_config
 
     @property
     def dm_config(self):
@@ -395,22 +520,96 @@ class Deployment(DM_API):
     def target_config(self):
         """Returns the 'target config' for the deployment.
 
-        The 'import code' is very complex and error prone. Instead
-        of rewriting it here, the code from the SDK/gcloud is being
-        reused.
-        The SDK code only works with actual files, not strings, so
-        the processed configs to are written to temporary files then
-        fed to the SDK code to handle the imports.
+        The target config is built in memory, with the imported files
+        read from a content cache shared by all deployments of the run,
+        so a template imported by many configs is only read once.
+        Imports are resolved relative to the current directory.
+
+        The SDK's import code only works with actual files, so configs
+        importing URLs are written to temporary files then fed to the
+        SDK code to handle the imports.
 
         Args:
 
-        Returns: None
+        Returns: A TargetConfiguration message
         """
-        self.write_tmp_file()
-        target = BuildTargetConfig(messages, config=self.tmp_file_path)
-        self.delete_tmp_file()
+        if self._target_config is not None:
+            return self._target_config
+
+        imports = self.dm_config.get('imports', []) or []
+        if any(is_url(i.get('path', '')) for i in imports):
+            from googlecloudsdk.command_lib.deployment_manager.importer \
+                import BuildTargetConfig
+
+            self.write_tmp_file()
+            try:
+                target = BuildTargetConfig(
+                    self.messages,
+                    config=self.tmp_file_path
+                )
+            finally:
+                self.delete_tmp_file()
+        else:
+            target = build_target_config(
+                self.messages,
+                self.yaml.dump(self.dm_config),
+                imports
+            )
+        self._target_config = target
         return target
 
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = target_digest(self.target_config)
+        return self._digest
+
+    @property
+    def labels(self):
+        """ The labels to send with the deployment
+
+        The current labels of the deployment are preserved, and the
+        DIGEST_LABEL label is set to the digest of the target config.
+
+        Returns: A list of DeploymentLabelEntry messages
+        """
+        return self.labels_with_digest(self.digest)
+
+    def labels_with_digest(self, digest):
+        """ The current labels, with DIGEST_LABEL set to `digest`
+
+        Returns: A list of DeploymentLabelEntry messages
+        """
+        labels = [
+            label for label in getattr(self.current, 'labels', None) or []
+            if label.key != self.DIGEST_LABEL
+        ]
+        labels.append(
+            self.messages.DeploymentLabelEntry(
+                key=self.DIGEST_LABEL,
+                value=digest
+            )
+        )
+        return labels
+
+    def is_up_to_date(self):
+        """ Whether updating the deployment would be a no-op
+
+        A deployment is up to date if its last update succeeded, it is
+        not in preview mode and it was last updated with the same target
+        config (same rendered config and imported files).
+
+        self.current must have been retrieved with self.get() first.
+        """
+        if not self.current or getattr(self.current, 'update', None):
+            return False
+        if getattr(self.current.operation, 'error', None):
+            return False
+        for label in self.current.labels or []:
+            if label.key == self.DIGEST_LABEL:
+                return label.value == self.digest
+        return False
+
     def write_tmp_file(self):
         """ Writes the yaml dump of the deployment to a temp file.
 
@@ -446,8 +645,8 @@ class Deployment(DM_API):
         """
 
         self.current = get_deployment(
-            project=self.config['project'],
-            deployment=self.config['name']
+            project=self._config.project,
+            deployment=self._config.deployment
         )
         return self.current
 
@@ -464,23 +663,30 @@ class Deployment(DM_API):
 
         message = self.messages.DeploymentmanagerDeploymentsDeleteRequest
         request = message(
-            deployment=self.config['name'],
-            project=self.config['project']
+            deployment=self._config.deployment,
+            project=self._config.project
         )
 
         if delete_policy:
-            request['deletePolicy'
-                   ] = message.DeletePolicyValueValuesEnum(delete_policy)
+            request.deletePolicy = message.DeletePolicyValueValuesEnum(
+                delete_policy
+            )
 
-        LOG.debug('Deleting deployment %', self.config['name'], request)
+        LOG.debug(
+            'Deleting deployment %s: %s',
+            self._config.deployment,
+            request
+        )
 
         # The actual operation.
         # No exception handling is done here to allow higher level
         # functions to do so.
         operation = self.client.deployments.Delete(request)
 
-        # Wait for operation to finish
-        self.wait(operation)
+        # Wait for operation to finish. The deployment is gone, so
+        # there's nothing to get afterwards
+        self.wait(operation, get=False)
+        self.status = 'deleted'
 
     def create(self, preview=False, create_policy=None):
         """Creates this deployment in DM.
@@ -495,14 +701,15 @@ class Deployment(DM_API):
         """
 
         deployment = self.messages.Deployment(
-            name=self.config['name'],
-            target=self.target_config
+            name=self._config.deployment,
+            target=self.target_config,
+            labels=self.labels
         )
 
         message = self.messages.DeploymentmanagerDeploymentsInsertRequest
         request = message(
             deployment=deployment,
-            project=self.config['project'],
+            project=self._config.project,
             preview=preview
         )
         if create_policy:
@@ -510,7 +717,7 @@ class Deployment(DM_API):
                    ] = message.CreatePolicyValueValuesEnum(create_policy)
         LOG.debug(
             'Creating deployment %s with data %s',
-            self.config['name'],
+            self._config.deployment,
             request
         )
 
@@ -518,10 +725,13 @@ class Deployment(DM_API):
         # No exception handling is done here to allow higher level
         # functions to do so.
         operation = self.client.deployments.Insert(request)
+        self.started = operation.insertTime
 
         # Wait for operation to finish
         self.wait(operation)
-        self.print_resources_and_outputs()
+        self.status = 'created'
+        if preview or self.PRINT_RESOURCES == 'each':
+            self.print_resources_and_outputs()
         return self.current
 
 
@@ -533,12 +743,22 @@ class Deployment(DM_API):
 #            self.update_preview()
 #
 
-    def update(self, preview=False, create_policy=None, delete_policy=None):
+    def update(
+        self,
+        preview=False,
+        create_policy=None,
+        delete_policy=None,
+        force=False,
+        confirm=True
+    ):
         """Updates this deployment in DM.
 
         If the deployment is already in preview mode in DM, the existing
         preview operation will be overwritten by this one.
 
+        Deployments that are up to date (see `is_up_to_date()`) are
+        skipped, unless `force` is used.
+
         Args:
             preview (boolean): If True, update is done with preview.
             create_policy (str): The strings 'ACQUIRE' or 'CREATE_OR_ACQUIRE'.
@@ -547,6 +767,10 @@ class Deployment(DM_API):
             delete_policy (str): The strings 'ABANDON' or 'DELETE'.
                 The default (None), doesn't include the policy in the
                 request obj, which translates 'DELETE' as default.
+            force (boolean): If True, the deployment is updated even if
+                it is up to date.
+            confirm (boolean): If False, the preview is left pending
+                rather than asking whether to apply it.
 
         Returns: None
         """
@@ -556,14 +780,23 @@ class Deployment(DM_API):
         if not self.current:
             raise SystemExit(
                 'Error updating {}: Deployment does not exist'.format(
-                    self.config['name']
+                    self._config.deployment
                 )
             )
 
+        if not force and not preview and self.is_up_to_date():
+            print('Deployment {} is up to date (digest {})'.format(
+                self._config.deployment,
+                self.digest
+            ))
+            self.status = 'skipped'
+            return
+
         new_deployment = self.messages.Deployment(
-            name=self.config['name'],
+            name=self._config.deployment,
             target=self.target_config,
-            fingerprint=self.current.fingerprint or b''
+            fingerprint=self.current.fingerprint or b'',
+            labels=self.labels
         )
 
         message = self.messages.DeploymentmanagerDeploymentsUpdateRequest
@@ -571,9 +804,9 @@ class Deployment(DM_API):
         # getattr() below overwrites existing preview mode as targets
         # cannot be sent when deployment is already in preview mode
         request = message(
-            deployment=self.config['name'],
+            deployment=self._config.deployment,
             deploymentResource=new_deployment,
-            project=self.config['project'],
+            project=self._config.project,
             preview=preview or bool(getattr(self.current,
                                             'update',
                                             False))
@@ -587,7 +820,7 @@ class Deployment(DM_API):
 
         LOG.debug(
             'Updating deployment %s with data %s',
-            self.config['name'],
+            self._config.deployment,
             request
         )
 
@@ -595,15 +828,21 @@ class Deployment(DM_API):
         # No exception handling is done here to allow higher level
         # functions to do so.
         operation = self.client.deployments.Update(request)
+        self.started = operation.insertTime
 
-        # Wait for operation to finish
-        self.wait(operation)
+        # Wait for operation to finish. The new fingerprint is only
+        # needed to confirm or cancel the preview
+        self.wait(operation, get=request.preview)
+        self.status = 'updated'
 
-        self.print_resources_and_outputs()
+        # A preview is always printed, to review it
+        if request.preview or self.PRINT_RESOURCES == 'each':
+            self.print_resources_and_outputs()
 
         if preview:
-            func = self.confirm_preview()
-            func()
+            if confirm:
+                func = self.confirm_preview()
+                func()
         elif getattr(self.current, 'update', False):
             self.update_preview()
 
@@ -619,59 +858,175 @@ class Deployment(DM_API):
         else:
             raise SystemExit('Not a valid answer: {}'.format(answer))
 
-    def update_preview(self):
+    def update_preview(self, digest=None):
         """Confirms an update preview.
 
         The request to the API doesn't include the target
 
         Args:
+            digest (string): The digest of the target config that was
+                previewed. Defaults to the digest of the current config,
+                which is only right within the run that previewed it.
 
         Returns:
         """
         deployment = self.messages.Deployment(
-            name=self.config['name'],
-            fingerprint=self.current.fingerprint or b''
+            name=self._config.deployment,
+            fingerprint=self.current.fingerprint or b'',
+            labels=self.labels_with_digest(digest or self.digest)
         )
         request = self.messages.DeploymentmanagerDeploymentsUpdateRequest(
-            deployment=self.config['name'],
+            deployment=self._config.deployment,
             deploymentResource=deployment,
-            project=self.config['project'],
+            project=self._config.project,
             preview=False
         )
         operation = self.client.deployments.Update(request)
-        self.wait(operation, 'update preview')
-        self.print_resources_and_outputs()
+        self.started = operation.insertTime
+        self.wait(operation, 'update preview', get=False)
+        if self.PRINT_RESOURCES == 'each':
+            self.print_resources_and_outputs()
 
     def wait(self, operation, action=None, get=True):
         """Waits for a DM operation to be completed.
 
+        The operation is polled by the shared operations.POLLER, along
+        with all other operations in flight.
+
         Args:
             operation (Operation): An Operation object from the SDK.
             action (string): Any operation name to be used in the
                 ticker. If not specified, the operation type is used.
             get (boolean): wether to retrieve the latest deployment
-                info from the API to obtain the current fingerprint.
+                info from the API once the operation is done, to
+                obtain the current fingerprint. Skip it to save an API
+                call when the fingerprint isn't needed anymore.
+
+        Returns: The latest Deployment message if `get` is True, or
+            self.current otherwise.
         """
-        # This saves an API call if the self.get() was called just
-        # before calling this method
-        if get:
-            self.get()
+        from cloud_foundation_toolkit.operations import wait_for_operation
 
         action = action or operation.operationType
-
-        dm_write.WaitForOperation(
-            self.client,
-            self.messages,
-            operation.name,
-            project=self.config['project'],
-            timeout=self.OPERATION_TIMEOUT,
-            operation_description='{} {} (fingerprint {})'.format(
+        sys.stderr.write(
+            'Waiting for {} {} [{}]...'.format(
                 action,
-                self.config['name'],
-                base64.urlsafe_b64encode(self.current.fingerprint)
+                self._config.deployment,
+                operation.name
             )
         )
-        return self.get()
+        sys.stderr.flush()
+        EVENTS.emit(
+            'operation',
+            self._config,
+            operation=operation.name,
+            type=operation.operationType
+        )
+
+        with TRACER.span('wait ' + action, 'operation',
+                         operation=operation.name):
+            wait_for_operation(
+                self._config.project,
+                operation.name,
+                timeout=self.OPERATION_TIMEOUT,
+                deployment=self._config.deployment
+            )
+        sys.stderr.write('done.\n')
+
+        # Outputs of this deployment may have changed
+        OUTPUT_CACHE.invalidate(self._config.project, self._config.deployment)
+        if get:
+            return self.get()
+        return self.current
+
+    def preview(self):
+        """Creates or updates this deployment in preview mode.
+
+        Unlike create() and update() with `preview`, nothing is asked:
+        the preview is left pending, to be applied or cancelled later
+        with apply_preview(), possibly by another run. Deployments that
+        are up to date are skipped.
+
+        Returns: The changes of the preview, see preview_changes().
+        """
+        self.get()
+        if self.current is None:
+            self.create(preview=True)
+        elif self.is_up_to_date():
+            print('Deployment {} is up to date (digest {})'.format(
+                self._config.deployment,
+                self.digest
+            ))
+            self.status = 'skipped'
+            return []
+        else:
+            self.update(preview=True, confirm=False)
+        self.status = 'previewed'
+        return self.preview_changes()
+
+    def preview_changes(self):
+        """Returns the changes of the pending preview of this deployment.
+
+        Returns: A list of dicts with the 'name', 'type' and 'intent'
+            (ie 'CREATE_OR_ACQUIRE', 'UPDATE', 'DELETE') of each
+            resource the preview would change.
+        """
+        from apitools.base.py import list_pager
+
+        request = self.messages.DeploymentmanagerResourcesListRequest(
+            project=self._config.project,
+            deployment=self._config.deployment
+        )
+        return [
+            {
+                'name': r.name,
+                'type': r.type,
+                'intent': str(r.update.intent)
+            } for r in list_pager.YieldFromList(
+                self.client.resources,
+                request,
+                field='resources',
+                batch_size=500
+            ) if r.update
+        ]
+
+    def apply_preview(self, previews, cancel=False):
+        """Applies or cancels a preview created by preview().
+
+        The deployment must still be as it was right after its preview,
+        so previews changed since are never applied.
+
+        Args:
+            previews (dict): The previews of a PreviewReport.
+            cancel (boolean): Whether to cancel the preview rather than
+                applying it.
+
+        Returns: None
+        """
+        from cloud_foundation_toolkit.previews import encode_fingerprint
+
+        preview = previews['{}/{}'.format(*self._config.id)]
+        self.get()
+        if not getattr(self.current, 'update', None):
+            raise SystemExit(
+                'Deployment {} has no pending preview'.format(
+                    self._config.deployment
+                )
+            )
+        if encode_fingerprint(self.current.fingerprint) != \
+                preview['fingerprint']:
+            raise SystemExit(
+                'Deployment {} changed since it was previewed'.format(
+                    self._config.deployment
+                )
+            )
+        if cancel:
+            self.cancel_preview()
+        else:
+            # The config may have changed since the preview: the digest
+            # label must be the one of the config that was previewed
+            self.update_preview(digest=preview['digest'])
+            self.status = 'updated'
 
     def cancel_preview(self):
         """Cancels a deployment preview.
@@ -687,14 +1042,21 @@ class Deployment(DM_API):
             fingerprint=self.current.fingerprint or b''
         )
         req = self.messages.DeploymentmanagerDeploymentsCancelPreviewRequest(
-            deployment=self.config['name'],
+            deployment=self._config.deployment,
             deploymentsCancelPreviewRequest=cancel_msg,
-            project=self.config['project']
+            project=self._config.project
         )
         operation = self.client.deployments.CancelPreview(req)
-        self.wait(operation)
-
-    def apply(self, preview=False, create_policy=None, delete_policy=None):
+        self.wait(operation, get=False)
+        self.status = 'cancelled'
+
+    def apply(
+        self,
+        preview=False,
+        create_policy=None,
+        delete_policy=None,
+        force=False
+    ):
         """Creates or updates this deployment in DM.
 
         Args:
@@ -705,26 +1067,75 @@ class Deployment(DM_API):
             delete_policy (str): The strings 'ABANDON' or 'DELETE'.
                 The default (None), doesn't include the policy in the
                 request obj, which translates 'DELETE' as default.
+            force (boolean): If True, existing deployments are updated
+                even if they are up to date.
 
         Returns: None
         """
+        from apitools.base.py import exceptions as apitools_exceptions
+
         try:
             self.create()
         except apitools_exceptions.HttpConflictError as err:
-            self.update(preview=preview)
+            self.update(preview=preview, force=force)
 
-    def print_resources_and_outputs(self):
-        """Prints the Resources and Outputs of this deployment."""
+    def changed_resources(self):
+        """ Returns the resources changed by the last create or update
+
+        Resources were changed if they were inserted or updated after
+        the operation of the action started. Their outputs are fetched
+        through the OUTPUT_CACHE, so deployments depending on this one
+        reuse them.
+
+        Returns: A list of (Resource, dict) tuples, with the Resource
+            messages from the SDK and the outputs of the resources.
+        """
+        from apitools.base.py import list_pager
 
-        rsp = dm_api_util.FetchResourcesAndOutputs(
-            self.client,
-            self.messages,
-            self.config['project'],
-            self.config['name'],
-            #           self.ReleaseTrack() is base.ReleaseTrack.ALPHA
+        request = self.messages.DeploymentmanagerResourcesListRequest(
+            project=self._config.project,
+            deployment=self._config.deployment
+        )
+        resources = list_pager.YieldFromList(
+            self.client.resources,
+            request,
+            field='resources',
+            batch_size=500
         )
+        # DM timestamps are in the same RFC3339 format, so they sort as
+        # strings
+        changed = [
+            r for r in resources
+            if max(r.insertTime or '', r.updateTime or '') >= (
+                self.started or ''
+            )
+        ]
+        outputs = {}
+        if changed:
+            outputs = OUTPUT_CACHE.outputs(
+                self._config.project,
+                self._config.deployment
+            )
+        return [(r, outputs.get(r.name, {})) for r in changed]
 
-        printer = resource_printer.Printer(flags.RESOURCES_AND_OUTPUTS_FORMAT)
-        printer.AddRecord(rsp)
-        printer.Finish()
+    def print_resources_and_outputs(self):
+        """Prints the Resources and Outputs of this deployment."""
+        from googlecloudsdk.api_lib.deployment_manager import dm_api_util
+        from googlecloudsdk.command_lib.deployment_manager import flags
+        from googlecloudsdk.core.resource import resource_printer
+
+        with TRACER.span('print resources', 'print'):
+            rsp = dm_api_util.FetchResourcesAndOutputs(
+                self.client,
+                self.messages,
+                self._config.project,
+                self._config.deployment,
+                #           self.ReleaseTrack() is base.ReleaseTrack.ALPHA
+            )
+
+            printer = resource_printer.Printer(
+                flags.RESOURCES_AND_OUTPUTS_FORMAT
+            )
+            printer.AddRecord(rsp)
+            printer.Finish()
         return rsp
@@ -1,11 +1,17 @@
 from collections import namedtuple
 import io
 import re
+import threading
 from six.moves.urllib.parse import urlparse
 
-from apitools.base.py import exceptions as apitools_exceptions
-from googlecloudsdk.api_lib.deployment_manager import dm_base
-from ruamel.yaml import YAML
+import six
+
+from cloud_foundation_toolkit import LOG
+from cloud_foundation_toolkit import register_credential_providers
+from cloud_foundation_toolkit.clients import CLIENT
+from cloud_foundation_toolkit.clients import POLL_CLIENT
+from cloud_foundation_toolkit.yaml_utils import DMOutputTag
+from cloud_foundation_toolkit.yaml_utils import new_yaml
 
 DM_OUTPUT_QUERY_REGEX = re.compile(
     r'!DMOutput\s+(?P<url>\bdm://[-/a-zA-Z0-9]+\b)|'
@@ -21,21 +27,62 @@ DMOutputQueryAttributes = namedtuple(
 )
 
 
-@dm_base.UseDmApi(dm_base.DmApiVersion.V2)
-class DM_API(dm_base.DmCommand):
+_dm_command = None
+_dm_command_lock = threading.Lock()
+
+
+def get_dm_command():
+    """ Returns the SDK's DmCommand, importing the SDK on first use """
+    global _dm_command
+    with _dm_command_lock:
+        if _dm_command is None:
+            register_credential_providers()
+            from googlecloudsdk.api_lib.deployment_manager import dm_base
+
+            @dm_base.UseDmApi(dm_base.DmApiVersion.V2)
+            class DmCommand(dm_base.DmCommand):
+                pass
+
+            _dm_command = DmCommand()
+    return _dm_command
+
+
+class DM_API(object):
     """ Class representing the DM API
 
     This a proxy class only, so other modules in this project
-    only import this local class instead of gcloud's. Here's the source:
+    only import this local class instead of gcloud's. The SDK is only
+    imported when the client or the messages are first used, so actions
+    that don't call the API (ie --show-stages) start fast. Here's the
+    source:
 
     https://github.com/google-cloud-sdk/google-cloud-sdk/blob/master/lib/googlecloudsdk/api_lib/deployment_manager/dm_base.py
+
+    API calls made through `client` are served by the clients of
+    clients.POOL, so they can be made from concurrent threads. Calls
+    made through `poll_client` are served by the same clients, but are
+    not retried.
     """
 
+    @property
+    def client(self):
+        return CLIENT
+
+    @property
+    def poll_client(self):
+        return POLL_CLIENT
+
+    @property
+    def messages(self):
+        return get_dm_command().messages
+
 
 API = DM_API()
 
 
 def get_deployment(project, deployment):
+    from apitools.base.py import exceptions as apitools_exceptions
+
     try:
         return API.client.deployments.Get(
             API.messages.DeploymentmanagerDeploymentsGetRequest(
@@ -47,14 +94,16 @@ def get_deployment(project, deployment):
         return None
 
 
-def get_manifest(project, deployment):
-    deployment_rsp = get_deployment(project, deployment)
+def get_manifest(project, deployment, manifest=None):
+    if manifest is None:
+        deployment_rsp = get_deployment(project, deployment)
+        manifest = deployment_rsp.manifest.split('/')[-1]
 
     return API.client.manifests.Get(
         API.messages.DeploymentmanagerManifestsGetRequest(
             project=project,
             deployment=deployment,
-            manifest=deployment_rsp.manifest.split('/')[-1]
+            manifest=manifest
         )
     )
 
@@ -100,12 +149,225 @@ def parse_dm_output_token(token, project=''):
         raise ValueError(error_msg)
 
 
-def get_deployment_output(project, deployment, resource, name):
-    manifest = get_manifest(project, deployment)
-    layout = YAML().load(manifest.layout)
-    for r in layout.get('resources', []):
-        if r['name'] != resource:
+def parse_dm_output_match(match, project=''):
+    """ Parses a match of DM_OUTPUT_QUERY_REGEX
+
+    Returns: A DMOutputQueryAttributes namedtuple
+    """
+    if match.group('url'):
+        return parse_dm_output_url(match.group('url'), project)
+    return parse_dm_output_token(match.group('token'), project)
+
+
+def _walk_scalars(tree):
+    """ Yields the string and !DMOutput scalars of a parsed yaml tree """
+    pending = [tree]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, dict):
+            pending.extend(node.keys())
+            pending.extend(node.values())
+        elif isinstance(node, list):
+            pending.extend(node)
+        elif isinstance(node, (DMOutputTag, six.string_types)):
+            yield node
+
+
+def find_dm_output_queries(tree, project=''):
+    """ Finds the cross-deployment references in a parsed config
+
+    Args:
+        tree: The parsed yaml config.
+        project (string): The project of references without one.
+
+    Returns: A list of DMOutputQueryAttributes namedtuples
+    """
+    queries = []
+    for scalar in _walk_scalars(tree):
+        if isinstance(scalar, DMOutputTag):
+            queries.append(parse_dm_output_url(scalar.url, project))
             continue
-        for output in r.get('outputs', []):
-            if output['name'] == name:
-                return output['finalValue']
+        for match in DM_OUTPUT_QUERY_REGEX.finditer(scalar):
+            queries.append(parse_dm_output_match(match, project))
+    return queries
+
+
+def resolve_dm_outputs(tree, project='', lookup=None):
+    """ Replaces the cross-deployment references of a parsed config
+
+    A scalar made of a single reference is replaced by the value of the
+    output, whatever its type. References embedded in a longer string
+    are replaced by the string value of the output.
+
+    Args:
+        tree: The parsed yaml config. It is not modified.
+        project (string): The project of references without one.
+        lookup (function): Returns the value of an output, given a
+            DMOutputQueryAttributes. Defaults to fetching it from DM.
+
+    Returns: A copy of `tree` with all references resolved.
+    """
+
+    def lookup_output(query):
+        if lookup:
+            return lookup(query)
+        return get_deployment_output(*query)
+
+    def resolve(node):
+        if isinstance(node, dict):
+            resolved = type(node)()
+            for key, value in node.items():
+                resolved[resolve(key)] = resolve(value)
+            return resolved
+        if isinstance(node, list):
+            return type(node)(resolve(item) for item in node)
+        if isinstance(node, DMOutputTag):
+            return lookup_output(parse_dm_output_url(node.url, project))
+        if not isinstance(node, six.string_types) or \
+                not DM_OUTPUT_QUERY_REGEX.search(node):
+            return node
+
+        match = DM_OUTPUT_QUERY_REGEX.match(node.strip())
+        if match and match.end() == len(node.strip()):
+            return lookup_output(parse_dm_output_match(match, project))
+        return DM_OUTPUT_QUERY_REGEX.sub(
+            lambda m: six.text_type(
+                lookup_output(parse_dm_output_match(m, project))
+            ),
+            node
+        )
+
+    return resolve(tree)
+
+
+class OutputCache(object):
+    """ Run-scoped cache of deployment outputs
+
+    Resolving a cross-deployment reference requires the deployment (to
+    find its current manifest), the manifest and parsing its layout.
+    This cache does that once per (project, deployment, manifest) and
+    indexes the layout by resource and output name, so all other
+    references to the same deployment are served from memory.
+
+    Deployments changed during the run must be invalidated (see
+    `invalidate()`), so references to them are resolved against their
+    new manifest.
+
+    Optionally, a persistent cache.DiskCache can back this cache, in
+    which case manifests are only downloaded for deployments that
+    changed since they were cached on disk.
+
+    Attributes:
+        disk_cache (DiskCache): The persistent cache, or None.
+        hits (int): Number of lookups served from memory.
+        disk_hits (int): Number of lookups served from the disk cache.
+        misses (int): Number of lookups that fetched a manifest.
+    """
+
+    def __init__(self, disk_cache=None):
+        self.disk_cache = disk_cache
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._deployments = {}
+        self._outputs = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def deployment(self, project, deployment):
+        """ Returns the Deployment message for the deployment, or None """
+        key = (project, deployment)
+        with self._key_lock(key):
+            if key not in self._deployments:
+                self._deployments[key] = get_deployment(project, deployment)
+            return self._deployments[key]
+
+    def outputs(self, project, deployment):
+        """ Returns the outputs of a deployment
+
+        Returns: A dict of dicts, mapping resource names to their
+            outputs' names and values.
+        """
+        deployment_rsp = self.deployment(project, deployment)
+        if deployment_rsp is None:
+            raise ValueError(
+                'Deployment {}/{} does not exist'.format(project, deployment)
+            )
+        manifest = deployment_rsp.manifest.split('/')[-1]
+        key = (project, deployment, manifest)
+
+        with self._key_lock(key):
+            if key in self._outputs:
+                result = 'hit'
+            else:
+                outputs = None
+                if self.disk_cache:
+                    outputs = self.disk_cache.get(*key)
+                if outputs is not None:
+                    result = 'disk hit'
+                else:
+                    result = 'miss'
+                    outputs = self.index_layout(
+                        get_manifest(project, deployment, manifest).layout
+                    )
+                    if self.disk_cache:
+                        self.disk_cache.put(
+                            project,
+                            deployment,
+                            manifest,
+                            outputs,
+                            fingerprint=deployment_rsp.fingerprint
+                        )
+                self._outputs[key] = outputs
+            outputs = self._outputs[key]
+
+        with self._lock:
+            if result == 'hit':
+                self.hits += 1
+            elif result == 'disk hit':
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+            LOG.debug(
+                'Output cache %s for %s (hits: %s, disk hits: %s, misses: %s)',
+                result,
+                key,
+                self.hits,
+                self.disk_hits,
+                self.misses
+            )
+        return outputs
+
+    @staticmethod
+    def index_layout(layout):
+        """ Indexes the outputs of the resources in a manifest layout """
+        index = {}
+        for resource in new_yaml().load(layout).get('resources', []):
+            index[resource['name']] = {
+                o['name']: o.get('finalValue')
+                for o in resource.get('outputs', [])
+            }
+        return index
+
+    def invalidate(self, project, deployment):
+        """ Forgets the deployment, ie after it was changed by this run """
+        with self._key_lock((project, deployment)):
+            self._deployments.pop((project, deployment), None)
+
+    def clear(self):
+        with self._lock:
+            self._deployments.clear()
+            self._outputs.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+
+OUTPUT_CACHE = OutputCache()
+
+
+def get_deployment_output(project, deployment, resource, name):
+    outputs = OUTPUT_CACHE.outputs(project, deployment)
+    return outputs.get(resource, {}).get(name)
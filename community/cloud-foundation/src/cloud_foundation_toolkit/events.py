@@ -0,0 +1,111 @@
+# Copyright 2018 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Machine-readable stream of the events of a run, as NDJSON """
+
+from contextlib import contextmanager
+import json
+import sys
+import threading
+import time
+
+
+class EventStream(object):
+    """ Writes one JSON object per line for each state change of a run
+
+    Events are only written once the stream is enabled, so emitting
+    them costs next to nothing otherwise. Each event is flushed as soon
+    as it is written, so long runs can be followed as they go.
+
+    ```
+    EVENTS.enable(sys.stdout)
+    EVENTS.emit('started', config)
+    ```
+
+    writes, on a single line:
+
+    ```
+    {"deployment": "my-networks", "event": "started",
+     "project": "my-project", "ts": 1538159406.282}
+    ```
+
+    Attributes:
+        enabled (boolean): Whether events are written.
+        stream (file): Where the events are written.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stream = None
+        self._lock = threading.Lock()
+
+    def enable(self, stream):
+        with self._lock:
+            self.enabled = True
+            self.stream = stream
+
+    def disable(self):
+        with self._lock:
+            self.enabled = False
+            self.stream = None
+
+    def emit(self, event, node=None, **fields):
+        """ Writes an event
+
+        Args:
+            event (string): The type of event, ie 'started'.
+            node (Node): The deployment the event is about, if any. Any
+                object with `project` and `deployment` attributes, such
+                as a Config, works too.
+            fields: Extra attributes of the event.
+        """
+        if not self.enabled:
+            return
+
+        fields['event'] = event
+        fields['ts'] = round(time.time(), 3)
+        if node is not None:
+            fields['project'] = node.project
+            fields['deployment'] = node.deployment
+        line = json.dumps(fields, sort_keys=True, default=str)
+        with self._lock:
+            if self.stream is not None:
+                self.stream.write(line + '\n')
+                self.stream.flush()
+
+
+EVENTS = EventStream()
+
+
+@contextmanager
+def human_output():
+    """ Moves the human-readable output to stderr while events are on
+
+    This keeps the standard output of the run a valid NDJSON stream.
+    Without events, the output is left alone.
+    """
+    if not EVENTS.enabled or EVENTS.stream is not sys.stdout:
+        yield
+        return
+
+    # The SDK is only imported when configs are actually executed
+    from googlecloudsdk.core import log as sdk_log
+
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    sdk_log.Reset(sys.stdout, sys.stderr)
+    try:
+        yield
+    finally:
+        sys.stdout = stdout
+        sdk_log.Reset(sys.stdout, sys.stderr)
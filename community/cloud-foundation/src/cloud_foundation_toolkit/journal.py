@@ -0,0 +1,116 @@
+# Copyright 2018 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Journal of graph runs, used to resume failed runs """
+
+import io
+import json
+import threading
+import time
+
+from cloud_foundation_toolkit import LOG
+from cloud_foundation_toolkit.changes import config_fingerprint
+
+
+class Journal(object):
+    """ Append-only record of the outcome of each config of a run
+
+    Every time an action on a config finishes, a JSON line is appended
+    (and flushed) to the journal file with the node, the action, the
+    fingerprint of the config and the files it imports (see
+    `changes.config_fingerprint()`) and the outcome. If the run is
+    interrupted or fails, the journal tells which configs were already
+    processed, so a new run can resume from there.
+
+    Attributes:
+        path (string): The path of the journal file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def entries(self):
+        """ Returns the list of entries in the journal, oldest first """
+        entries = []
+        try:
+            with io.open(self.path, encoding='utf-8') as _fd:
+                for line in _fd:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # Most likely a line truncated by a crash
+                        LOG.debug('Ignoring journal line %r', line)
+        except IOError:
+            pass
+        return entries
+
+    def completed(self, action, configs):
+        """ Returns the nodes that don't need to run again
+
+        A node is completed if the last time `action` ran on it, it
+        succeeded and neither its config nor the files it imports changed
+        since. Configs whose imports can't be fingerprinted (ie URLs)
+        always run again.
+
+        Args:
+            action (string): The action being resumed.
+            configs (dict): The configs of the run, keyed by Node.
+
+        Returns: A set of Node objects.
+        """
+        last = {}
+        for entry in self.entries():
+            if entry.get('action') == action:
+                last[tuple(entry['node'])] = entry
+
+        completed = set()
+        for node, config in configs.items():
+            entry = last.get(tuple(node))
+            if not entry or entry['outcome'] != 'succeeded':
+                continue
+            fingerprint = config_fingerprint(config)
+            if fingerprint and entry['config_digest'] == fingerprint:
+                completed.add(node)
+        return completed
+
+    def reset(self):
+        """ Empties the journal, ie when starting a new run """
+        with self._lock:
+            io.open(self.path, 'w').close()
+
+    def record(self, action, config, outcome, status=None, error=None):
+        """ Appends an entry for a config to the journal
+
+        Args:
+            action (string): The action executed on the config.
+            config (Config): The config.
+            outcome (string): 'succeeded' or 'failed'.
+            status (string): The Deployment.status after the action.
+            error (Exception): The error if the action failed.
+        """
+        entry = {
+            'node': list(config.id),
+            'action': action,
+            'config_digest': config_fingerprint(config),
+            'outcome': outcome,
+            'status': status,
+            'error': str(error) if error else None,
+            'time': time.time()
+        }
+        line = json.dumps(entry, sort_keys=True) + '\n'
+        with self._lock:
+            with io.open(self.path, 'a', encoding='utf-8') as _fd:
+                _fd.write(line if isinstance(line, type(u'')) else
+                          line.decode('utf-8'))
+                _fd.flush()
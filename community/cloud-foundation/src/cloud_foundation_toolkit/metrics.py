@@ -0,0 +1,60 @@
+# Copyright 2018 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Run-wide counters """
+
+from collections import Counter
+import threading
+
+
+class Counters(object):
+    """ Thread-safe named counters
+
+    ```
+    COUNTERS.increment('deployments.updated')
+    COUNTERS.get('deployments.updated')
+    ```
+    """
+
+    def __init__(self):
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def get(self, name):
+        with self._lock:
+            return self._counters[name]
+
+    def items(self, prefix=''):
+        """ Returns a sorted list of (name, value) tuples
+
+        Args:
+            prefix (string): Only return counters starting with `prefix`,
+                with the prefix stripped from their names.
+        """
+        with self._lock:
+            return sorted(
+                (k[len(prefix):], v)
+                for k, v in self._counters.items()
+                if k.startswith(prefix)
+            )
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+COUNTERS = Counters()
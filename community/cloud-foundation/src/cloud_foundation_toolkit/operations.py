@@ -0,0 +1,225 @@
+# Copyright 2018 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Multiplexed poller of DM operations """
+
+import threading
+import time
+
+from concurrent import futures
+from googlecloudsdk.api_lib.deployment_manager import exceptions as \
+    dm_exceptions
+from googlecloudsdk.command_lib.deployment_manager import dm_util
+
+from cloud_foundation_toolkit import LOG
+from cloud_foundation_toolkit.dm_utils import API
+from cloud_foundation_toolkit.events import EVENTS
+from cloud_foundation_toolkit.ratelimit import RETRY_POLICY
+
+
+class _TrackedOperation(object):
+
+    def __init__(self, project, name, interval, deployment=None):
+        self.project = project
+        self.name = name
+        self.deployment = deployment
+        self.state = None
+        self.interval = interval
+        self.next_poll = time.time() + interval
+        self.future = futures.Future()
+
+
+class OperationPoller(object):
+    """ Polls all in-flight DM operations from a single thread
+
+    Instead of one polling loop per operation, every operation being
+    waited on is registered with the poller, which polls them all from
+    one background thread and resolves a Future when each of them is
+    done. Operations are polled often at first and less and less
+    often while they keep running, so long running operations don't
+    waste API calls.
+
+    ```
+    future = POLLER.watch(project, operation.name)
+    operation = future.result(timeout=1200)
+    ```
+
+    Attributes:
+        min_interval (float): Seconds before the first poll of an
+            operation.
+        max_interval (float): Maximum number of seconds between polls
+            of the same operation.
+        backoff (float): Factor the polling interval of an operation
+            grows by after each poll.
+    """
+
+    def __init__(self, min_interval=1.0, max_interval=20.0, backoff=1.5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self._operations = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def watch(self, project, name, deployment=None):
+        """ Starts tracking an operation
+
+        Args:
+            project (string): The project of the operation.
+            name (string): The name of the operation.
+            deployment (string): The deployment of the operation, for
+                its progress events.
+
+        Returns: A Future resolved with the Operation message once the
+            operation is done, or with an OperationError if it failed.
+        """
+        with self._condition:
+            key = (project, name)
+            if key not in self._operations:
+                self._operations[key] = _TrackedOperation(
+                    project,
+                    name,
+                    self.min_interval,
+                    deployment
+                )
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='cft-operation-poller'
+                )
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+            return self._operations[key].future
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._operations:
+                    self._thread = None
+                    return
+                now = time.time()
+                due = [
+                    o for o in self._operations.values() if o.next_poll <= now
+                ]
+                if not due:
+                    next_poll = min(
+                        o.next_poll for o in self._operations.values()
+                    )
+                    self._condition.wait(next_poll - now)
+                    continue
+
+            for tracked in due:
+                self._poll(tracked)
+
+    def _poll(self, tracked):
+        """ Polls a single operation and resolves its future if done
+
+        The poll is not retried by the retry policy, which would hold up
+        the polls of all other operations: after a transient failure,
+        the operation is polled again at its next turn instead.
+        """
+        try:
+            operation = API.poll_client.operations.Get(
+                API.messages.DeploymentmanagerOperationsGetRequest(
+                    project=tracked.project,
+                    operation=tracked.name
+                )
+            )
+        except Exception as err:  # pylint: disable=broad-except
+            if RETRY_POLICY.is_transient(err):
+                LOG.debug('Transient error polling %s: %s', tracked.name, err)
+                self._reschedule(tracked)
+            else:
+                self._resolve(tracked, exception=err)
+            return
+
+        if EVENTS.enabled and \
+                (operation.status, operation.progress) != tracked.state:
+            tracked.state = (operation.status, operation.progress)
+            EVENTS.emit(
+                'progress',
+                operation=tracked.name,
+                project=tracked.project,
+                deployment=tracked.deployment,
+                status=operation.status,
+                progress=operation.progress
+            )
+
+        if operation.status != 'DONE':
+            self._reschedule(tracked)
+        elif operation.error:
+            self._resolve(
+                tracked,
+                exception=dm_exceptions.OperationError(
+                    'Error in Operation [{}]: {}'.format(
+                        tracked.name,
+                        dm_util.RenderMessageAsYaml(operation.error)
+                    )
+                )
+            )
+        else:
+            self._resolve(tracked, result=operation)
+
+    def _reschedule(self, tracked):
+        tracked.interval = min(tracked.interval * self.backoff,
+                               self.max_interval)
+        tracked.next_poll = time.time() + tracked.interval
+
+    def unwatch(self, project, name):
+        """ Stops tracking an operation, ie when waiting for it timed out
+
+        The future of the operation is cancelled.
+        """
+        with self._condition:
+            tracked = self._operations.pop((project, name), None)
+            if tracked is not None:
+                tracked.future.cancel()
+
+    def _resolve(self, tracked, result=None, exception=None):
+        with self._condition:
+            self._operations.pop((tracked.project, tracked.name), None)
+            # The operation may have been unwatched while it was polled
+            if tracked.future.cancelled():
+                return
+            if exception is not None:
+                tracked.future.set_exception(exception)
+            else:
+                tracked.future.set_result(result)
+
+
+POLLER = OperationPoller()
+
+
+def wait_for_operation(project, name, timeout, deployment=None):
+    """ Blocks until an operation is done
+
+    Args:
+        project (string): The project of the operation.
+        name (string): The name of the operation.
+        timeout (int): Maximum number of seconds to wait.
+        deployment (string): The deployment of the operation.
+
+    Returns: The Operation message.
+    """
+    try:
+        return POLLER.watch(project, name, deployment).result(timeout=timeout)
+    except futures.TimeoutError:
+        # Otherwise the operation would be polled until the process exits
+        POLLER.unwatch(project, name)
+        raise dm_exceptions.OperationError(
+            'Wait for Operation [{}] exceeded timeout of {} seconds'.format(
+                name,
+                timeout
+            )
+        )
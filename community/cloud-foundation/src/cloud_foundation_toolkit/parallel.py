@@ -0,0 +1,169 @@
+# Copyright 2018 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Helpers to run deployment actions concurrently """
+
+from collections import namedtuple
+from contextlib import contextmanager
+import sys
+import threading
+import traceback
+
+from concurrent import futures
+from googlecloudsdk.core import log as sdk_log
+from six import StringIO
+
+from cloud_foundation_toolkit import LOG
+
+Failure = namedtuple('Failure', ['item', 'error', 'traceback'])
+
+
+class ThreadRoutedStream(object):
+    """ File-like object that routes writes per thread.
+
+    Threads that started a capture write into their own buffer, all
+    other threads write straight into the wrapped stream. This allows
+    the output of concurrent deployments (including the SDK's progress
+    tickers and resource tables) to be printed atomically once each
+    deployment is done.
+
+    Attributes:
+        stream (file): The wrapped stream, ie sys.stdout.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    @property
+    def captured(self):
+        return getattr(self._local, 'captured', None)
+
+    def start_capture(self, captured):
+        self._local.captured = captured
+
+    def stop_capture(self):
+        self._local.captured = None
+
+    def write(self, data):
+        if self.captured is not None:
+            self.captured.write(data)
+        else:
+            self.stream.write(data)
+
+    def flush(self):
+        if self.captured is None:
+            self.stream.flush()
+
+    def isatty(self):
+        # Progress tickers should not try to redraw lines in a buffer
+        if self.captured is not None:
+            return False
+        return self.stream.isatty()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+@contextmanager
+def routed_output():
+    """ Installs ThreadRoutedStream objects as sys.stdout and sys.stderr.
+
+    The SDK keeps its own references to the standard streams, so its
+    log module is reset to pick up the routed streams, and reset again
+    to the original ones on exit.
+
+    Yields: A (stdout, stderr) tuple of ThreadRoutedStream objects
+    """
+
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = ThreadRoutedStream(stdout)
+    sys.stderr = ThreadRoutedStream(stderr)
+    sdk_log.Reset(sys.stdout, sys.stderr)
+    try:
+        yield sys.stdout, sys.stderr
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+        sdk_log.Reset(stdout, stderr)
+
+
+def call_buffered(func, item, streams, print_lock):
+    """ Calls `func(item)` capturing its output and exceptions.
+
+    Must be called inside `routed_output()` from a worker thread. The
+    captured output is written to the real stdout, in one piece, when
+    the call returns.
+
+    Args:
+        func (callable): Function that takes a single item.
+        item (object): The argument for `func`.
+        streams (tuple): The (stdout, stderr) ThreadRoutedStream objects
+            yielded by `routed_output()`.
+        print_lock (threading.Lock): Lock serializing the writes of the
+            captured output.
+
+    Returns: A Failure object if the call raised an exception, None
+        otherwise.
+    """
+
+    stdout, stderr = streams
+    captured = StringIO()
+    stdout.start_capture(captured)
+    stderr.start_capture(captured)
+    failure = None
+    try:
+        func(item)
+    except (Exception, SystemExit) as err:  # pylint: disable=broad-except
+        failure = Failure(item, err, traceback.format_exc())
+        LOG.debug('%s failed:\n%s', item, failure.traceback)
+    finally:
+        stdout.stop_capture()
+        stderr.stop_capture()
+    with print_lock:
+        stdout.stream.write(captured.getvalue())
+        stdout.stream.flush()
+    return failure
+
+
+def run_parallel(func, items, parallelism):
+    """ Runs `func(item)` for each item on a bounded pool of threads.
+
+    The output of each call is buffered and printed in one go when the
+    call finishes, so output from different items never interleaves.
+    Exceptions don't stop the other items from being processed; they
+    are collected and returned to the caller instead.
+
+    Args:
+        func (callable): Function that takes a single item.
+        items (list): The items to process.
+        parallelism (int): Maximum number of items processed at once.
+
+    Returns: A list of Failure objects, one for each item whose call
+        raised an exception, in order of completion.
+    """
+
+    failures = []
+    print_lock = threading.Lock()
+
+    with routed_output() as streams:
+        with futures.ThreadPoolExecutor(max_workers=parallelism) as executor:
+            jobs = [
+                executor.submit(call_buffered, func, item, streams, print_lock)
+                for item in items
+            ]
+            for job in futures.as_completed(jobs):
+                failure = job.result()
+                if failure:
+                    failures.append(failure)
+
+    return failures
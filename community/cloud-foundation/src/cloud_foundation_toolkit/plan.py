@@ -0,0 +1,190 @@
+# Copyright 2018 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Offline plans: what an update would change, without previews """
+
+from collections import namedtuple
+import difflib
+
+from concurrent import futures
+
+from cloud_foundation_toolkit import LOG
+from cloud_foundation_toolkit.deployment import Deployment
+from cloud_foundation_toolkit.dm_utils import get_manifest
+from cloud_foundation_toolkit.yaml_utils import new_yaml
+
+# Default number of deployments planned concurrently
+DEFAULT_WORKERS = 16
+
+Plan = namedtuple(
+    'Plan',
+    [
+        'project',
+        'deployment',
+        'action',  # 'create', 'update', 'unchanged' or 'error'
+        'resources',  # {'added': [...], 'removed': [...], 'changed': [...]}
+        'imports',  # same as resources, for the imported files
+        'diff',  # unified diff of the config and imports
+        'error'
+    ]
+)
+
+
+def diff_items(old, new):
+    """ Compares two dicts of named items
+
+    Returns: A dict with the sorted names of the 'added', 'removed' and
+        'changed' items.
+    """
+    return {
+        'added': sorted(k for k in new if k not in old),
+        'removed': sorted(k for k in old if k not in new),
+        'changed': sorted(k for k in new if k in old and old[k] != new[k])
+    }
+
+
+def unified_diff(name, old, new):
+    return ''.join(
+        difflib.unified_diff(
+            (old or '').splitlines(True),
+            (new or '').splitlines(True),
+            'a/' + name,
+            'b/' + name
+        )
+    )
+
+
+def parse_resources(content):
+    """ Returns the resources of a DM config, by name """
+    config = new_yaml().load(content or '') or {}
+    return {r['name']: r for r in config.get('resources') or []}
+
+
+def plan_deployment(config):
+    """ Compares a config with the current manifest of its deployment
+
+    Deployments whose digest label matches the local config are not
+    compared any further. Otherwise, the config and imports of their
+    current manifest are fetched once, and compared with the rendered
+    config and imports.
+
+    Args:
+        config (Config): The config to plan.
+
+    Returns: A Plan
+    """
+    deployment = Deployment(config)
+    plan = dict(
+        project=config.project,
+        deployment=config.deployment,
+        resources=diff_items({}, {}),
+        imports=diff_items({}, {}),
+        diff='',
+        error=None
+    )
+    try:
+        target = deployment.target_config
+        new_config = target.config.content
+        new_imports = {i.name: i.content for i in target.imports or []}
+        old_config, old_imports = None, {}
+        if deployment.get() is None:
+            plan['action'] = 'create'
+        elif deployment.is_up_to_date():
+            return Plan(action='unchanged', **plan)
+        else:
+            plan['action'] = 'update'
+            manifest = get_manifest(
+                config.project,
+                config.deployment,
+                deployment.current.manifest.split('/')[-1]
+            )
+            old_config = manifest.config.content
+            old_imports = {
+                i.name: i.content for i in manifest.imports or []
+            }
+    except Exception as err:  # pylint: disable=broad-except
+        LOG.debug('Failed to plan %s: %s', config.deployment, err)
+        plan.update(action='error', error='{}: {}'.format(
+            type(err).__name__,
+            err
+        ))
+        return Plan(**plan)
+
+    plan['resources'] = diff_items(
+        parse_resources(old_config),
+        parse_resources(new_config)
+    )
+    plan['imports'] = diff_items(old_imports, new_imports)
+    diffs = [unified_diff(config.deployment + '.yaml', old_config, new_config)]
+    diffs.extend(
+        unified_diff(name, old_imports.get(name), new_imports.get(name))
+        for name in sorted(set(old_imports) | set(new_imports))
+    )
+    plan['diff'] = ''.join(diffs)
+    if plan['action'] == 'update' and not plan['diff']:
+        # Same content, yet another digest, ie a failed or pending update
+        plan['action'] = 'unchanged'
+    return Plan(**plan)
+
+
+def plan_graph(config_graph, workers=DEFAULT_WORKERS):
+    """ Plans all configs of the graph, concurrently
+
+    The configs are planned regardless of their dependencies: the
+    outputs they reference are read from the current deployments.
+
+    Returns: A list of Plans, in dependency order.
+    """
+    configs = [c for level in config_graph for c in level]
+    if not configs:
+        return []
+    with futures.ThreadPoolExecutor(min(workers, len(configs))) as executor:
+        return list(executor.map(plan_deployment, configs))
+
+
+def print_plans(plans, diff=False):
+    """ Prints a summary of the changes of each deployment
+
+    Args:
+        plans (list): The Plans to print.
+        diff (boolean): Whether to print the unified diffs too.
+    """
+    signs = [('added', '+'), ('removed', '-'), ('changed', '~')]
+    print('---------- Plan ----------')
+    for plan in plans:
+        print(
+            ' - project: {}, deployment: {}: {}'.format(
+                plan.project,
+                plan.deployment,
+                plan.action
+            )
+        )
+        if plan.error:
+            print('   {}'.format(plan.error))
+        for kind in ['resources', 'imports']:
+            for key, sign in signs:
+                for name in getattr(plan, kind)[key]:
+                    print('   {} {} {}'.format(sign, kind[:-1], name))
+        if diff and plan.diff:
+            print(''.join('   ' + l for l in plan.diff.splitlines(True)))
+    print('------------------------------')
+    counts = {}
+    for plan in plans:
+        counts[plan.action] = counts.get(plan.action, 0) + 1
+    print('Plan: {}'.format(
+        ', '.join(
+            '{} to {}'.format(counts[a], a) if a in ('create', 'update') else
+            '{} {}'.format(counts[a], a)
+            for a in ['create', 'update', 'unchanged', 'error'] if a in counts
+        )
+    ))
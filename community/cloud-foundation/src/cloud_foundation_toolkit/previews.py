@@ -0,0 +1,121 @@
+# Copyright 2018 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Reports of pending previews, to approve them in bulk """
+
+import base64
+import io
+import json
+import os
+import os.path
+import tempfile
+import threading
+
+from cloud_foundation_toolkit.deployment import Node
+
+
+def encode_fingerprint(fingerprint):
+    """ Returns a DM fingerprint (bytes) as a JSON-friendly string """
+    return base64.b64encode(fingerprint or b'').decode('ascii')
+
+
+class PreviewReport(object):
+    """ The previews created by a run, with the changes they would make
+
+    The file is a JSON object mapping "project/deployment" to the
+    preview of the deployment:
+
+    ```
+    {
+      "my-project/my-networks": {
+        "project": "my-project",
+        "deployment": "my-networks",
+        "source": "configs/networks.yaml",
+        "fingerprint": "cUlGmcvCK9ez2lTfoFzUsQ==",
+        "digest": "1f0e2b...",
+        "changes": [
+          {"name": "my-network", "type": "compute.v1.network",
+           "intent": "CREATE_OR_ACQUIRE"}
+        ]
+      }
+    }
+    ```
+
+    The fingerprint is the one of the deployment right after its
+    preview, so previews that were changed since (ie by another run)
+    are not applied. The digest is the one of the previewed target
+    config, which the deployment is labelled with once the preview is
+    applied, whatever the config became since.
+
+    Attributes:
+        path (string): The path of the report.
+        previews (dict): The previews, by "project/deployment".
+    """
+
+    def __init__(self, path, load=False):
+        """ Constructor
+
+        Args:
+            path (string): The path of the report.
+            load (boolean): Whether to load the existing report, or to
+                start a new one.
+        """
+        self.path = path
+        self.previews = {}
+        self._lock = threading.Lock()
+        if load:
+            try:
+                with io.open(path, encoding='utf-8') as _fd:
+                    self.previews = json.load(_fd)
+            except (IOError, ValueError) as err:
+                raise SystemExit(
+                    'Invalid preview report {}: {}'.format(path, err)
+                )
+
+    @property
+    def nodes(self):
+        """ The nodes of the previewed deployments """
+        return [
+            Node(p['project'], p['deployment'])
+            for p in self.previews.values()
+        ]
+
+    def add(self, config, fingerprint, digest, changes):
+        """ Records the preview of a deployment
+
+        Args:
+            config (Config): The config of the deployment.
+            fingerprint (bytes): The fingerprint of the deployment.
+            digest (string): The digest of the previewed target config.
+            changes (list): The changes of the preview, see
+                `Deployment.preview_changes()`.
+        """
+        with self._lock:
+            self.previews['{}/{}'.format(*config.id)] = {
+                'project': config.project,
+                'deployment': config.deployment,
+                'source': config.source,
+                'fingerprint': encode_fingerprint(fingerprint),
+                'digest': digest,
+                'changes': changes
+            }
+
+    def save(self):
+        """ Writes the report atomically """
+        with self._lock:
+            content = json.dumps(self.previews, indent=2, sort_keys=True)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        _fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(_fd, 'w') as tmp:
+            tmp.write(content)
+        os.rename(tmp_path, self.path)
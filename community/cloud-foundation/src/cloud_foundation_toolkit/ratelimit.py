@@ -0,0 +1,172 @@
+# Copyright 2018 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Rate limiting and retries of DM API calls """
+
+import random
+import socket
+import ssl
+import threading
+import time
+
+from six.moves import http_client
+
+from cloud_foundation_toolkit import LOG
+from cloud_foundation_toolkit.metrics import COUNTERS
+
+# DM's default quota is 1000 queries per 100 seconds per project
+DEFAULT_QPS = 10.0
+DEFAULT_RETRIES = 5
+
+TRANSPORT_ERRORS = (socket.error, http_client.HTTPException, ssl.SSLError)
+
+
+class TokenBucket(object):
+    """ Thread-safe token bucket
+
+    Tokens are added at `rate` per second, up to `capacity`. Callers
+    that find the bucket empty reserve a future token and sleep until
+    it is available, so concurrent callers are served in turn.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        capacity (float): Maximum number of tokens, ie the burst size.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """ Takes a token
+
+        Returns: The number of seconds to wait before using it.
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class RateLimiter(object):
+    """ Limits the rate of API calls, per project
+
+    Attributes:
+        qps (float): Maximum number of calls per second to each project.
+            0 or None disables the limit.
+    """
+
+    def __init__(self, qps=DEFAULT_QPS):
+        self.qps = qps
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, project):
+        """ Blocks until a call to `project` is allowed
+
+        Returns: The number of seconds waited.
+        """
+        if not self.qps:
+            return 0.0
+        with self._lock:
+            bucket = self._buckets.get(project)
+            if bucket is None or bucket.rate != self.qps:
+                bucket = self._buckets[project] = TokenBucket(self.qps)
+        delay = bucket.reserve()
+        if delay:
+            COUNTERS.increment('api.throttled')
+            LOG.debug('Throttling call to project %s for %.2fs',
+                      project, delay)
+            time.sleep(delay)
+        return delay
+
+
+class RetryPolicy(object):
+    """ Retries transient failures with jittered exponential backoff
+
+    Calls failing with HTTP 429 or 5xx errors, or with transport errors
+    (broken connections, timeouts), are retried after a random delay
+    between 0 and min(max_delay, base_delay * 2 ^ attempt).
+
+    Only idempotent calls (reads) can be retried on any transient
+    failure. A 5xx or transport error may come after the server applied
+    a mutation, and retrying it would fail with a conflict, or start a
+    second operation, so `call_mutation()` only retries throttled calls,
+    which were rejected before being applied.
+
+    Attributes:
+        retries (int): Maximum number of retries of a call.
+        base_delay (float): Seconds of the first backoff period.
+        max_delay (float): Maximum backoff period in seconds.
+    """
+
+    def __init__(self, retries=DEFAULT_RETRIES, base_delay=1.0,
+                 max_delay=32.0):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @staticmethod
+    def is_transient(err):
+        from apitools.base.py import exceptions as apitools_exceptions
+
+        if isinstance(err, apitools_exceptions.HttpError):
+            status = getattr(err, 'status_code', 0) or 0
+            return status == 429 or status >= 500
+        return isinstance(err, TRANSPORT_ERRORS)
+
+    @staticmethod
+    def is_throttled(err):
+        return getattr(err, 'status_code', None) == 429
+
+    def call(self, func, *args, **kwargs):
+        """ Calls `func`, retrying it on transient failures """
+        return self._call(self.is_transient, func, args, kwargs)
+
+    def call_mutation(self, func, *args, **kwargs):
+        """ Calls `func`, retrying it only when it was throttled """
+        return self._call(self.is_throttled, func, args, kwargs)
+
+    def _call(self, retryable, func, args, kwargs):
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as err:  # pylint: disable=broad-except
+                if attempt >= self.retries or not retryable(err):
+                    raise
+                if self.is_throttled(err):
+                    COUNTERS.increment('api.throttled')
+                delay = random.uniform(
+                    0,
+                    min(self.max_delay, self.base_delay * 2 ** attempt)
+                )
+                attempt += 1
+                COUNTERS.increment('api.retried')
+                LOG.debug('Retry %s/%s in %.2fs after: %s',
+                          attempt, self.retries, delay, err)
+                time.sleep(delay)
+
+
+RATE_LIMITER = RateLimiter()
+RETRY_POLICY = RetryPolicy()
@@ -0,0 +1,140 @@
+# Copyright 2018 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Dependency-driven scheduler for config graphs """
+
+import heapq
+import itertools
+import threading
+
+from concurrent import futures
+import networkx as nx
+
+from cloud_foundation_toolkit import LOG
+from cloud_foundation_toolkit.events import EVENTS
+from cloud_foundation_toolkit.parallel import call_buffered
+from cloud_foundation_toolkit.parallel import routed_output
+
+
+class DagScheduler(object):
+    """ Runs a function on every config of a ConfigGraph
+
+    Unlike iterating over `ConfigGraph.levels`, there are no barriers
+    between stages: a config is dispatched as soon as all its
+    predecessors in `ConfigGraph.graph` completed. When more configs
+    are ready than there are free workers, the ones with the longest
+    chain of configs downstream of them (the critical path) go first.
+
+    If a config fails, every config downstream of it is skipped, while
+    independent configs keep going.
+
+    With `reverse`, the graph is walked in reverse dependency order, as
+    for deletions: a config is dispatched once all the configs that
+    depend on it are done, and a failure skips the configs it depends
+    on, which are still in use.
+
+    ```
+    scheduler = DagScheduler(ConfigGraph(configs), func, parallelism=8)
+    failures, skipped = scheduler.run()
+    ```
+
+    Attributes:
+        graph (ConfigGraph): The graph to run.
+        func (callable): Function that takes a single Config.
+        parallelism (int): Maximum number of configs processed at once.
+        reverse (boolean): Whether to run in reverse dependency order.
+    """
+
+    def __init__(self, graph, func, parallelism, reverse=False):
+        self.graph = graph
+        self.func = func
+        self.parallelism = parallelism
+        self.reverse = reverse
+
+    def run(self):
+        """ Runs `func` on all configs of the graph
+
+        Returns: A (failures, skipped) tuple. `failures` is a list of
+            parallel.Failure objects, and `skipped` a list of the Config
+            objects that weren't run because an upstream config failed.
+        """
+
+        self.graph.check_external_nodes()
+        dag = self.graph.graph
+        configs = self.graph.configs
+        priorities = self.graph.path_lengths(self.reverse)
+        if self.reverse:
+            before, after = dag.successors, dag.predecessors
+            downstream = nx.ancestors
+        else:
+            before, after = dag.predecessors, dag.successors
+            downstream = nx.descendants
+
+        waiting_on = {n: set(before(n)) for n in dag.nodes()}
+        counter = itertools.count()
+        ready, failures, skipped = [], [], set()
+
+        def push(node):
+            heapq.heappush(ready, (-priorities[node], next(counter), node))
+            if node in configs:
+                EVENTS.emit('queued', node, priority=priorities[node])
+
+        def complete(node):
+            for successor in after(node):
+                waiting_on[successor].discard(node)
+                if not waiting_on[successor] and successor not in skipped:
+                    push(successor)
+
+        # Seed with the nodes waiting on nothing. External nodes were
+        # checked already, so they complete as soon as they are popped
+        for node in list(waiting_on):
+            if not waiting_on[node]:
+                push(node)
+
+        running = {}
+        print_lock = threading.Lock()
+        with routed_output() as streams:
+            with futures.ThreadPoolExecutor(self.parallelism) as executor:
+                while ready or running:
+                    while ready and len(running) < self.parallelism:
+                        _, _, node = heapq.heappop(ready)
+                        if node not in configs:
+                            complete(node)
+                            continue
+                        LOG.debug('Dispatching %s', node)
+                        job = executor.submit(
+                            call_buffered,
+                            self.func,
+                            configs[node],
+                            streams,
+                            print_lock
+                        )
+                        running[job] = node
+
+                    if not running:
+                        continue
+
+                    done, _ = futures.wait(
+                        running,
+                        return_when=futures.FIRST_COMPLETED
+                    )
+                    for job in done:
+                        node = running.pop(job)
+                        failure = job.result()
+                        if failure:
+                            failures.append(failure)
+                            skipped.update(downstream(dag, node))
+                        else:
+                            complete(node)
+
+        return failures, [configs[n] for n in skipped if n in configs]
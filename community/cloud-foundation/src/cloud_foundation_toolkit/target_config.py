@@ -0,0 +1,201 @@
+# Copyright 2018 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" In-memory builder of DM target configs """
+
+import hashlib
+import io
+import os.path
+import threading
+
+from six.moves.urllib.parse import urlparse
+
+from cloud_foundation_toolkit import LOG
+from cloud_foundation_toolkit.yaml_utils import new_yaml
+
+TEMPLATE_EXTENSIONS = ('.jinja', '.py')
+
+
+class ImportedFile(object):
+    """ The content of an imported file
+
+    Attributes:
+        path (string): The absolute path of the file.
+        content (string): The content of the file.
+        digest (string): The sha256 hex digest of the content.
+        imports (list): The `imports` section of the file, if it is a
+            yaml file (ie a schema), or an empty list.
+    """
+
+    def __init__(self, path, content):
+        self.path = path
+        self.content = content
+        self.digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        self._imports = None
+
+    @property
+    def imports(self):
+        if self._imports is None:
+            yaml = new_yaml()
+            # Like DM, accept schemas with duplicate keys, the last wins
+            yaml.allow_duplicate_keys = True
+            data = yaml.load(self.content) or {}
+            self._imports = list(data.get('imports', []) or [])
+        return self._imports
+
+
+class ContentCache(object):
+    """ Thread-safe cache of imported files
+
+    Templates are usually imported by many configs. This cache makes
+    sure each file is read and hashed once per run, no matter how many
+    deployments import it.
+
+    Attributes:
+        hits (int): Number of reads served from memory.
+        misses (int): Number of reads from disk.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """ Returns the ImportedFile for `path`, or None if it doesn't exist
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self._files:
+                self.hits += 1
+                return self._files[path]
+
+        if os.path.isfile(path):
+            with io.open(path, encoding='utf-8') as _fd:
+                imported = ImportedFile(path, _fd.read())
+        else:
+            imported = None
+
+        with self._lock:
+            self.misses += 1
+            return self._files.setdefault(path, imported)
+
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+            self.hits = self.misses = 0
+
+
+CONTENT_CACHE = ContentCache()
+
+
+def is_url(path):
+    return urlparse(path).scheme in ('http', 'https')
+
+
+def resolve_imports(imports, base_dir, cache=CONTENT_CACHE):
+    """ Resolves the imports of a config, in memory
+
+    Mirrors what the SDK does when building a target config from a file:
+    every import is resolved relative to the directory of the file that
+    imports it, its name defaults to its path, and templates bring in
+    their `.schema` file, if any, along with the schema's own imports.
+
+    Args:
+        imports (list): The `imports` section of a DM config.
+        base_dir (string): The directory relative paths are resolved
+            against.
+        cache (ContentCache): The cache to read the files from.
+
+    Returns: A list of (name, ImportedFile) tuples, in the order the
+        SDK would send them to the API.
+    """
+
+    resolved, names = [], set()
+    pending = [(item, base_dir) for item in reversed(imports or [])]
+
+    while pending:
+        item, directory = pending.pop()
+        if 'path' not in item:
+            raise ValueError('Missing required field "path" in import')
+        path = item['path']
+        name = item.get('name', path)
+        if name in names:
+            continue
+
+        imported = cache.get(os.path.join(directory, path))
+        if imported is None:
+            raise IOError(
+                'Unable to read file "{}" imported as "{}"'.format(path, name)
+            )
+        names.add(name)
+        resolved.append((name, imported))
+
+        if not path.endswith(TEMPLATE_EXTENSIONS):
+            continue
+        schema = cache.get(imported.path + '.schema')
+        if schema is None or name + '.schema' in names:
+            continue
+        names.add(name + '.schema')
+        resolved.append((name + '.schema', schema))
+        schema_dir = os.path.dirname(schema.path)
+        pending.extend((i, schema_dir) for i in reversed(schema.imports))
+
+    LOG.debug(
+        'Resolved %s imports (file cache hits: %s, misses: %s)',
+        len(resolved),
+        cache.hits,
+        cache.misses
+    )
+    return resolved
+
+
+def build_target_config(messages, content, imports, base_dir=None):
+    """ Builds a TargetConfiguration message without temporary files
+
+    Args:
+        messages (module): The DM API messages module.
+        content (string): The yaml content of the DM config.
+        imports (list): The `imports` section of the DM config.
+        base_dir (string): The directory imports are resolved against.
+            Defaults to the current directory.
+
+    Returns: A TargetConfiguration message
+    """
+
+    resolved = resolve_imports(imports, base_dir or os.getcwd())
+    return messages.TargetConfiguration(
+        config=messages.ConfigFile(content=content),
+        imports=[
+            messages.ImportFile(name=name, content=imported.content)
+            for name, imported in resolved
+        ]
+    )
+
+
+def target_digest(target):
+    """ Returns a digest of a TargetConfiguration message
+
+    The digest covers the config and the name and content of every
+    import, so it changes whenever anything that would be sent to DM
+    changes. It is a 56 characters hex string, short enough to be used
+    as a label value.
+    """
+
+    digest = hashlib.sha224(target.config.content.encode('utf-8'))
+    for imported in sorted(target.imports, key=lambda i: i.name):
+        for value in (imported.name, imported.content):
+            digest.update(value.encode('utf-8'))
+            digest.update(b'\0')
+    return digest.hexdigest()
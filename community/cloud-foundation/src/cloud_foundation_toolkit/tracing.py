@@ -0,0 +1,193 @@
+# Copyright 2018 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Timing instrumentation of runs, exported as Chrome trace events """
+
+from contextlib import contextmanager
+import io
+import json
+import os
+import threading
+import time
+
+
+class Tracer(object):
+    """ Records timed spans of a run
+
+    Spans are recorded only once the tracer is enabled, so the
+    instrumentation costs next to nothing otherwise. Spans started
+    within a 'deployment' span are tagged with its node, so everything
+    done for a deployment (API calls, operation waits, etc) can be
+    found in the trace.
+
+    ```
+    with TRACER.span('wait', 'operation'):
+        ...
+    TRACER.write('trace.json')
+    ```
+
+    The trace file uses the Chrome trace event format, which can be
+    viewed as a timeline in chrome://tracing or https://ui.perfetto.dev
+
+    Attributes:
+        enabled (boolean): Whether spans are recorded.
+        events (list): The recorded trace events.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self._start = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._threads = {}
+
+    def enable(self):
+        with self._lock:
+            self.enabled = True
+            self.events = []
+            self._threads = {}
+            self._start = time.time()
+
+    @property
+    def node(self):
+        """ The node of the deployment the current thread works on """
+        return getattr(self._local, 'node', None)
+
+    @contextmanager
+    def span(self, name, category='cft', node=None, **args):
+        """ Records the time spent in the block as a span
+
+        Args:
+            name (string): The name of the span.
+            category (string): The category of the span, ie 'api'.
+            node (Node): The node of the deployment the span is about.
+                Defaults to the node of the enclosing deployment span.
+            args: Extra attributes of the span.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        previous = self.node
+        if node is not None:
+            self._local.node = node
+        start = time.time()
+        try:
+            yield
+        finally:
+            end = time.time()
+            self._local.node = previous
+            node = node or previous
+            if node is not None:
+                args['node'] = '{}/{}'.format(node.project, node.deployment)
+            self._add(name, category, start, end, args)
+
+    def _add(self, name, category, start, end, args):
+        thread = threading.current_thread()
+        with self._lock:
+            tid = self._threads.setdefault(
+                thread.ident,
+                (len(self._threads) + 1, thread.name)
+            )[0]
+            self.events.append({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': int((start - self._start) * 1e6),
+                'dur': int((end - start) * 1e6),
+                'pid': os.getpid(),
+                'tid': tid,
+                'args': args
+            })
+
+    def durations(self, category):
+        """ Returns the total duration in seconds of spans, per node
+
+        Args:
+            category (string): The category of the spans to add up.
+
+        Returns: A dict mapping "project/deployment" to seconds.
+        """
+        durations = {}
+        with self._lock:
+            for event in self.events:
+                node = event['args'].get('node')
+                if event['cat'] == category and node:
+                    durations[node] = durations.get(node, 0) + \
+                        event['dur'] / 1e6
+        return durations
+
+    def write(self, path):
+        """ Writes the trace to `path` in the Chrome trace event format """
+        with self._lock:
+            metadata = [
+                {
+                    'name': 'thread_name',
+                    'ph': 'M',
+                    'pid': os.getpid(),
+                    'tid': tid,
+                    'args': {'name': name}
+                } for tid, name in self._threads.values()
+            ]
+            content = json.dumps(
+                {
+                    'traceEvents': metadata + self.events,
+                    'displayTimeUnit': 'ms'
+                },
+                indent=1
+            )
+        with io.open(path, 'w', encoding='utf-8') as _fd:
+            _fd.write(content if isinstance(content, type(u'')) else
+                      content.decode('utf-8'))
+
+
+TRACER = Tracer()
+
+
+def critical_path(config_graph, durations):
+    """ Returns the chain of deployments that took the longest
+
+    Args:
+        config_graph (ConfigGraph): The graph of the run.
+        durations (dict): Seconds spent per "project/deployment".
+
+    Returns: A tuple with the list of "project/deployment" strings of
+        the path, in dependency order, and its total duration.
+    """
+    best = {}
+    for node in config_graph.sort():
+        key = '{}/{}'.format(node.project, node.deployment)
+        previous = [best[p] for p in config_graph.graph.predecessors(node)]
+        path, total = max(previous or [([], 0)], key=lambda b: b[1])
+        if key in durations:
+            path, total = path + [key], total + durations[key]
+        best[node] = (path, total)
+    return max(best.values() or [([], 0)], key=lambda b: b[1])
+
+
+def print_summary(config_graph, slowest=5):
+    """ Prints the slowest deployments and the critical path of the run
+    """
+    durations = TRACER.durations('deployment')
+    if not durations:
+        return
+    print('---------- Slowest deployments ----------')
+    for node, seconds in sorted(
+        durations.items(),
+        key=lambda d: d[1],
+        reverse=True
+    )[:slowest]:
+        print(' - {}: {:.1f}s'.format(node, seconds))
+    path, total = critical_path(config_graph, durations)
+    print('Critical path ({:.1f}s): {}'.format(total, ' -> '.join(path)))
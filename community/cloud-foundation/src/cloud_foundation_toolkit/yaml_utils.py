@@ -1,9 +1,48 @@
+import os
+
 from ruamel.yaml import YAML
 from ruamel.yaml.compat import StringIO
 
 
+class DMOutputTag(object):
+    """ A `!DMOutput dm://...` node, resolved at deployment time """
+
+    yaml_tag = u'!DMOutput'
+
+    def __init__(self, url):
+        self.url = url
+
+    def __eq__(self, other):
+        return isinstance(other, DMOutputTag) and other.url == self.url
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.url)
+
+    def __repr__(self):
+        return '{} {}'.format(self.yaml_tag, self.url)
+
+
+def construct_dm_output_tag(constructor, node):
+    return DMOutputTag(constructor.construct_scalar(node))
+
+
+def represent_dm_output_tag(representer, data):
+    return representer.represent_scalar(DMOutputTag.yaml_tag, data.url)
+
+
 class CFTBaseYAML(YAML):
 
+    def __init__(self, *args, **kwargs):
+        super(CFTBaseYAML, self).__init__(*args, **kwargs)
+        self.Constructor.add_constructor(
+            DMOutputTag.yaml_tag,
+            construct_dm_output_tag
+        )
+        self.Representer.add_representer(DMOutputTag, represent_dm_output_tag)
+
     def dump(self, data, stream=None, **kwargs):
         inefficient = False
         if stream is None:
@@ -12,3 +51,45 @@ class CFTBaseYAML(YAML):
         YAML.dump(self, data, stream, **kwargs)
         if inefficient:
             return stream.getvalue()
+
+
+class CFTFastYAML(CFTBaseYAML):
+    """ A safe loader/dumper, much faster than the round-trip one
+
+    It uses the C extension of ruamel.yaml when it is installed, and
+    falls back to the pure python safe loader/dumper otherwise. Comments
+    and key order are not preserved, which DM doesn't need.
+    """
+
+    def __init__(self):
+        super(CFTFastYAML, self).__init__(typ='safe', pure=False)
+        self.default_flow_style = False
+
+
+BACKENDS = {'roundtrip': CFTBaseYAML, 'fast': CFTFastYAML}
+
+_backend = os.environ.get('CFT_YAML_BACKEND', 'roundtrip')
+
+
+def set_backend(name):
+    """ Selects the YAML backend returned by `new_yaml()`
+
+    Args:
+        name (string): One of BACKENDS.
+    """
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError('Unknown YAML backend: {}'.format(name))
+    _backend = name
+
+
+def get_backend():
+    return _backend
+
+
+def new_yaml():
+    """ Returns a new loader/dumper of the selected backend
+
+    Instances are not thread-safe, so each user gets its own.
+    """
+    return BACKENDS[_backend]()
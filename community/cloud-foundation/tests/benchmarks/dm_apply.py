@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+""" Benchmark of `cft apply` against the fake DM API
+
+Generates a synthetic graph of configs, where each config references
+the outputs of up to `--dependencies` configs generated before it, and
+times `cft apply` on them against the FakeDM of tests/fakes/fake_dm.py,
+without GCP. The first run creates all deployments, the second one finds
+them up to date. The number of DM API calls of each run is reported along.
+
+Usage:
+    python tests/benchmarks/dm_apply.py [--configs 300] [--dependencies 2]
+        [--latency 0.5] [--failure-rate 0] [--error-rate 0]
+        [--poll-interval 1] [-- <cft options>]
+
+For example, to compare the schedulers:
+    python tests/benchmarks/dm_apply.py -- --parallelism 16
+    python tests/benchmarks/dm_apply.py -- --parallelism 16 --scheduler dag
+"""
+
+from __future__ import print_function
+import argparse
+import io
+import os.path
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from cloud_foundation_toolkit.actions import execute
+from cloud_foundation_toolkit.cli import parse_args
+from cloud_foundation_toolkit.dm_utils import OUTPUT_CACHE
+from cloud_foundation_toolkit.metrics import COUNTERS
+from cloud_foundation_toolkit.operations import POLLER
+
+# The fakes live next to the benchmarks, in tests/
+sys.path.insert(
+    0,
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+from fakes.fake_dm import FakeDM  # noqa: E402
+
+CONFIG = """name: deployment-{i}
+project: benchmark
+resources:
+  - name: resource-{i}
+    type: compute.v1.network
+    properties:
+      index: {i}
+{references}"""
+
+REFERENCE = """      dependency{j}: $(out.deployment-{d}.resource-{d}.selfLink)
+"""
+
+
+def generate(directory, configs, dependencies, seed=0):
+    """ Writes `configs` config files in `directory`
+
+    Each config depends on up to `dependencies` configs picked among the
+    50 configs generated right before it, which makes for chains of
+    dependent configs as well as wide stages.
+    """
+    rand = random.Random(seed)
+    for i in range(configs):
+        candidates = list(range(max(0, i - 50), i))
+        picked = rand.sample(candidates, min(dependencies, len(candidates)))
+        content = CONFIG.format(
+            i=i,
+            references=''.join(
+                REFERENCE.format(j=j, d=d) for j, d in enumerate(picked)
+            )
+        )
+        path = os.path.join(directory, 'deployment-{:05d}.yaml'.format(i))
+        with io.open(path, 'w') as _fd:
+            _fd.write(content)
+
+
+def run(fake, cft_args):
+    """ Runs cft with `cft_args`, returns its duration and API calls """
+    OUTPUT_CACHE.clear()
+    COUNTERS.reset()
+    fake.calls.clear()
+    start = time.time()
+    try:
+        execute(parse_args(cft_args))
+    except SystemExit as err:
+        print('cft exited: {}'.format(err))
+    return time.time() - start, sum(fake.calls.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--configs', type=int, default=300)
+    parser.add_argument('--dependencies', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=POLLER.min_interval,
+        help='The first polling interval of operations'
+    )
+    parser.add_argument('cft_args', nargs='*')
+    args = parser.parse_args()
+
+    POLLER.min_interval = args.poll_interval
+    fake = FakeDM(
+        latency=args.latency,
+        failure_rate=args.failure_rate,
+        error_rate=args.error_rate,
+        seed=0
+    )
+    directory = tempfile.mkdtemp(prefix='cft-benchmark-')
+    try:
+        generate(directory, args.configs, args.dependencies)
+        cft_args = [
+            '--api-qps', '0', 'apply', directory, '--print-resources', 'none',
+            '--journal', os.path.join(directory, '.cft-journal')
+        ] + args.cft_args
+        with fake.install():
+            print('{:>10} {:>10} {:>10}'.format('run', 'time (s)', 'API calls'))
+            for name in ['create', 'no-op']:
+                duration, calls = run(fake, cft_args)
+                print('{:>10} {:>10.2f} {:>10}'.format(name, duration, calls))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
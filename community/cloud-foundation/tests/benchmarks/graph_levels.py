@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+""" Benchmark of the ConfigGraph stage computation
+
+Builds synthetic graphs of 1k, 10k and 50k configs and times building
+`ConfigGraph.graph` and computing `ConfigGraph.levels`. For linear
+scaling, the time per config should stay roughly constant as the
+graph grows.
+
+Usage:
+    python tests/benchmarks/graph_levels.py [--sizes 1000 10000 50000]
+        [--dependencies 3] [--check]
+"""
+
+from __future__ import print_function
+import argparse
+from collections import namedtuple
+import random
+import sys
+import timeit
+
+from six import PY2
+
+from cloud_foundation_toolkit.deployment import ConfigGraph
+from cloud_foundation_toolkit.deployment import Node
+
+if PY2:
+    import mock
+else:
+    import unittest.mock as mock
+
+# Stands in for Config: the graph only needs these attributes
+FakeConfig = namedtuple('FakeConfig', ['project', 'deployment', 'dependencies'])
+
+
+def build_graph(size, dependencies, seed=0):
+    """ Returns a ConfigGraph with `size` configs.
+
+    Each config depends on up to `dependencies` configs picked among the
+    100 configs generated right before it, which produces long chains
+    (many stages) as well as wide stages.
+    """
+
+    rnd = random.Random(seed)
+    graph = ConfigGraph([])
+    nodes = [Node('project-{}'.format(i % 10), 'd-{}'.format(i))
+             for i in range(size)]
+    for i, node in enumerate(nodes):
+        window = nodes[max(0, i - 100):i]
+        deps = set(rnd.sample(window, min(dependencies, len(window))))
+        graph.configs[node] = FakeConfig(node.project, node.deployment, deps)
+    return graph
+
+
+def run(size, dependencies):
+    graph = build_graph(size, dependencies)
+    with mock.patch('cloud_foundation_toolkit.deployment.get_deployment'):
+        graph_time = timeit.timeit(lambda: graph.graph, number=1)
+        levels_time = timeit.timeit(lambda: graph.levels, number=1)
+    return graph_time, levels_time, len(graph.levels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[1000, 10000, 50000]
+    )
+    parser.add_argument('--dependencies', type=int, default=3)
+    parser.add_argument(
+        '--check',
+        action='store_true',
+        help='Exit with an error if the time per config grows more than 3x'
+    )
+    args = parser.parse_args()
+
+    print('{:>8} {:>8} {:>10} {:>10} {:>14}'.format(
+        'configs', 'stages', 'graph (s)', 'levels (s)', 'us per config'))
+    per_config = []
+    for size in args.sizes:
+        graph_time, levels_time, stages = run(size, args.dependencies)
+        per_config.append((graph_time + levels_time) / size * 1e6)
+        print('{:>8} {:>8} {:>10.3f} {:>10.3f} {:>14.1f}'.format(
+            size, stages, graph_time, levels_time, per_config[-1]))
+
+    if args.check and max(per_config) > 3 * min(per_config):
+        sys.exit('Stage computation does not scale linearly')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+""" Benchmark of the YAML backends
+
+Generates configs and manifest layouts of roughly 1 MB and 20 MB and
+times loading and dumping them with each backend of `yaml_utils`.
+
+Usage:
+    python tests/benchmarks/yaml_backends.py [--sizes 1 20]
+        [--backends fast roundtrip]
+"""
+
+from __future__ import print_function
+import argparse
+import timeit
+
+from cloud_foundation_toolkit.yaml_utils import BACKENDS
+
+RESOURCE = """  - name: instance-{i}
+    type: instance.py
+    properties:
+      zone: us-central1-a
+      machineType: n1-standard-1
+      network: $(out.my-networks.my-network-prod.name)
+      tags:
+        items: [web, prod, tier-{tier}]
+      metadata:
+        items:
+          - key: startup-script
+            value: |
+              #!/bin/bash
+              echo "instance {i}"
+"""
+
+LAYOUT_RESOURCE = """- name: instance-{i}
+  type: instance.py
+  properties:
+    zone: us-central1-a
+    machineType: n1-standard-1
+  outputs:
+    - name: name
+      finalValue: instance-{i}
+    - name: internalIp
+      finalValue: 10.0.{tier}.{host}
+    - name: selfLink
+      finalValue: https://www.googleapis.com/compute/v1/projects/p/zones/us-central1-a/instances/instance-{i}
+  resources:
+    - name: instance-{i}
+      type: compute.v1.instance
+"""
+
+
+def generate(header, resource, size_mb):
+    """ Returns a yaml document of about `size_mb` MiB """
+    parts, size, i = [header], len(header), 0
+    while size < size_mb * 1024 * 1024:
+        part = resource.format(i=i, tier=i % 10, host=i % 250)
+        parts.append(part)
+        size += len(part)
+        i += 1
+    return ''.join(parts)
+
+
+def run(backend, content):
+    yaml = BACKENDS[backend]()
+    data = []
+    load_time = timeit.timeit(lambda: data.append(yaml.load(content)),
+                              number=1)
+    dump_time = timeit.timeit(lambda: yaml.dump(data[0]), number=1)
+    return load_time, dump_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 20])
+    parser.add_argument(
+        '--backends',
+        nargs='+',
+        choices=sorted(BACKENDS),
+        default=sorted(BACKENDS)
+    )
+    args = parser.parse_args()
+
+    print('{:>10} {:>8} {:>10} {:>10} {:>10}'.format(
+        'document', 'MiB', 'backend', 'load (s)', 'dump (s)'))
+    for size in args.sizes:
+        documents = [
+            ('config', generate('name: big\nresources:\n', RESOURCE, size)),
+            ('manifest', generate('resources:\n', LAYOUT_RESOURCE, size))
+        ]
+        for name, content in documents:
+            for backend in args.backends:
+                load_time, dump_time = run(backend, content)
+                print('{:>10} {:>8} {:>10} {:>10.2f} {:>10.2f}'.format(
+                    name, size, backend, load_time, dump_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,542 @@
+# Copyright 2018 Google Inc. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" In-process stand-in of the Deployment Manager v2 API
+
+For offline tests and load benchmarks. It serves the deployments,
+manifests, resources and operations calls made by the CFT, with
+operations that take `latency` seconds to complete, and optional
+injected failures:
+
+```
+fake = FakeDM(latency=0.5, failure_rate=0.01, error_rate=0.05)
+with fake.install():
+    execute(args)
+```
+
+Configs are not expanded: each resource of a config is created as is,
+with 'name' and 'selfLink' outputs, plus one output per top-level
+property, so `$(out)` references to them can be resolved.
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from datetime import timedelta
+from datetime import tzinfo
+import itertools
+import random
+import threading
+import time
+
+from cloud_foundation_toolkit.clients import POOL
+from cloud_foundation_toolkit.dm_utils import API
+from cloud_foundation_toolkit.yaml_utils import new_yaml
+
+BASE_URL = 'https://www.googleapis.com/deploymentmanager/v2/projects'
+
+try:
+    from datetime import timezone
+    UTC = timezone.utc
+except ImportError:  # Python 2
+
+    class _UTC(tzinfo):
+
+        def utcoffset(self, moment):
+            return timedelta(0)
+
+        def dst(self, moment):
+            return timedelta(0)
+
+        def tzname(self, moment):
+            return 'UTC'
+
+    UTC = _UTC()
+
+
+def timestamp(seconds):
+    """ Returns the RFC3339 timestamp of `seconds`, like DM does """
+    moment = datetime.fromtimestamp(seconds, tz=UTC)
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + '-00:00'
+
+
+def http_error(status, url, message=''):
+    """ Returns the apitools HttpError subclass matching `status` """
+    from apitools.base.py import exceptions as apitools_exceptions
+
+    response = {'status': status}
+    content = '{{"error": {{"code": {}, "message": "{}"}}}}'.format(
+        status,
+        message
+    )
+    error = {
+        404: apitools_exceptions.HttpNotFoundError,
+        409: apitools_exceptions.HttpConflictError
+    }.get(status, apitools_exceptions.HttpError)
+    return error(response, content, url)
+
+
+class FakeDM(object):
+    """ The state of a fake DM API, shared by all of its clients
+
+    Attributes:
+        latency (float): Seconds an operation takes to complete.
+        failure_rate (float): Probability that an operation fails.
+        error_rate (float): Probability that an API call fails with an
+            HTTP 503 error, before doing anything.
+        calls (Counter): The number of calls, per 'service.Method'.
+        deployments (dict): The deployments, per (project, name).
+        messages (module): The DM messages module of the SDK.
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        failure_rate=0.0,
+        error_rate=0.0,
+        seed=None,
+        messages=None
+    ):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.deployments = {}
+        self._messages = messages
+        self._operations = {}
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+
+    @property
+    def messages(self):
+        if self._messages is None:
+            self._messages = API.messages
+        return self._messages
+
+    def client(self):
+        """ Returns a new client, ie the factory of clients.POOL """
+        return FakeClient(self)
+
+    @contextmanager
+    def install(self):
+        """ Serves all DM API calls of the CFT in the block """
+        factory = POOL.factory
+        POOL.clear()
+        POOL.factory = self.client
+        try:
+            yield self
+        finally:
+            POOL.clear()
+            POOL.factory = factory
+
+    def call(self, service, method, request):
+        """ Serves a call, or fails it with an injected error """
+        with self._lock:
+            self.calls['{}.{}'.format(service, method)] += 1
+            self._complete_operations()
+            if self.error_rate and self._random.random() < self.error_rate:
+                raise http_error(503, self._url(request), 'Injected error')
+            handler = getattr(self, '_{}_{}'.format(service, method))
+            return handler(request)
+
+    # Deployments and operations are dicts holding the state, messages
+    # are built when they are returned
+
+    def _url(self, request, *parts):
+        return '/'.join(
+            [BASE_URL, request.project, 'global'] + [str(p) for p in parts]
+        )
+
+    def _deployment(self, request):
+        key = (request.project, request.deployment)
+        if key not in self.deployments:
+            raise http_error(
+                404,
+                self._url(request, 'deployments', request.deployment),
+                'The object \'{}\' is not found.'.format(request.deployment)
+            )
+        return self.deployments[key]
+
+    def _start_operation(self, request, operation_type, deployment, effect):
+        """ Starts an operation that applies `effect` once complete """
+        now = time.time()
+        name = 'operation-{}-{}'.format(int(now * 1000), next(self._ids))
+        failed = bool(
+            self.failure_rate and self._random.random() < self.failure_rate
+        )
+        operation = {
+            'name': name,
+            'project': request.project,
+            'type': operation_type,
+            'deployment': deployment,
+            'target': self._url(request, 'deployments', deployment['name']),
+            'start': now,
+            'end': now + self.latency,
+            'failed': failed,
+            'effect': effect,
+            'done': False
+        }
+        self._operations[(request.project, name)] = operation
+        deployment['operation'] = operation
+        if not self.latency:
+            self._complete_operations()
+        return self._operation_message(operation)
+
+    def _complete_operations(self):
+        now = time.time()
+        running = sorted(
+            (o for o in self._operations.values() if not o['done']),
+            key=lambda o: o['end']
+        )
+        for operation in running:
+            if operation['end'] > now:
+                break
+            operation['done'] = True
+            if not operation['failed']:
+                operation['effect'](operation)
+
+    def _operation_message(self, operation):
+        message = self.messages.Operation(
+            name=operation['name'],
+            operationType=operation['type'],
+            targetLink=operation['target'],
+            insertTime=timestamp(operation['start']),
+            status='DONE' if operation['done'] else 'RUNNING',
+            progress=100 if operation['done'] else min(99, int(
+                100 * (time.time() - operation['start']) /
+                max(operation['end'] - operation['start'], 1e-6)
+            ))
+        )
+        if operation['done']:
+            message.endTime = timestamp(operation['end'])
+        if operation['done'] and operation['failed']:
+            error = self.messages.Operation.ErrorValue
+            message.error = error(
+                errors=[
+                    error.ErrorsValueListEntry(
+                        code='RESOURCE_ERROR',
+                        message='Injected operation failure'
+                    )
+                ]
+            )
+        return message
+
+    def _apply_config(self, deployment, target, labels, time_):
+        """ Creates, updates and deletes the resources of a deployment
+
+        Args:
+            target (tuple): The content of the config, and a dict of the
+                imported files' contents, per name.
+        """
+        content, imports = target
+        config = new_yaml().load(content) or {}
+        resources = {}
+        for resource in config.get('resources', []):
+            name = resource['name']
+            previous = deployment['resources'].get(name)
+            properties = resource.get('properties') or {}
+            resources[name] = {
+                'name': name,
+                'type': resource.get('type'),
+                'properties': properties,
+                'insertTime': previous['insertTime'] if previous else time_,
+                'updateTime': time_ if previous and (
+                    previous['properties'] != properties
+                ) else previous and previous['updateTime']
+            }
+        deployment['resources'] = resources
+        deployment['config'] = content
+        deployment['imports'] = imports
+        deployment['outputs'] = config.get('outputs', [])
+        deployment['labels'] = labels
+        deployment['fingerprint'] += 1
+        deployment['manifest'] = 'manifest-{}'.format(next(self._ids))
+
+    def _layout(self, deployment):
+        """ Returns the manifest layout of the deployment, as YAML """
+        resources = []
+        for resource in deployment['resources'].values():
+            outputs = [
+                {
+                    'name': 'name',
+                    'finalValue': resource['name']
+                },
+                {
+                    'name': 'selfLink',
+                    'finalValue': 'https://fake/{}/{}'.format(
+                        deployment['name'],
+                        resource['name']
+                    )
+                }
+            ]
+            outputs.extend(
+                {
+                    'name': k,
+                    'finalValue': v
+                } for k, v in sorted(resource['properties'].items())
+                if k not in ('name', 'selfLink')
+            )
+            resources.append(
+                {
+                    'name': resource['name'],
+                    'type': resource['type'],
+                    'outputs': outputs
+                }
+            )
+        layout = {'resources': resources}
+        if deployment['outputs']:
+            layout['outputs'] = [
+                {
+                    'name': o['name'],
+                    'finalValue': o.get('value')
+                } for o in deployment['outputs']
+            ]
+        return new_yaml().dump(layout)
+
+    def _label_entries(self, labels, entry=None):
+        entry = entry or self.messages.DeploymentLabelEntry
+        return [
+            entry(key=k, value=v) for k, v in sorted(labels.items())
+        ]
+
+    def _deployments_Get(self, request):
+        deployment = self._deployment(request)
+        message = self.messages.Deployment(
+            name=deployment['name'],
+            fingerprint=str(deployment['fingerprint']).encode('ascii'),
+            labels=self._label_entries(deployment['labels']),
+            operation=self._operation_message(deployment['operation'])
+        )
+        if deployment['manifest']:
+            message.manifest = self._url(
+                request,
+                'deployments',
+                deployment['name'],
+                'manifests',
+                deployment['manifest']
+            )
+        if deployment['preview']:
+            message.update = self.messages.DeploymentUpdate(
+                labels=self._label_entries(
+                    deployment['preview'][1],
+                    self.messages.DeploymentUpdateLabelEntry
+                )
+            )
+        return message
+
+    def _deployments_Insert(self, request):
+        name = request.deployment.name
+        key = (request.project, name)
+        if key in self.deployments:
+            raise http_error(
+                409,
+                self._url(request, 'deployments'),
+                'The resource \'{}\' already exists'.format(name)
+            )
+        deployment = self.deployments[key] = {
+            'name': name,
+            'fingerprint': 0,
+            'labels': {},
+            'resources': {},
+            'config': None,
+            'imports': {},
+            'outputs': [],
+            'manifest': None,
+            'preview': None,
+            'operation': None
+        }
+        return self._start_operation(
+            request,
+            'insert',
+            deployment,
+            self._target_effect(request.deployment, request.preview)
+        )
+
+    def _deployments_Update(self, request):
+        deployment = self._deployment(request)
+        resource = request.deploymentResource
+        fingerprint = str(deployment['fingerprint']).encode('ascii')
+        if resource.fingerprint and resource.fingerprint != fingerprint:
+            raise http_error(
+                412,
+                self._url(request, 'deployments', request.deployment),
+                'Fingerprint mismatch'
+            )
+        if resource.target is None and not request.preview:
+            # Confirms the pending preview, with the labels of the
+            # confirmation if any
+            target, labels = deployment['preview'] or (None, None)
+            if resource.labels:
+                labels = {l.key: l.value for l in resource.labels}
+
+            def effect(operation):
+                if target is not None:
+                    self._apply_config(
+                        deployment,
+                        target,
+                        labels,
+                        timestamp(operation['end'])
+                    )
+                deployment['preview'] = None
+
+            return self._start_operation(request, 'update', deployment, effect)
+        return self._start_operation(
+            request,
+            'update',
+            deployment,
+            self._target_effect(resource, request.preview)
+        )
+
+    def _target_effect(self, resource, preview):
+        target = (
+            resource.target.config.content,
+            {i.name: i.content for i in resource.target.imports or []}
+        )
+        labels = {l.key: l.value for l in resource.labels or []}
+
+        def effect(operation):
+            deployment = operation['deployment']
+            if preview:
+                deployment['preview'] = (target, labels)
+                deployment['fingerprint'] += 1
+            else:
+                self._apply_config(
+                    deployment,
+                    target,
+                    labels,
+                    timestamp(operation['end'])
+                )
+
+        return effect
+
+    def _deployments_CancelPreview(self, request):
+        deployment = self._deployment(request)
+
+        def effect(_):
+            deployment['preview'] = None
+            deployment['fingerprint'] += 1
+
+        return self._start_operation(
+            request,
+            'cancelPreview',
+            deployment,
+            effect
+        )
+
+    def _deployments_Delete(self, request):
+        deployment = self._deployment(request)
+        key = (request.project, request.deployment)
+
+        def effect(_):
+            self.deployments.pop(key, None)
+
+        return self._start_operation(request, 'delete', deployment, effect)
+
+    def _manifests_Get(self, request):
+        deployment = self._deployment(request)
+        if request.manifest != deployment['manifest']:
+            raise http_error(
+                404,
+                self._url(request, 'manifests', request.manifest),
+                'The object \'{}\' is not found.'.format(request.manifest)
+            )
+        return self.messages.Manifest(
+            name=deployment['manifest'],
+            config=self.messages.ConfigFile(content=deployment['config']),
+            imports=[
+                self.messages.ImportFile(name=k, content=v)
+                for k, v in sorted(deployment['imports'].items())
+            ],
+            layout=self._layout(deployment)
+        )
+
+    def _resources_List(self, request):
+        deployment = self._deployment(request)
+        resources = [
+            self.messages.Resource(
+                name=r['name'],
+                type=r['type'],
+                insertTime=r['insertTime'],
+                updateTime=r['updateTime']
+            ) for r in deployment['resources'].values()
+        ]
+        if deployment['preview']:
+            # The resources a pending preview would change have an update
+            (content, _), _ = deployment['preview']
+            config = new_yaml().load(content) or {}
+            update = self.messages.ResourceUpdate
+            pending = update.StateValueValuesEnum('PENDING')
+            previewed = {r['name']: r for r in config.get('resources', [])}
+            for resource in resources:
+                if resource.name not in previewed:
+                    intent = 'DELETE'
+                elif previewed[resource.name].get('properties') != \
+                        deployment['resources'][resource.name]['properties']:
+                    intent = 'UPDATE'
+                else:
+                    continue
+                resource.update = update(
+                    intent=update.IntentValueValuesEnum(intent),
+                    state=pending
+                )
+            resources.extend(
+                self.messages.Resource(
+                    name=name,
+                    type=r.get('type'),
+                    update=update(
+                        intent=update.IntentValueValuesEnum(
+                            'CREATE_OR_ACQUIRE'
+                        ),
+                        state=pending
+                    )
+                ) for name, r in sorted(previewed.items())
+                if name not in deployment['resources']
+            )
+        return self.messages.ResourcesListResponse(resources=resources)
+
+    def _operations_Get(self, request):
+        key = (request.project, request.operation)
+        if key not in self._operations:
+            raise http_error(
+                404,
+                self._url(request, 'operations', request.operation),
+                'The object \'{}\' is not found.'.format(request.operation)
+            )
+        return self._operation_message(self._operations[key])
+
+
+class FakeService(object):
+    """ A service of a FakeClient, ie `client.deployments` """
+
+    def __init__(self, fake, name):
+        self._fake = fake
+        self._name = name
+
+    def __getattr__(self, method):
+        if method.startswith('_'):
+            raise AttributeError(method)
+
+        def call(request, global_params=None):
+            return self._fake.call(self._name, method, request)
+
+        call.__name__ = str(method)
+        return call
+
+
+class FakeClient(object):
+    """ Stands in for the SDK's DM API client """
+
+    def __init__(self, fake):
+        for name in ['deployments', 'manifests', 'operations', 'resources']:
+            setattr(self, name, FakeService(fake, name))
@@ -1,3 +1,5 @@
+import json
+
 from six import PY2
 
 if PY2:
@@ -11,6 +13,8 @@ import pytest
 
 from cloud_foundation_toolkit import actions
 from cloud_foundation_toolkit.deployment import Config, ConfigGraph
+from cloud_foundation_toolkit.journal import Journal
+from cloud_foundation_toolkit.metrics import COUNTERS
 
 
 ACTIONS = ['apply', 'create', 'delete', 'update']
@@ -135,3 +139,149 @@ def test_get_config_files(configs):
     assert files == r
 
 
+def test_action_parallel(configs):
+    args = Args(action='apply', config=[configs.directory], parallelism=4)
+    n_configs = len(configs.files)
+    with mock.patch('cloud_foundation_toolkit.actions.Deployment') as m1, \
+            mock.patch('cloud_foundation_toolkit.parallel.sdk_log'):
+        r = actions.execute(args)
+        assert r == None
+        assert m1.call_count == n_configs
+
+        # Failures are reported at the end of the stage
+        m1.reset_mock()
+        m1.return_value.apply.side_effect = ValueError('boom')
+        with pytest.raises(SystemExit):
+            actions.execute(args)
+        assert m1.call_count >= 1
+
+        # Interactive previews can't run concurrently
+        args.preview = True
+        with pytest.raises(SystemExit):
+            actions.execute(args)
+
+
+def test_action_resume(configs, tmpdir):
+    journal = str(tmpdir.join('journal'))
+    args = Args(action='apply', config=[configs.directory], journal=journal)
+    n_configs = len(configs.files)
+    with mock.patch('cloud_foundation_toolkit.actions.Deployment') as m1:
+        m1.return_value.status = 'updated'
+        actions.execute(args)
+        assert m1.call_count == n_configs
+
+        # Nothing changed since the last run
+        m1.reset_mock()
+        args.resume = True
+        actions.execute(args)
+        m1.assert_not_called()
+
+        # A new run starts from scratch
+        args.resume = False
+        actions.execute(args)
+        assert m1.call_count == n_configs
+
+        # Failures surfacing as SystemExit are journaled too
+        m1.reset_mock()
+        args.resume = False
+        m1.return_value.apply.side_effect = SystemExit('Aborted')
+        with pytest.raises(SystemExit):
+            actions.execute(args)
+        entries = Journal(journal).entries()
+        assert [e['outcome'] for e in entries] == ['failed']
+        assert entries[0]['error'] == 'Aborted'
+
+        # There is no journal to resume from by default
+        m1.reset_mock()
+        args.resume, args.journal = True, None
+        with pytest.raises(SystemExit):
+            actions.execute(args)
+        m1.assert_not_called()
+
+
+def test_action_api_call_budget(configs, tmpdir):
+    report = str(tmpdir.join('report.json'))
+    n_configs = len(configs.files)
+    args = Args(action='apply', config=[configs.directory], report=report,
+                max_api_calls=n_configs)
+    with mock.patch('cloud_foundation_toolkit.actions.Deployment') as m1:
+        # One API call per deployment
+        m1.return_value.apply.side_effect = \
+            lambda **kwargs: COUNTERS.increment('api.calls')
+        COUNTERS.reset()
+        actions.execute(args)
+        with open(report) as _fd:
+            assert json.load(_fd)['api']['calls']['total'] == n_configs
+
+        COUNTERS.reset()
+        args.max_api_calls = n_configs - 1
+        with pytest.raises(SystemExit):
+            actions.execute(args)
+
+
+def test_action_print_resources_summary(configs):
+    args = Args(action='apply', config=[configs.directory],
+                print_resources='summary', parallelism=2)
+    with mock.patch('cloud_foundation_toolkit.actions.Deployment') as m1:
+        m1.return_value.status = 'updated'
+        m1.return_value.changed_resources.return_value = []
+        actions.execute(args)
+        assert m1.PRINT_RESOURCES == 'summary'
+        assert m1.return_value.changed_resources.call_count == \
+            len(configs.files)
+
+
+def test_get_config_files_recursive(tmpdir):
+    for path in ['a.yaml', 'b.txt', '.hidden.yaml', 'sub/c.yml',
+                 'sub/legacy/d.yaml', 'sub/e.jinja']:
+        tmpdir.join(path).ensure()
+    directory = str(tmpdir)
+
+    def found(**kwargs):
+        files = actions.get_config_files([directory], **kwargs)
+        return [f[len(directory) + 1:] for f in files]
+
+    assert found() == ['a.yaml']
+    assert found(recursive=True) == [
+        'a.yaml', 'sub/c.yml', 'sub/e.jinja', 'sub/legacy/d.yaml'
+    ]
+    assert found(recursive=True, exclude=['*/legacy/*', '*.jinja']) == [
+        'a.yaml', 'sub/c.yml'
+    ]
+    assert found(recursive=True, include=['sub/*.yml', '*.txt']) == [
+        'b.txt', 'sub/c.yml'
+    ]
+
+
+def test_check_abandon(configs):
+    graph = ConfigGraph([v.path for k, v in configs.files.items()])
+    actions.check_abandon(graph, graph)
+
+    # my-firewalls and the instances depend on my-networks
+    networks = [n for n in graph.configs if n.deployment == 'my-networks']
+    with pytest.raises(SystemExit) as err:
+        actions.check_abandon(graph, graph.select(networks))
+    assert 'my-firewalls' in str(err.value)
+
+    instance = [n for n in graph.configs if n.deployment == 'my-instance-2']
+    actions.check_abandon(graph, graph.select(instance))
+
+
+def test_action_delete_changed_since(tmpdir):
+    config = (
+        'name: {}\nproject: p\nresources:\n'
+        '  - name: r\n    type: t\n    properties:\n'
+        '      x: {}\n'
+    )
+    for name, value in [('a', 'x'), ('b', '$(out.a.r.x)'),
+                        ('c', '$(out.a.r.x)')]:
+        tmpdir.join(name + '.yaml').write(config.format(name, value))
+    args = Args(action='delete', config=[str(tmpdir)], changed_since='HEAD')
+    changed = lambda since, configs: [n for n in configs if n.deployment == 'b']
+    with mock.patch('cloud_foundation_toolkit.actions.Deployment') as m1, \
+            mock.patch('cloud_foundation_toolkit.actions.changed_configs',
+                       changed):
+        actions.execute(args)
+        # a is still used by c, only b is deleted
+        deleted = [c[1][0].deployment for c in m1.mock_calls if c[0] == '']
+        assert deleted == ['b']
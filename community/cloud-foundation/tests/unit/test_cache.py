@@ -0,0 +1,41 @@
+import os
+
+from cloud_foundation_toolkit.cache import DiskCache
+
+OUTPUTS = {'my-network-prod': {'name': 'my-network-prod'}}
+
+
+def test_disk_cache(tmpdir):
+    cache = DiskCache(str(tmpdir))
+    assert cache.get('p', 'd', 'manifest-1') is None
+
+    cache.put('p', 'd', 'manifest-1', OUTPUTS, fingerprint=b'abc')
+    assert cache.get('p', 'd', 'manifest-1') == OUTPUTS
+    # Stale entries are ignored
+    assert cache.get('p', 'd', 'manifest-2') is None
+
+    stats = cache.stats()
+    assert stats['entries'] == 1
+    assert stats['size'] > 0
+
+    assert cache.clear() == 1
+    assert cache.get('p', 'd', 'manifest-1') is None
+
+
+def test_disk_cache_eviction(tmpdir):
+    cache = DiskCache(str(tmpdir))
+    cache.put('p', 'd-0', 'm', OUTPUTS)
+    entry_size = cache.stats()['size']
+    cache.max_size = entry_size * 2
+
+    cache.put('p', 'd-1', 'm', OUTPUTS)
+    # d-0 is the least recently used unless it is read again
+    os.utime(cache._path('p', 'd-0'), (0, 0))
+    os.utime(cache._path('p', 'd-1'), (1, 1))
+    assert cache.get('p', 'd-0', 'm') == OUTPUTS
+    cache.put('p', 'd-2', 'm', OUTPUTS)
+
+    assert cache.stats()['entries'] == 2
+    assert cache.get('p', 'd-0', 'm') == OUTPUTS
+    assert cache.get('p', 'd-1', 'm') is None
+    assert cache.get('p', 'd-2', 'm') == OUTPUTS
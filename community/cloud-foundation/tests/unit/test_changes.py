@@ -0,0 +1,60 @@
+import subprocess
+
+from cloud_foundation_toolkit.changes import changed_configs
+from cloud_foundation_toolkit.changes import StateFile
+from cloud_foundation_toolkit.deployment import Config, Node
+from cloud_foundation_toolkit.target_config import ContentCache
+
+CONFIG = (
+    'name: {}\nproject: p\nimports:\n  - path: template.py\n'
+    'resources:\n  - name: r\n    type: template.py\n'
+)
+
+
+def write_configs(tmpdir):
+    tmpdir.join('template.py').write('def GenerateConfig(c): pass\n')
+    for name in 'ab':
+        tmpdir.join(name + '.yaml').write(CONFIG.format(name))
+    return {
+        c.id: c
+        for c in (Config(str(tmpdir.join(n + '.yaml'))) for n in 'ab')
+    }
+
+
+def test_changed_since_state_file(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    monkeypatch.setattr(
+        'cloud_foundation_toolkit.changes.CONTENT_CACHE',
+        ContentCache()
+    )
+    configs = write_configs(tmpdir)
+    path = str(tmpdir.join('state.json'))
+
+    state = StateFile(path)
+    assert state.changed(configs) == set(configs)
+    state.update(configs[Node('p', 'a')])
+    state.update(configs[Node('p', 'b')])
+    state.save()
+    assert changed_configs(path, configs) == set()
+
+    state = StateFile(path)
+    state.discard(Node('p', 'b'))
+    state.save()
+    assert changed_configs(path, configs) == set([Node('p', 'b')])
+
+
+def test_changed_since_git_ref(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    configs = write_configs(tmpdir)
+    for cmd in (['init', '-q'], ['add', '.'],
+                ['-c', 'user.name=t', '-c', 'user.email=t@t',
+                 'commit', '-q', '-m', 'init']):
+        subprocess.check_call(['git'] + cmd)
+    assert changed_configs('HEAD', configs) == set()
+
+    tmpdir.join('b.yaml').write(CONFIG.format('b') + '# changed\n')
+    assert changed_configs('HEAD', configs) == set([Node('p', 'b')])
+
+    # A change to an imported file affects all the configs importing it
+    tmpdir.join('template.py').write('# changed\n')
+    assert changed_configs('HEAD', configs) == set(configs)
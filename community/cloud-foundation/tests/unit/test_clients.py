@@ -0,0 +1,126 @@
+import threading
+import time
+
+from six import PY2
+
+from apitools.base.py.exceptions import HttpError
+import pytest
+
+from cloud_foundation_toolkit.clients import api_calls
+from cloud_foundation_toolkit.clients import ClientPool
+from cloud_foundation_toolkit.clients import PooledClient
+from cloud_foundation_toolkit.metrics import COUNTERS
+
+if PY2:
+    import mock
+else:
+    import unittest.mock as mock
+
+
+def test_client_pool():
+    in_use = set()
+    errors = []
+
+    def get(request):
+        # Each client must only be used by one thread at a time
+        client = threading.current_thread().client
+        if client in in_use:
+            errors.append(client)
+        in_use.add(client)
+        time.sleep(0.01)
+        in_use.discard(client)
+        return request
+
+    def factory():
+        client = mock.Mock()
+
+        def call(request):
+            threading.current_thread().client = client
+            return get(request)
+
+        client.deployments.Get.side_effect = call
+        return client
+
+    pool = ClientPool(size=3, factory=factory)
+    client = PooledClient(pool)
+    assert client.deployments is client.deployments
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda i=i: results.append(client.deployments.Get(i))
+        ) for i in range(12)
+    ]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+
+    assert sorted(results) == list(range(12))
+    assert not errors
+    assert pool._created == 3
+    assert len(pool._idle) == 3
+
+
+def test_client_pool_factory_error():
+    pool = ClientPool(size=1, factory=mock.Mock(side_effect=[ValueError, 'c']))
+    try:
+        with pool.client():
+            pass
+    except ValueError:
+        pass
+    # The failed creation doesn't count against the pool size
+    with pool.client() as client:
+        assert client == 'c'
+
+
+def test_api_calls():
+    COUNTERS.reset()
+    client = PooledClient(ClientPool(factory=mock.Mock))
+    get = mock.Mock(project='my.project', deployment='d1')
+    client.deployments.Get(get)
+    client.deployments.Get(get)
+    client.manifests.Get(mock.Mock(project='my.project', deployment='d2'))
+    client.operations.Get(mock.Mock(project='my.project', deployment=None))
+    assert api_calls() == {
+        'total': 4,
+        'by_method': {
+            'deployments.Get': 2,
+            'manifests.Get': 1,
+            'operations.Get': 1
+        },
+        'by_deployment': {
+            'my.project/d1': {'deployments.Get': 2},
+            'my.project/d2': {'manifests.Get': 1},
+            'my.project/-': {'operations.Get': 1}
+        }
+    }
+
+
+def test_mutations_not_retried():
+    pool = ClientPool(factory=mock.Mock)
+    client = PooledClient(pool)
+    with pool.client() as dm:
+        pass
+    unavailable = HttpError({'status': 503}, '', 'https://dm')
+    throttled = HttpError({'status': 429}, '', 'https://dm')
+    request = mock.Mock(project='p')
+
+    with mock.patch('cloud_foundation_toolkit.ratelimit.time.sleep'):
+        # The insert may have been applied despite the error
+        dm.deployments.Insert.side_effect = [unavailable, 'operation']
+        with pytest.raises(HttpError):
+            client.deployments.Insert(request)
+        assert dm.deployments.Insert.call_count == 1
+
+        # Throttled calls were not applied
+        dm.deployments.Insert.side_effect = [throttled, 'operation']
+        assert client.deployments.Insert(request) == 'operation'
+
+        # Reads are retried on any transient failure
+        dm.deployments.Get.side_effect = [unavailable, 'deployment']
+        assert client.deployments.Get(request) == 'deployment'
+
+        # Unless retries are off
+        client = PooledClient(pool, retry=False)
+        dm.deployments.Get.side_effect = [unavailable, 'deployment']
+        with pytest.raises(HttpError):
+            client.deployments.Get(request)
@@ -8,6 +8,7 @@ from ruamel.yaml import YAML
 from cloud_foundation_toolkit.deployment import Config
 from cloud_foundation_toolkit.deployment import ConfigGraph
 from cloud_foundation_toolkit.deployment import Deployment
+from cloud_foundation_toolkit.deployment import Node
 
 if PY2:
     import mock
@@ -37,6 +38,16 @@ def test_config_list(configs):
             assert isinstance(c, Config)
 
 
+def test_config_graph_processes(configs):
+    config_paths = [v.path for k, v in configs.files.items()]
+    serial = ConfigGraph(config_paths, processes=1)
+    parallel = ConfigGraph(config_paths, processes=2)
+    assert sorted(parallel.configs) == sorted(serial.configs)
+    for node, config in parallel.configs.items():
+        assert config.as_dict == serial.configs[node].as_dict
+        assert config.dependencies == serial.configs[node].dependencies
+
+
 def test_deployment_object(configs):
     config = Config(configs.files['my-networks.yaml'].path)
     deployment = Deployment(config)
@@ -79,7 +90,8 @@ def test_deployment_create(configs):
         deployment = Deployment(config)
         mocks['client'].deployments.Insert.return_value = Message(
             name='my-network-prod',
-            fingerprint='abcdefgh'
+            fingerprint='abcdefgh',
+            insertTime='2018-09-01T10:00:00.000-07:00'
         )
         mocks['client'].deployments.Get.return_value = Message(
             name='my-network-prod',
@@ -88,3 +100,126 @@ def test_deployment_create(configs):
 
         d = deployment.create()
         assert deployment.current == d
+
+
+def test_deployment_changed_resources(configs):
+    deployment = Deployment(Config(configs.files['my-networks.yaml'].path))
+    deployment.started = '2018-09-01T10:00:00.000-07:00'
+    resources = [
+        Message(name='unchanged', insertTime='2018-08-01T10:00:00.000-07:00',
+                updateTime=None),
+        Message(name='inserted', insertTime='2018-09-01T10:00:05.000-07:00',
+                updateTime=None),
+        Message(name='updated', insertTime='2018-08-01T10:00:00.000-07:00',
+                updateTime='2018-09-01T10:01:00.000-07:00')
+    ]
+    with mock.patch.object(Deployment, 'client'), \
+            mock.patch('apitools.base.py.list_pager.YieldFromList') as m1, \
+            mock.patch('cloud_foundation_toolkit.deployment.OUTPUT_CACHE') as m2:
+        m1.return_value = iter(resources)
+        m2.outputs.return_value = {'inserted': {'selfLink': 'https://x'}}
+        assert deployment.changed_resources() == [
+            (resources[1], {'selfLink': 'https://x'}),
+            (resources[2], {})
+        ]
+
+
+def test_config_graph_cycle():
+    config_a = (
+        'name: a\nproject: p\nresources:\n'
+        '  - name: r\n    type: t\n    properties:\n'
+        '      x: $(out.b.r.x)\n'
+    )
+    config_b = config_a.replace('name: a', 'name: b').replace('out.b', 'out.a')
+    graph = ConfigGraph([config_a, config_b])
+    with pytest.raises(SystemExit) as err:
+        graph.graph
+    assert 'p/a' in str(err.value)
+    assert 'p/b' in str(err.value)
+
+
+def test_config_graph_levels():
+    config = (
+        'name: {}\nproject: p\nresources:\n'
+        '  - name: r\n    type: t\n    properties:\n'
+        '      x: {}\n'
+    )
+    graph = ConfigGraph([
+        config.format('a', 'x'),
+        config.format('b', '$(out.a.r.x)'),
+        config.format('c', '$(out.a.r.x)'),
+        config.format('d', '$(out.b.r.x) $(out.a.r.x)'),
+    ])
+    levels = [sorted(c.deployment for c in l) for l in graph.levels]
+    assert levels == [['a'], ['b', 'c'], ['d']]
+
+
+def test_config_graph_select():
+    config = (
+        'name: {}\nproject: p\nresources:\n'
+        '  - name: r\n    type: t\n    properties:\n'
+        '      x: {}\n'
+    )
+    graph = ConfigGraph([
+        config.format('a', 'x'),
+        config.format('b', '$(out.a.r.x)'),
+        config.format('c', '$(out.a.r.x)'),
+        config.format('d', '$(out.b.r.x)'),
+    ])
+    downstream = graph.downstream([Node('p', 'b')])
+    assert downstream == set([Node('p', 'b'), Node('p', 'd')])
+    upstream = graph.downstream([Node('p', 'b')], reverse=True)
+    assert upstream == set([Node('p', 'a'), Node('p', 'b')])
+
+    selected = graph.select(downstream)
+    assert sorted(n.deployment for n in selected.configs) == ['b', 'd']
+    assert selected.external_nodes == [Node('p', 'a')]
+
+
+def test_config_graph_external_nodes():
+    config = (
+        'name: a\nproject: p\nresources:\n'
+        '  - name: r\n    type: t\n    properties:\n'
+        '      x: $(out.x.r.x)\n      y: $(out.y.r.x)\n      z: $(out.z.r.x)\n'
+    )
+    graph = ConfigGraph([config])
+    with mock.patch('cloud_foundation_toolkit.deployment.OUTPUT_CACHE') as m:
+        m.deployment.side_effect = lambda p, d: None if d != 'y' else Message()
+        with pytest.raises(SystemExit) as err:
+            graph.levels
+        assert m.deployment.call_count == 3
+    assert 'deployment: x' in str(err.value)
+    assert 'deployment: z' in str(err.value)
+    assert 'deployment: y' not in str(err.value)
+
+
+def test_deployment_update_up_to_date(configs):
+    config = Config(configs.files['my-networks.yaml'].path)
+    patches = {
+        'client': mock.DEFAULT,
+        'wait': mock.DEFAULT,
+        'get': mock.DEFAULT,
+        'print_resources_and_outputs': mock.DEFAULT,
+        'digest': mock.PropertyMock(return_value='abc')
+    }
+
+    with mock.patch.multiple(Deployment, **patches) as mocks:
+        deployment = Deployment(config)
+        deployment.current = Message(
+            fingerprint=b'abcdefgh',
+            update=None,
+            operation=Message(error=None),
+            labels=[Message(key=Deployment.DIGEST_LABEL, value='abc')]
+        )
+        assert deployment.is_up_to_date()
+
+        deployment.update()
+        assert deployment.status == 'skipped'
+        mocks['client'].deployments.Update.assert_not_called()
+
+        deployment.update(force=True)
+        assert deployment.status == 'updated'
+        assert mocks['client'].deployments.Update.call_count == 1
+
+        deployment.current.labels[0].value = 'def'
+        assert not deployment.is_up_to_date()
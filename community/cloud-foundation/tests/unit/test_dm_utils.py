@@ -4,8 +4,14 @@ from apitools.base.py.exceptions import HttpNotFoundError
 import pytest
 from ruamel.yaml import YAML
 
+from cloud_foundation_toolkit.cache import DiskCache
 from cloud_foundation_toolkit.dm_utils import API
+from cloud_foundation_toolkit.dm_utils import find_dm_output_queries
 from cloud_foundation_toolkit.dm_utils import get_deployment
+from cloud_foundation_toolkit.dm_utils import get_deployment_output
+from cloud_foundation_toolkit.dm_utils import OutputCache
+from cloud_foundation_toolkit.dm_utils import resolve_dm_outputs
+from cloud_foundation_toolkit.yaml_utils import CFTBaseYAML
 
 
 if PY2:
@@ -24,3 +30,116 @@ def test_get_deployment():
         d = get_deployment('some-deployment', 'some-project')
         assert d is None
 
+
+LAYOUT = """
+resources:
+  - name: my-network-prod
+    type: network.py
+    outputs:
+      - name: name
+        finalValue: my-network-prod
+      - name: selfLink
+        finalValue: https://example.com/my-network-prod
+"""
+
+
+def test_output_cache():
+    cache = OutputCache()
+    deployment = Message(manifest='https://example.com/manifests/manifest-1')
+    with mock.patch('cloud_foundation_toolkit.dm_utils.get_deployment') as m1, \
+            mock.patch('cloud_foundation_toolkit.dm_utils.get_manifest') as m2:
+        m1.return_value = deployment
+        m2.return_value = Message(layout=LAYOUT)
+
+        outputs = cache.outputs('my-project', 'my-networks')
+        assert outputs['my-network-prod']['name'] == 'my-network-prod'
+        outputs = cache.outputs('my-project', 'my-networks')
+        assert m1.call_count == 1
+        assert m2.call_count == 1
+        m2.assert_called_with('my-project', 'my-networks', 'manifest-1')
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        # Invalidated deployments are fetched again, the manifest
+        # is only downloaded if it changed
+        cache.invalidate('my-project', 'my-networks')
+        cache.outputs('my-project', 'my-networks')
+        assert m1.call_count == 2
+        assert m2.call_count == 1
+
+        deployment.manifest = 'https://example.com/manifests/manifest-2'
+        cache.invalidate('my-project', 'my-networks')
+        cache.outputs('my-project', 'my-networks')
+        assert m2.call_count == 2
+        assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_get_deployment_output():
+    with mock.patch('cloud_foundation_toolkit.dm_utils.OUTPUT_CACHE') as m:
+        m.outputs.return_value = {'my-network-prod': {'name': 'net'}}
+        assert get_deployment_output('p', 'd', 'my-network-prod', 'name') == 'net'
+        assert get_deployment_output('p', 'd', 'my-network-prod', 'x') is None
+        assert get_deployment_output('p', 'd', 'other', 'name') is None
+
+
+def test_output_cache_with_disk_cache(tmpdir):
+    deployment = Message(
+        manifest='https://example.com/manifests/manifest-1',
+        fingerprint=b'abc'
+    )
+    with mock.patch('cloud_foundation_toolkit.dm_utils.get_deployment') as m1, \
+            mock.patch('cloud_foundation_toolkit.dm_utils.get_manifest') as m2:
+        m1.return_value = deployment
+        m2.return_value = Message(layout=LAYOUT)
+
+        OutputCache(DiskCache(str(tmpdir))).outputs('p', 'my-networks')
+        assert m2.call_count == 1
+
+        # A new run only needs the deployment to validate the entry
+        cache = OutputCache(DiskCache(str(tmpdir)))
+        outputs = cache.outputs('p', 'my-networks')
+        assert outputs['my-network-prod']['name'] == 'my-network-prod'
+        assert m1.call_count == 2
+        assert m2.call_count == 1
+        assert (cache.hits, cache.disk_hits, cache.misses) == (0, 1, 0)
+
+
+CONFIG_WITH_REFERENCES = """
+# $(out.commented.r.x)
+resources:
+  - name: r
+    properties:
+      network: $(out.net.r.name)
+      ports: $(out.other-project.fw.r.ports)
+      url: !DMOutput dm://p/tagged/r/x
+      description: "Network: $(out.net.r.name), !DMOutput dm://net/r/x"
+      size: 10
+"""
+
+
+def test_find_dm_output_queries():
+    tree = CFTBaseYAML().load(CONFIG_WITH_REFERENCES)
+    queries = find_dm_output_queries(tree, 'p')
+    assert sorted(set((q.project, q.deployment) for q in queries)) == [
+        ('other-project', 'fw'),
+        ('p', 'net'),
+        ('p', 'tagged')
+    ]
+
+
+def test_resolve_dm_outputs():
+    tree = CFTBaseYAML().load(CONFIG_WITH_REFERENCES)
+    outputs = {
+        ('p', 'net', 'r', 'name'): 'my-net',
+        ('p', 'net', 'r', 'x'): 'x',
+        ('other-project', 'fw', 'r', 'ports'): [80, 443],
+        ('p', 'tagged', 'r', 'x'): 'y',
+    }
+    resolved = resolve_dm_outputs(tree, 'p', lambda q: outputs[tuple(q)])
+    properties = resolved['resources'][0]['properties']
+    assert properties['network'] == 'my-net'
+    assert properties['ports'] == [80, 443]
+    assert properties['url'] == 'y'
+    assert properties['description'] == 'Network: my-net, x'
+    assert properties['size'] == 10
+    # The parsed tree is left untouched
+    assert tree['resources'][0]['properties']['network'] == '$(out.net.r.name)'
@@ -0,0 +1,76 @@
+import json
+
+from six import PY2
+from six import StringIO
+
+from cloud_foundation_toolkit import actions
+from cloud_foundation_toolkit.deployment import Node
+from cloud_foundation_toolkit.events import EventStream
+from cloud_foundation_toolkit.events import EVENTS
+
+if PY2:
+    import mock
+else:
+    import unittest.mock as mock
+
+
+class Args(object):
+
+    def __init__(self, **kwargs):
+        self.preview = False
+        self.project = False
+        self.show_stages = False
+        self.format = 'human'
+        [setattr(self, k, v) for k, v in kwargs.items()]
+
+
+def read_events(stream):
+    return [json.loads(l) for l in stream.getvalue().splitlines()]
+
+
+def test_event_stream():
+    events, stream = EventStream(), StringIO()
+    events.emit('started', Node('p', 'a'))
+    events.enable(stream)
+    events.emit('started', Node('p', 'a'), action='apply')
+    events.emit('run_finished', duration=1.5)
+    events.disable()
+    events.emit('finished', Node('p', 'a'))
+
+    started, finished = read_events(stream)
+    assert started['event'] == 'started'
+    assert started['project'] == 'p'
+    assert started['deployment'] == 'a'
+    assert started['action'] == 'apply'
+    assert finished == {
+        'event': 'run_finished',
+        'duration': 1.5,
+        'ts': finished['ts']
+    }
+
+
+def test_action_events(configs):
+    stream = StringIO()
+    args = Args(action='apply', config=[configs.directory], events='ndjson')
+    with mock.patch('cloud_foundation_toolkit.actions.Deployment') as m1, \
+            mock.patch('cloud_foundation_toolkit.actions.sys.stdout', stream):
+        m1.return_value.status = 'created'
+        try:
+            actions.execute(args)
+        finally:
+            EVENTS.disable()
+
+    events = read_events(stream)
+    n_configs = len(configs.files)
+    assert events[0]['event'] == 'run_started'
+    assert events[0]['deployments'] == n_configs
+    assert events[-1]['event'] == 'run_finished'
+    assert events[-1]['succeeded']
+    for kind in ['queued', 'started', 'finished']:
+        assert len([e for e in events if e['event'] == kind]) == n_configs
+    # Each deployment is queued, started and finished in this order
+    for node in set((e['project'], e['deployment']) for e in events[1:-1]):
+        assert [
+            e['event'] for e in events
+            if (e.get('project'), e.get('deployment')) == node
+        ] == ['queued', 'started', 'finished']
@@ -0,0 +1,138 @@
+from apitools.base.py.exceptions import HttpError
+import pytest
+
+from cloud_foundation_toolkit.deployment import Config
+from cloud_foundation_toolkit.deployment import Deployment
+from cloud_foundation_toolkit.dm_utils import get_deployment
+from cloud_foundation_toolkit.operations import POLLER
+from cloud_foundation_toolkit.previews import encode_fingerprint
+from cloud_foundation_toolkit.ratelimit import RETRY_POLICY
+from fakes.fake_dm import FakeDM
+
+NETWORK = """
+name: network
+project: p
+resources:
+  - name: net
+    type: compute.v1.network
+    properties:
+      mtu: 1460
+"""
+
+FIREWALL = """
+name: firewall
+project: p
+resources:
+  - name: fw
+    type: compute.v1.firewall
+    properties:
+      mtu: $(out.network.net.mtu)
+"""
+
+
+@pytest.fixture
+def fake():
+    min_interval = POLLER.min_interval
+    POLLER.min_interval = 0.01
+    fake = FakeDM(latency=0.05)
+    with fake.install():
+        yield fake
+    POLLER.min_interval = min_interval
+
+
+def deployment(content):
+    deployment = Deployment(Config(content))
+    deployment.PRINT_RESOURCES = 'none'
+    return deployment
+
+
+def test_fake_dm_apply(fake):
+    network = deployment(NETWORK)
+    network.apply()
+    assert network.status == 'created'
+
+    firewall = deployment(FIREWALL)
+    firewall.apply()
+    assert firewall.config['resources'][0]['properties']['mtu'] == 1460
+    [(resource, outputs)] = firewall.changed_resources()
+    assert resource.name == 'fw'
+    assert outputs['mtu'] == 1460
+
+    network = deployment(NETWORK)
+    network.apply()
+    assert network.status == 'skipped'
+    network = deployment(NETWORK.replace('1460', '1500'))
+    network.apply()
+    assert network.status == 'updated'
+
+    network.delete()
+    assert get_deployment('p', 'network') is None
+    # apply() tries to insert existing deployments before updating them
+    assert fake.calls['deployments.Insert'] == 4
+    assert fake.calls['deployments.Update'] == 1
+    assert fake.calls['deployments.Delete'] == 1
+
+
+def test_fake_dm_failures(fake):
+    fake.failure_rate = 1
+    with pytest.raises(Exception) as err:
+        deployment(NETWORK).create()
+    assert 'Error in Operation' in str(err.value)
+
+    fake.failure_rate = 0
+    fake.error_rate = 1
+    retries = RETRY_POLICY.retries
+    RETRY_POLICY.retries = 0
+    try:
+        with pytest.raises(HttpError):
+            get_deployment('p', 'network')
+    finally:
+        RETRY_POLICY.retries = retries
+
+
+def test_fake_dm_preview(fake):
+    deployment(NETWORK).apply()
+    network = deployment(NETWORK.replace('1460', '1500'))
+    fake.calls.clear()
+    changes = network.preview()
+    assert network.status == 'previewed'
+    # To check the digest, for the fingerprint, and after the preview
+    assert fake.calls['deployments.Get'] == 3
+    assert changes == [
+        {'name': 'net', 'type': 'compute.v1.network', 'intent': 'UPDATE'}
+    ]
+
+    previews = {
+        'p/network': {
+            'fingerprint': encode_fingerprint(network.current.fingerprint),
+            'digest': network.digest
+        }
+    }
+    network.apply_preview(previews)
+    assert network.status == 'updated'
+    with pytest.raises(SystemExit):
+        network.apply_preview(previews)
+
+
+def test_fake_dm_preview_config_changed(fake):
+    deployment(NETWORK).apply()
+    network = deployment(NETWORK.replace('1460', '1500'))
+    network.preview()
+    previews = {
+        'p/network': {
+            'fingerprint': encode_fingerprint(network.current.fingerprint),
+            'digest': network.digest
+        }
+    }
+
+    # The config changes between the preview and its approval
+    changed = deployment(NETWORK.replace('1460', '1600'))
+    changed.apply_preview(previews)
+    assert changed.status == 'updated'
+    labels = {l.key: l.value for l in changed.get().labels}
+    assert labels[Deployment.DIGEST_LABEL] == network.digest
+
+    # The changed config was never applied, so it is not up to date
+    changed = deployment(NETWORK.replace('1460', '1600'))
+    changed.apply()
+    assert changed.status == 'updated'
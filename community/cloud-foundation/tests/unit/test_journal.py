@@ -0,0 +1,54 @@
+import io
+
+from cloud_foundation_toolkit.deployment import Config, Node
+from cloud_foundation_toolkit.journal import Journal
+from cloud_foundation_toolkit.target_config import CONTENT_CACHE
+
+CONFIG = 'name: {}\nproject: p\nresources: []\n'
+
+
+def test_journal(tmpdir):
+    journal = Journal(str(tmpdir.join('journal')))
+    configs = {c.id: c for c in (Config(CONFIG.format(n)) for n in 'abc')}
+    assert journal.completed('apply', configs) == set()
+
+    journal.record('apply', configs[Node('p', 'a')], 'succeeded', 'created')
+    journal.record('apply', configs[Node('p', 'b')], 'failed', error='boom')
+    journal.record('delete', configs[Node('p', 'c')], 'succeeded')
+    assert journal.completed('apply', configs) == set([Node('p', 'a')])
+    assert journal.completed('delete', configs) == set([Node('p', 'c')])
+
+    # The last entry of a node wins
+    journal.record('apply', configs[Node('p', 'b')], 'succeeded', 'updated')
+    assert len(journal.completed('apply', configs)) == 2
+
+    # Changed configs must run again
+    changed = dict(configs)
+    changed[Node('p', 'a')] = Config(CONFIG.format('a') + 'x: 1\n')
+    assert journal.completed('apply', changed) == set([Node('p', 'b')])
+
+    # Truncated lines are ignored
+    with io.open(journal.path, 'a') as _fd:
+        _fd.write(u'{"node": ["p", ')
+    assert len(journal.entries()) == 4
+
+    journal.reset()
+    assert journal.entries() == []
+
+
+def test_journal_imports(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('template.py').write('def GenerateConfig(c): pass\n')
+    config = Config(
+        'name: a\nproject: p\nimports:\n  - path: template.py\n'
+        'resources:\n  - name: r\n    type: template.py\n'
+    )
+    configs = {config.id: config}
+    journal = Journal(str(tmpdir.join('journal')))
+    journal.record('apply', config, 'succeeded', 'created')
+    assert journal.completed('apply', configs) == set([config.id])
+
+    # Configs whose imported files changed must run again
+    tmpdir.join('template.py').write('# changed\n')
+    CONTENT_CACHE.clear()
+    assert journal.completed('apply', configs) == set()
@@ -0,0 +1,108 @@
+import time
+
+from six import PY2
+
+from apitools.base.py.exceptions import HttpError
+import pytest
+
+from cloud_foundation_toolkit.operations import OperationPoller
+from cloud_foundation_toolkit.operations import wait_for_operation
+
+if PY2:
+    import mock
+else:
+    import unittest.mock as mock
+
+
+class Message():
+    def __init__(self, **kwargs):
+        [setattr(self, k, v) for k, v in kwargs.items()]
+
+
+def get_request(project, operation):
+    return Message(project=project, operation=operation)
+
+
+def test_poller():
+    polls = {}
+
+    def get(request):
+        polls[request.operation] = polls.get(request.operation, 0) + 1
+        # op-N is done after N polls
+        if polls[request.operation] < int(request.operation.split('-')[1]):
+            return Message(status='RUNNING', error=None)
+        return Message(status='DONE', error=None, name=request.operation)
+
+    poller = OperationPoller(min_interval=0.01, max_interval=0.05)
+    with mock.patch('cloud_foundation_toolkit.operations.API') as m:
+        m.messages.DeploymentmanagerOperationsGetRequest.side_effect = \
+            get_request
+        m.poll_client.operations.Get.side_effect = get
+        jobs = [poller.watch('p', 'op-{}'.format(i)) for i in range(1, 6)]
+        results = [job.result(timeout=5) for job in jobs]
+
+    assert [r.name for r in results] == ['op-{}'.format(i) for i in range(1, 6)]
+    assert polls == {'op-{}'.format(i): i for i in range(1, 6)}
+
+
+def test_poller_errors():
+    def get(request):
+        if request.operation == 'failed':
+            return Message(status='DONE', error=Message(errors=[]))
+        raise HttpError({'status': 403}, 'forbidden', 'url')
+
+    poller = OperationPoller(min_interval=0.01)
+    with mock.patch('cloud_foundation_toolkit.operations.API') as m1, \
+            mock.patch('cloud_foundation_toolkit.operations.dm_util'):
+        m1.messages.DeploymentmanagerOperationsGetRequest.side_effect = \
+            get_request
+        m1.poll_client.operations.Get.side_effect = get
+        with pytest.raises(Exception) as err:
+            poller.watch('p', 'failed').result(timeout=5)
+        assert 'Error in Operation [failed]' in str(err.value)
+        with pytest.raises(HttpError):
+            poller.watch('p', 'forbidden').result(timeout=5)
+
+
+def test_poller_transient_errors():
+    errors = [
+        HttpError({'status': 429}, 'throttled', 'url'),
+        HttpError({'status': 503}, 'unavailable', 'url')
+    ]
+
+    def get(request):
+        if errors:
+            raise errors.pop(0)
+        return Message(status='DONE', error=None, name=request.operation)
+
+    poller = OperationPoller(min_interval=0.01)
+    with mock.patch('cloud_foundation_toolkit.operations.API') as m1:
+        m1.messages.DeploymentmanagerOperationsGetRequest.side_effect = \
+            get_request
+        m1.poll_client.operations.Get.side_effect = get
+        # The operation is polled again rather than failed
+        assert poller.watch('p', 'op').result(timeout=5).name == 'op'
+        assert m1.poll_client.operations.Get.call_count == 3
+
+
+def test_wait_for_operation_timeout():
+    polls = []
+
+    def get(request):
+        polls.append(request.operation)
+        return Message(status='RUNNING', error=None)
+
+    poller = OperationPoller(min_interval=0.01, max_interval=0.01)
+    with mock.patch('cloud_foundation_toolkit.operations.API') as m1, \
+            mock.patch('cloud_foundation_toolkit.operations.POLLER', poller):
+        m1.messages.DeploymentmanagerOperationsGetRequest.side_effect = \
+            get_request
+        m1.poll_client.operations.Get.side_effect = get
+        with pytest.raises(Exception) as err:
+            wait_for_operation('p', 'slow', timeout=0.1)
+        assert 'exceeded timeout' in str(err.value)
+
+        # The operation is not polled anymore
+        count = len(polls)
+        time.sleep(0.1)
+        assert len(polls) <= count + 1
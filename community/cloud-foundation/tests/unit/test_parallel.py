@@ -0,0 +1,55 @@
+from __future__ import print_function
+import time
+
+from six import PY2
+
+from cloud_foundation_toolkit import parallel
+
+if PY2:
+    import mock
+else:
+    import unittest.mock as mock
+
+
+def test_run_parallel_failures():
+    def func(item):
+        if item % 2:
+            raise ValueError(item)
+
+    with mock.patch('cloud_foundation_toolkit.parallel.sdk_log'):
+        failures = parallel.run_parallel(func, range(6), 3)
+
+    assert sorted(f.item for f in failures) == [1, 3, 5]
+    assert all(isinstance(f.error, ValueError) for f in failures)
+
+
+def test_run_parallel_output_is_atomic(capsys):
+    def func(item):
+        for i in range(3):
+            print('{}-{}'.format(item, i))
+            time.sleep(0.01)
+
+    with mock.patch('cloud_foundation_toolkit.parallel.sdk_log'):
+        failures = parallel.run_parallel(func, ['a', 'b', 'c'], 3)
+
+    assert failures == []
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 9
+    for i in range(0, 9, 3):
+        item = lines[i].split('-')[0]
+        assert lines[i:i + 3] == ['{}-{}'.format(item, n) for n in range(3)]
+
+
+def test_thread_routed_stream():
+    stream = mock.Mock()
+    routed = parallel.ThreadRoutedStream(stream)
+    routed.write('direct')
+    stream.write.assert_called_once_with('direct')
+
+    captured = mock.Mock()
+    routed.start_capture(captured)
+    routed.write('captured')
+    assert not routed.isatty()
+    routed.stop_capture()
+    captured.write.assert_called_once_with('captured')
+    assert stream.write.call_count == 1
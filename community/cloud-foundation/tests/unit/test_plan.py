@@ -0,0 +1,92 @@
+from six import PY2
+
+from cloud_foundation_toolkit.deployment import Config
+from cloud_foundation_toolkit import plan
+
+if PY2:
+    import mock
+else:
+    import unittest.mock as mock
+
+
+class Message():
+    def __init__(self, **kwargs):
+        [setattr(self, k, v) for k, v in kwargs.items()]
+
+
+OLD = """resources:
+- name: a
+  type: t
+- name: b
+  type: t
+  properties:
+    x: 1
+"""
+
+NEW = """resources:
+- name: b
+  type: t
+  properties:
+    x: 2
+- name: c
+  type: t
+"""
+
+
+def target(content, imports):
+    return Message(
+        config=Message(content=content),
+        imports=[Message(name=k, content=v) for k, v in imports.items()]
+    )
+
+
+def test_diff_items():
+    assert plan.diff_items({'a': 1, 'b': 1}, {'b': 2, 'c': 1}) == {
+        'added': ['c'],
+        'removed': ['a'],
+        'changed': ['b']
+    }
+
+
+def test_plan_deployment(configs):
+    config = Config(configs.files['my-networks.yaml'].path)
+    with mock.patch('cloud_foundation_toolkit.plan.Deployment') as m1, \
+            mock.patch('cloud_foundation_toolkit.plan.get_manifest') as m2:
+        deployment = m1.return_value
+        deployment.target_config = target(NEW, {'t.py': 'new'})
+        deployment.current.manifest = 'https://dm/manifests/manifest-1'
+        deployment.is_up_to_date.return_value = False
+        m2.return_value = Message(
+            config=Message(content=OLD),
+            imports=[Message(name='t.py', content='old')]
+        )
+
+        result = plan.plan_deployment(config)
+        assert result.action == 'update'
+        assert result.resources == {
+            'added': ['c'],
+            'removed': ['a'],
+            'changed': ['b']
+        }
+        assert result.imports['changed'] == ['t.py']
+        assert '+    x: 2' in result.diff
+        m2.assert_called_with(
+            config.project,
+            config.deployment,
+            'manifest-1'
+        )
+
+        deployment.is_up_to_date.return_value = True
+        m2.reset_mock()
+        assert plan.plan_deployment(config).action == 'unchanged'
+        m2.assert_not_called()
+
+        deployment.get.return_value = None
+        result = plan.plan_deployment(config)
+        assert result.action == 'create'
+        assert result.resources['added'] == ['b', 'c']
+
+        deployment.get.side_effect = ValueError('Deployment p/x does not exist')
+        result = plan.plan_deployment(config)
+        assert result.action == 'error'
+        assert 'does not exist' in result.error
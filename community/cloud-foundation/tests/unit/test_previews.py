@@ -0,0 +1,31 @@
+import pytest
+
+from cloud_foundation_toolkit.deployment import Config, Node
+from cloud_foundation_toolkit.previews import PreviewReport
+
+CONFIG = 'name: {}\nproject: p\nresources: []\n'
+
+
+def test_preview_report(tmpdir):
+    path = str(tmpdir.join('report.json'))
+    report = PreviewReport(path)
+    changes = [{'name': 'net', 'type': 'compute.v1.network', 'intent': 'UPDATE'}]
+    report.add(Config(CONFIG.format('a')), b'fp', 'digest', changes)
+    report.add(Config(CONFIG.format('b')), None, 'digest', [])
+    report.save()
+
+    loaded = PreviewReport(path, load=True)
+    assert sorted(loaded.nodes) == [Node('p', 'a'), Node('p', 'b')]
+    assert loaded.previews['p/a']['changes'] == changes
+    assert loaded.previews['p/a']['fingerprint'] == 'ZnA='
+    assert loaded.previews['p/a']['digest'] == 'digest'
+    assert loaded.previews['p/b']['fingerprint'] == ''
+
+
+def test_preview_report_invalid(tmpdir):
+    path = tmpdir.join('report.json')
+    path.write('{"p/a": ')
+    with pytest.raises(SystemExit):
+        PreviewReport(str(path), load=True)
+    with pytest.raises(SystemExit):
+        PreviewReport(str(tmpdir.join('missing.json')), load=True)
@@ -0,0 +1,68 @@
+import socket
+
+from six import PY2
+
+from apitools.base.py.exceptions import HttpError
+import pytest
+
+from cloud_foundation_toolkit.metrics import COUNTERS
+from cloud_foundation_toolkit.ratelimit import RateLimiter
+from cloud_foundation_toolkit.ratelimit import RetryPolicy
+from cloud_foundation_toolkit.ratelimit import TokenBucket
+
+if PY2:
+    import mock
+else:
+    import unittest.mock as mock
+
+
+def http_error(status):
+    return HttpError({'status': status}, '', 'https://dm')
+
+
+def test_token_bucket():
+    with mock.patch('cloud_foundation_toolkit.ratelimit.time.time') as m:
+        m.return_value = 100.0
+        bucket = TokenBucket(2)
+        # A burst of `rate` calls goes through, the next ones are spaced
+        assert [bucket.reserve() for _ in range(4)] == [0, 0, 0.5, 1.0]
+        m.return_value = 102.0
+        assert bucket.reserve() == 0
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(qps=1)
+    with mock.patch('cloud_foundation_toolkit.ratelimit.time.sleep') as m:
+        limiter.acquire('p1')
+        limiter.acquire('p2')
+        m.assert_not_called()
+        limiter.acquire('p1')
+        assert m.call_count == 1
+
+        limiter.qps = 0
+        limiter.acquire('p1')
+        assert m.call_count == 1
+
+
+def test_retry_policy():
+    COUNTERS.reset()
+    policy = RetryPolicy(retries=3)
+    func = mock.Mock(side_effect=[http_error(503), socket.error(), 'ok'])
+    with mock.patch('cloud_foundation_toolkit.ratelimit.time.sleep') as m:
+        assert policy.call(func, 'a', b=1) == 'ok'
+        func.assert_called_with('a', b=1)
+        assert m.call_count == 2
+        assert COUNTERS.get('api.retried') == 2
+
+        # Errors that aren't transient are raised right away
+        func = mock.Mock(side_effect=http_error(404))
+        with pytest.raises(HttpError):
+            policy.call(func)
+        assert func.call_count == 1
+
+        # So is the last error when retries are exhausted
+        func = mock.Mock(side_effect=http_error(429))
+        with pytest.raises(HttpError):
+            policy.call(func)
+        assert func.call_count == 4
+        assert COUNTERS.get('api.throttled') == 3
@@ -0,0 +1,94 @@
+import threading
+
+from six import PY2
+
+from cloud_foundation_toolkit.deployment import ConfigGraph
+from cloud_foundation_toolkit.scheduler import DagScheduler
+
+if PY2:
+    import mock
+else:
+    import unittest.mock as mock
+
+
+def get_graph(configs):
+    return ConfigGraph([v.path for k, v in configs.files.items()])
+
+
+def test_critical_path_lengths(configs):
+    graph = get_graph(configs)
+    lengths = {n.deployment: l for n, l in graph.critical_path_lengths.items()}
+    assert lengths == {
+        'my-networks': 3,
+        'my-instance-1': 2,
+        'my-instance-2': 1,
+        'my-firewalls': 1
+    }
+
+
+def test_dag_scheduler_order(configs):
+    graph = get_graph(configs)
+    done, lock = [], threading.Lock()
+
+    def func(config):
+        for dependency in config.dependencies:
+            assert dependency.deployment in done
+        with lock:
+            done.append(config.deployment)
+
+    with mock.patch('cloud_foundation_toolkit.parallel.sdk_log'):
+        failures, skipped = DagScheduler(graph, func, 4).run()
+
+    assert failures == []
+    assert skipped == []
+    assert sorted(done) == sorted(c.deployment for c in graph.configs.values())
+    assert done[0] == 'my-networks'
+
+
+def test_dag_scheduler_skips_downstream(configs):
+    graph = get_graph(configs)
+    done = []
+
+    def func(config):
+        if config.deployment == 'my-instance-1':
+            raise ValueError('boom')
+        done.append(config.deployment)
+
+    with mock.patch('cloud_foundation_toolkit.parallel.sdk_log'):
+        failures, skipped = DagScheduler(graph, func, 4).run()
+
+    assert [f.item.deployment for f in failures] == ['my-instance-1']
+    assert [c.deployment for c in skipped] == ['my-instance-2']
+    assert sorted(done) == ['my-firewalls', 'my-networks']
+
+
+def test_dag_scheduler_reverse(configs):
+    graph = get_graph(configs)
+    lengths = {n.deployment: l for n, l in graph.path_lengths(True).items()}
+    assert lengths == {
+        'my-networks': 1,
+        'my-instance-1': 2,
+        'my-instance-2': 3,
+        'my-firewalls': 2
+    }
+
+    done, lock = [], threading.Lock()
+
+    def func(config):
+        if config.deployment == 'my-instance-2':
+            raise ValueError('boom')
+        for dependency in config.dependencies:
+            assert dependency.deployment not in done
+        with lock:
+            done.append(config.deployment)
+
+    with mock.patch('cloud_foundation_toolkit.parallel.sdk_log'):
+        failures, skipped = DagScheduler(graph, func, 4, reverse=True).run()
+
+    # The deployments the failed one depends on are still in use
+    assert [f.item.deployment for f in failures] == ['my-instance-2']
+    assert sorted(c.deployment for c in skipped) == [
+        'my-instance-1',
+        'my-networks'
+    ]
+    assert done == ['my-firewalls']
@@ -0,0 +1,60 @@
+""" Startup time of the CLI
+
+The SDK and the API client must only be imported when an API call is
+actually made, so `cft --version` and `cft ... --show-stages` start
+fast. The timings are printed (see `pytest -s`) to keep an eye on them.
+"""
+
+import json
+import subprocess
+import sys
+import timeit
+
+SCRIPT = """
+import json, sys
+from cloud_foundation_toolkit import cli
+sys.argv = ['cft'] + {args}
+try:
+    cli.main()
+except SystemExit:
+    pass
+sys.stderr.write(json.dumps(sorted(sys.modules)))
+"""
+
+SDK_MODULES = ('googlecloudsdk', 'apitools')
+CONFIG_MODULES = ('jinja2', 'networkx', 'ruamel')
+
+
+def run_cli(args):
+    """ Runs the CLI in a new interpreter
+
+    Returns: A tuple with the wall time and the top-level modules imported
+    """
+    command = [sys.executable, '-c', SCRIPT.format(args=repr(args))]
+    output = {}
+
+    def run():
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        _, output['stderr'] = process.communicate()
+        assert process.returncode == 0
+
+    elapsed = timeit.timeit(run, number=1)
+    modules = json.loads(output['stderr'].decode('utf-8').splitlines()[-1])
+    return elapsed, set(m.split('.')[0] for m in modules)
+
+
+def test_startup_version():
+    elapsed, modules = run_cli(['--version'])
+    print('cft --version: {:.3f}s'.format(elapsed))
+    assert not modules.intersection(SDK_MODULES + CONFIG_MODULES)
+
+
+def test_startup_show_stages(configs):
+    args = ['--project', 'p', 'apply', configs.directory, '--show-stages']
+    elapsed, modules = run_cli(args)
+    print('cft apply --show-stages: {:.3f}s'.format(elapsed))
+    assert not modules.intersection(SDK_MODULES)
@@ -0,0 +1,96 @@
+from six import PY2
+
+import pytest
+
+from cloud_foundation_toolkit.target_config import build_target_config
+from cloud_foundation_toolkit.target_config import ContentCache
+from cloud_foundation_toolkit.target_config import resolve_imports
+from cloud_foundation_toolkit.target_config import target_digest
+
+if PY2:
+    import mock
+else:
+    import unittest.mock as mock
+
+
+@pytest.fixture
+def templates(tmpdir):
+    tmpdir.mkdir('templates')
+    tmpdir.join('templates', 'network.py').write('def GenerateConfig(c): pass')
+    tmpdir.join('templates', 'network.py.schema').write(
+        'imports:\n  - path: helpers.py\n'
+    )
+    tmpdir.join('templates', 'helpers.py').write('# helpers')
+    tmpdir.join('templates', 'firewall.jinja').write('resources: []')
+    return tmpdir
+
+
+def test_resolve_imports(templates):
+    cache = ContentCache()
+    imports = [
+        {'path': 'templates/network.py'},
+        {'path': 'templates/firewall.jinja', 'name': 'firewall.jinja'}
+    ]
+    resolved = resolve_imports(imports, str(templates), cache)
+    assert [name for name, _ in resolved] == [
+        'templates/network.py',
+        'templates/network.py.schema',
+        'helpers.py',
+        'firewall.jinja'
+    ]
+    assert resolved[2][1].content == '# helpers'
+
+    # A second config importing the same templates reads nothing from disk
+    misses = cache.misses
+    resolve_imports(imports, str(templates), cache)
+    assert cache.misses == misses
+    assert cache.hits >= len(resolved)
+
+
+def test_resolve_imports_missing_file(templates):
+    with pytest.raises(IOError):
+        resolve_imports([{'path': 'nope.py'}], str(templates), ContentCache())
+
+
+def test_resolve_imports_duplicate_keys(tmpdir):
+    tmpdir.join('t.py').write('# template')
+    tmpdir.join('t.py.schema').write(
+        'properties:\n  tags: {}\n  tags: {}\nimports:\n  - path: h.py\n'
+    )
+    tmpdir.join('h.py').write('# helpers')
+    resolved = resolve_imports([{'path': 't.py'}], str(tmpdir), ContentCache())
+    assert [name for name, _ in resolved] == ['t.py', 't.py.schema', 'h.py']
+
+
+def test_build_target_config(templates):
+    messages = mock.Mock()
+    build_target_config(
+        messages,
+        'resources: []',
+        [{'path': 'templates/firewall.jinja'}],
+        str(templates)
+    )
+    messages.ConfigFile.assert_called_once_with(content='resources: []')
+    messages.ImportFile.assert_called_once_with(
+        name='templates/firewall.jinja',
+        content='resources: []'
+    )
+
+
+def test_target_digest():
+    def target(config, *imports):
+        return mock.Mock(
+            config=mock.Mock(content=config),
+            imports=[mock.Mock(content=c) for c in imports]
+        )
+
+    def named(target, *names):
+        for i, name in zip(target.imports, names):
+            i.name = name
+        return target
+
+    digest = target_digest(named(target('a', 'x', 'y'), 'x.py', 'y.py'))
+    assert len(digest) == 56
+    assert digest == target_digest(named(target('a', 'y', 'x'), 'y.py', 'x.py'))
+    assert digest != target_digest(named(target('b', 'x', 'y'), 'x.py', 'y.py'))
+    assert digest != target_digest(named(target('a', 'x', 'z'), 'x.py', 'y.py'))
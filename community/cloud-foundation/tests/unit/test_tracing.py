@@ -0,0 +1,56 @@
+import json
+
+import networkx as nx
+
+from cloud_foundation_toolkit.deployment import Node
+from cloud_foundation_toolkit.tracing import critical_path
+from cloud_foundation_toolkit.tracing import Tracer
+
+
+class Graph():
+    def __init__(self, edges):
+        self.graph = nx.DiGraph(edges)
+
+    def sort(self):
+        return nx.topological_sort(self.graph)
+
+
+def test_tracer_disabled():
+    tracer = Tracer()
+    with tracer.span('load configs', 'config'):
+        pass
+    assert tracer.events == []
+
+
+def test_tracer_spans(tmpdir):
+    tracer = Tracer()
+    tracer.enable()
+    node = Node('p1', 'd1')
+    with tracer.span('d1', 'deployment', node=node):
+        with tracer.span('deployments.Get', 'api'):
+            pass
+    with tracer.span('stage 1', 'stage'):
+        pass
+
+    api, deployment, stage = tracer.events
+    assert api['name'] == 'deployments.Get'
+    assert api['args'] == {'node': 'p1/d1'}
+    assert deployment['ts'] <= api['ts']
+    assert deployment['dur'] >= api['dur']
+    assert 'node' not in stage['args']
+    assert list(tracer.durations('deployment')) == ['p1/d1']
+
+    path = str(tmpdir.join('trace.json'))
+    tracer.write(path)
+    with open(path) as _fd:
+        events = json.load(_fd)['traceEvents']
+    assert [e['ph'] for e in events] == ['M', 'X', 'X', 'X']
+
+
+def test_critical_path():
+    a, b, c, d = [Node('p', n) for n in 'abcd']
+    graph = Graph([(a, b), (b, d), (c, d)])
+    durations = {'p/a': 1, 'p/b': 2, 'p/c': 5, 'p/d': 1}
+    assert critical_path(graph, durations) == (['p/c', 'p/d'], 6)
+    durations['p/b'] = 5
+    assert critical_path(graph, durations) == (['p/a', 'p/b', 'p/d'], 7)
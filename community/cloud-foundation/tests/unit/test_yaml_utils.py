@@ -0,0 +1,34 @@
+import pytest
+
+from cloud_foundation_toolkit import yaml_utils
+from cloud_foundation_toolkit.yaml_utils import BACKENDS
+from cloud_foundation_toolkit.yaml_utils import DMOutputTag
+
+CONFIG = """
+name: my-networks
+resources:
+  - name: my-network-prod
+    type: network.py
+    properties:
+      autoCreateSubnetworks: false
+      peer: !DMOutput dm://p/d/r/x
+"""
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_backends(backend, monkeypatch):
+    monkeypatch.setattr(yaml_utils, '_backend', 'roundtrip')
+    yaml_utils.set_backend(backend)
+    yaml = yaml_utils.new_yaml()
+    assert isinstance(yaml, BACKENDS[backend])
+
+    data = yaml.load(CONFIG)
+    properties = data['resources'][0]['properties']
+    assert properties['autoCreateSubnetworks'] is False
+    assert properties['peer'] == DMOutputTag('dm://p/d/r/x')
+    assert yaml_utils.new_yaml().load(yaml.dump(data)) == data
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        yaml_utils.set_backend('libfoo')